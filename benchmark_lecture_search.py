@@ -0,0 +1,126 @@
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+from elasticsearch import Elasticsearch, helpers
+
+from consts import COURSES
+from data_generator import make_lecture_session
+from lab1.lecture_index import INDEX_MAPPINGS, INDEX_SETTINGS
+from sync.elastic.create_elastic import _session_actions
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'lab1'))
+from lecture_session import SEARCH_MODES, LectureMaterialSearcher, lecture_search_query  # noqa: E402
+
+BENCH_INDEX = "lecture_sessions_bench"
+DEFAULT_TERMS = ["механика", "химия", "квантовая", "моделирование", "численные"]
+
+
+def generate_index(es, sessions, seed=42):
+    """Отдельный индекс с маппингом lecture_sessions и сгенерированными занятиями"""
+    rng = random.Random(seed)
+    es.indices.delete(index=BENCH_INDEX, ignore_unavailable=True)
+    es.indices.create(
+        index=BENCH_INDEX,
+        settings={**INDEX_SETTINGS, "number_of_replicas": 0, "refresh_interval": "-1"},
+        mappings=INDEX_MAPPINGS
+    )
+
+    def rows():
+        for session_id in range(1, sessions + 1):
+            session_type_id = 1 if rng.random() < 0.5 else 2
+            _, _, topic, duration, description, tags = make_lecture_session(
+                None, session_type_id, rng.randint(1, 16), rng)
+            course_name = rng.choice(COURSES)[0]
+            yield (session_id, topic, description, duration, tags, course_name, session_type_id)
+
+    started = time.perf_counter()
+    helpers.bulk(es, _session_actions(rows(), BENCH_INDEX), chunk_size=5000)
+    es.indices.put_settings(index=BENCH_INDEX, settings={"index": {"refresh_interval": None}})
+    es.indices.refresh(index=BENCH_INDEX)
+    print(f"Индекс {BENCH_INDEX}: {sessions} документов за {time.perf_counter() - started:.1f} c")
+
+
+def legacy_search(es, term, session_type_id):
+    """Запрос до перехода на постраничный обход: размер по умолчанию, весь
+    _source, сразу нечеткий поиск"""
+    response = es.search(index=BENCH_INDEX, query=lecture_search_query(term, session_type_id))
+    return [hit['_source']['session_id'] for hit in response['hits']['hits']]
+
+
+def measure(es, search, terms, runs):
+    """Медиана первого запроса (кэши очищены) и повторных запросов, мс"""
+    es.indices.clear_cache(index=BENCH_INDEX, request=True, query=True)
+    first, repeat, found = [], [], 0
+    for term in terms:
+        for run in range(runs + 1):
+            started = time.perf_counter()
+            ids = search(term)
+            elapsed = (time.perf_counter() - started) * 1000
+            (repeat if run else first).append(elapsed)
+        found += len(ids)
+    return {
+        'first': statistics.median(first),
+        'repeat': statistics.median(repeat) if repeat else 0.0,
+        'p95': statistics.quantiles(repeat, n=20)[-1] if len(repeat) > 1 else 0.0,
+        'found': found,
+    }
+
+
+def run_benchmark(es, terms, runs, page_size, session_type_id='1'):
+    results = {'legacy': measure(
+        es, lambda term: legacy_search(es, term, session_type_id), terms, runs)}
+    for mode in SEARCH_MODES:
+        searcher = LectureMaterialSearcher(es=es, mode=mode, index=BENCH_INDEX, page_size=page_size)
+        results[mode] = measure(
+            es, lambda term: searcher.search_by_course_and_session_type(term, session_type_id),
+            terms, runs)
+    return results
+
+
+def print_results(results):
+    print(f"\n{'Режим':<10}{'первый, мс':>12}{'повтор, мс':>12}{'p95, мс':>10}{'найдено':>10}")
+    print("-" * 54)
+    for mode, result in results.items():
+        print(f"{mode:<10}{result['first']:>12.1f}{result['repeat']:>12.1f}"
+              f"{result['p95']:>10.1f}{result['found']:>10}")
+    print("\nlegacy возвращает только первые 10 совпадений на термин")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Задержка поиска лекций: исходный запрос и режимы LectureMaterialSearcher")
+    parser.add_argument('--es-url', default='http://localhost:9200')
+    parser.add_argument('--es-user', default='elastic')
+    parser.add_argument('--es-password', default='secret')
+    parser.add_argument('--generate', type=int, default=0, metavar='N',
+                        help=f"пересоздать {BENCH_INDEX} с N сгенерированными занятиями")
+    parser.add_argument('--terms', nargs='*', default=DEFAULT_TERMS)
+    parser.add_argument('--runs', type=int, default=10,
+                        help="повторов каждого термина после первого запроса")
+    parser.add_argument('--page-size', type=int, default=1000)
+    parser.add_argument('--drop', action='store_true',
+                        help="удалить индекс после замера")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    es = Elasticsearch(
+        hosts=[args.es_url],
+        basic_auth=(args.es_user, args.es_password),
+        verify_certs=False
+    )
+    try:
+        if args.generate:
+            generate_index(es, args.generate)
+        elif not es.indices.exists(index=BENCH_INDEX):
+            sys.exit(f"Индекс {BENCH_INDEX} не найден, запустите с --generate N")
+        print_results(run_benchmark(es, args.terms, args.runs, args.page_size))
+        if args.drop:
+            es.indices.delete(index=BENCH_INDEX, ignore_unavailable=True)
+    finally:
+        es.close()
@@ -0,0 +1,126 @@
+import argparse
+import os
+import statistics
+import sys
+
+import psycopg2
+
+from clean_postgres import drop_tables
+from env import DB_HOST, DB_NAME, DB_PASSWORD, DB_PORT, DB_USER
+from scale_data_generator import ScalePlan, generate
+from setup_postgre_tables import drop_report_indexes, setup_report_indexes, setup_tables
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'lab1'))
+from lab import SCHEDULE_QUERY, attendance_query  # noqa: E402
+
+
+def _scans(plan, found=None):
+    """Способы доступа к таблицам в плане: 'Index Only Scan idx_...', 'Seq Scan' и т.п."""
+    found = found if found is not None else set()
+    if plan['Node Type'].endswith('Scan'):
+        found.add(f"{plan['Node Type']} {plan.get('Index Name', plan.get('Relation Name', ''))}")
+    for child in plan.get('Plans', []):
+        _scans(child, found)
+    return found
+
+
+def explain(cur, query, params, runs):
+    timings, scans = [], set()
+    for _ in range(runs):
+        cur.execute("EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) " + query, params)
+        result = cur.fetchone()[0][0]
+        timings.append(result['Execution Time'])
+        scans = _scans(result['Plan'])
+    return statistics.median(timings), sorted(scans)
+
+
+def report_queries(cur, lectures):
+    cur.execute("SELECT MIN(scheduled_date), MAX(scheduled_date) FROM Schedule")
+    start, end = (value.isoformat() for value in cur.fetchone())
+    worst_query, worst_params = attendance_query(lectures, start, end, worst=True, limit=10)
+    rollup_query, rollup_params = attendance_query(
+        lectures, start, end, worst=True, limit=10, use_rollup=True)
+    return {
+        'schedule': (SCHEDULE_QUERY, (lectures, start, end)),
+        'worst_attendees': (worst_query, worst_params),
+        'worst_attendees_rollup': (rollup_query, rollup_params),
+    }
+
+
+def run_benchmark(conn, lecture_count, runs):
+    with conn.cursor() as cur:
+        cur.execute("SELECT setseed(0.42)")
+        cur.execute("""
+            SELECT session_id FROM Lecture_Sessions
+            WHERE session_type_id = 1
+            ORDER BY random()
+            LIMIT %s
+        """, (lecture_count,))
+        lectures = [row[0] for row in cur.fetchall()]
+        queries = report_queries(cur, lectures)
+
+    results = {}
+    for phase, prepare in (('before', drop_report_indexes), ('after', setup_report_indexes)):
+        with conn.cursor() as cur:
+            prepare(cur)
+            cur.execute("ANALYZE Schedule")
+            cur.execute("ANALYZE Attendance")
+        conn.commit()
+        with conn.cursor() as cur:
+            for name, (query, params) in queries.items():
+                results.setdefault(name, {})[phase] = explain(cur, query, params, runs)
+        conn.rollback()
+    return results
+
+
+def print_results(results):
+    print(f"\n{'Запрос':<26}{'до, мс':>12}{'после, мс':>12}{'ускорение':>12}")
+    print("-" * 62)
+    for name, phases in results.items():
+        before, after = phases['before'][0], phases['after'][0]
+        print(f"{name:<26}{before:>12.1f}{after:>12.1f}{before / max(after, 0.001):>11.1f}x")
+    print()
+    for name, phases in results.items():
+        for phase in ('before', 'after'):
+            print(f"{name} [{phase}]: {', '.join(phases[phase][1])}")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="EXPLAIN ANALYZE запросов отчета до и после индексов REPORT_INDEXES")
+    parser.add_argument('--generate', action='store_true',
+                        help="пересоздать схему и сгенерировать данные перед замером")
+    parser.add_argument('--students', type=float, default=10000)
+    parser.add_argument('--courses', type=float, default=100)
+    parser.add_argument('--weeks', type=int, default=16)
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--partition-schedule', action='store_true',
+                        help="секционировать Schedule по месяцам при --generate")
+    parser.add_argument('--lectures', type=int, default=10,
+                        help="сколько лекций передавать в запрос отчета")
+    parser.add_argument('--runs', type=int, default=5)
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    if args.generate:
+        drop_tables()
+        setup_tables(partition_schedule=args.partition_schedule)
+        generate(ScalePlan(
+            students=int(args.students),
+            courses=int(args.courses),
+            weeks=args.weeks
+        ), args.workers)
+
+    conn = psycopg2.connect(
+        dbname=DB_NAME,
+        user=DB_USER,
+        password=DB_PASSWORD,
+        host=DB_HOST,
+        port=DB_PORT
+    )
+    try:
+        print_results(run_benchmark(conn, args.lectures, args.runs))
+    finally:
+        conn.close()
@@ -0,0 +1,94 @@
+import argparse
+import sys
+
+import psycopg2
+from env import DB_HOST, DB_NAME, DB_PASSWORD, DB_PORT, DB_USER
+from setup_postgre_tables import ATTENDANCE_ROLLUP_KEY, rebuild_attendance_rollup
+
+
+def find_rollup_mismatches(cur, sample_size):
+    """Сравнивает rollup с агрегатом по сырым данным для случайной выборки студентов.
+
+    Возвращает список (ключ, (total, attended) в сырых данных, то же в rollup).
+    """
+    cur.execute("""
+        SELECT student_id FROM Students
+        ORDER BY random()
+        LIMIT %s
+    """, (sample_size,))
+    student_ids = [row[0] for row in cur.fetchall()]
+    if not student_ids:
+        return student_ids, []
+
+    cur.execute(f"""
+        WITH raw AS (
+            SELECT a.student_id, sch.group_id, sch.session_id, sch.scheduled_date,
+                   COUNT(*) AS total_count,
+                   COUNT(*) FILTER (WHERE a.attended) AS attended_count
+            FROM Attendance a
+            JOIN Schedule sch ON sch.schedule_id = a.schedule_id
+            WHERE a.student_id = ANY(%s)
+              AND sch.group_id IS NOT NULL AND sch.session_id IS NOT NULL
+              AND sch.scheduled_date IS NOT NULL
+            GROUP BY a.student_id, sch.group_id, sch.session_id, sch.scheduled_date
+        ),
+        rollup AS (
+            SELECT {ATTENDANCE_ROLLUP_KEY}, total_count, attended_count
+            FROM Attendance_Rollup
+            WHERE student_id = ANY(%s)
+        )
+        SELECT {ATTENDANCE_ROLLUP_KEY},
+               raw.total_count, raw.attended_count,
+               rollup.total_count, rollup.attended_count
+        FROM raw
+        FULL JOIN rollup USING ({ATTENDANCE_ROLLUP_KEY})
+        WHERE raw.total_count IS DISTINCT FROM rollup.total_count
+           OR raw.attended_count IS DISTINCT FROM rollup.attended_count
+        ORDER BY {ATTENDANCE_ROLLUP_KEY}
+    """, (student_ids, student_ids))
+    mismatches = [(row[:4], row[4:6], row[6:8]) for row in cur.fetchall()]
+    return student_ids, mismatches
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Проверка Attendance_Rollup по сырым данным Attendance")
+    parser.add_argument('--sample', type=int, default=200,
+                        help="сколько случайных студентов проверить")
+    parser.add_argument('--repair', action='store_true',
+                        help="пересчитать rollup для студентов с расхождениями")
+    parser.add_argument('--rebuild', action='store_true',
+                        help="пересчитать rollup целиком и выйти")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    conn = psycopg2.connect(
+        dbname=DB_NAME,
+        user=DB_USER,
+        password=DB_PASSWORD,
+        host=DB_HOST,
+        port=DB_PORT
+    )
+    try:
+        with conn.cursor() as cur:
+            if args.rebuild:
+                rebuild_attendance_rollup(cur)
+                conn.commit()
+                print("Attendance_Rollup пересчитан целиком")
+                sys.exit(0)
+
+            student_ids, mismatches = find_rollup_mismatches(cur, args.sample)
+            print(f"Проверено студентов: {len(student_ids)}, расхождений: {len(mismatches)}")
+            for key, raw, rollup in mismatches[:50]:
+                print(f"  {key}: raw={raw} rollup={rollup}")
+
+            if mismatches and args.repair:
+                rebuild_attendance_rollup(cur, {key[0] for key, _, _ in mismatches})
+                conn.commit()
+                print("Rollup пересчитан для студентов с расхождениями")
+    finally:
+        conn.close()
+
+    sys.exit(1 if mismatches and not args.repair else 0)
@@ -13,6 +13,7 @@ def drop_tables():
     cur = conn.cursor()
 
     try:
+        cur.execute("DROP MATERIALIZED VIEW IF EXISTS Lecture_Room_Demand")
         cur.execute("DROP TABLE IF EXISTS Attendance CASCADE")
         cur.execute("DROP TABLE IF EXISTS Lecture_Materials CASCADE")
         cur.execute("DROP TABLE IF EXISTS Schedule CASCADE")
@@ -26,6 +27,13 @@ def drop_tables():
         cur.execute("DROP TABLE IF EXISTS Departments CASCADE")
         cur.execute("DROP TABLE IF EXISTS Institutes CASCADE")
         cur.execute("DROP TABLE IF EXISTS Universities CASCADE")
+        cur.execute("DROP TABLE IF EXISTS Sync_Changelog CASCADE")
+        cur.execute("DROP TABLE IF EXISTS Sync_Watermarks CASCADE")
+        cur.execute("DROP FUNCTION IF EXISTS sync_log_changes CASCADE")
+        cur.execute("DROP TABLE IF EXISTS Attendance_Rollup CASCADE")
+        cur.execute("DROP FUNCTION IF EXISTS attendance_rollup_apply CASCADE")
+        cur.execute("DROP FUNCTION IF EXISTS attendance_rollup_move_schedule CASCADE")
+        cur.execute("DROP FUNCTION IF EXISTS attendance_rollup_truncate CASCADE")
 
         conn.commit()
         print("Все таблицы успешно удалены!")
@@ -1,9 +1,12 @@
 from datetime import timedelta
+import argparse
+import itertools
 import json
 import random
+import time
 from datetime import datetime
 import psycopg2
-from psycopg2.extras import Json
+from psycopg2.extras import Json, execute_values
 from consts import ATTENDANCE, COURSES, DEPARTMENTS, GROUP_COURSES, INSTITUTES, SCHEDULE, SESSION_TYPES, SPECIALTIES, STUDENT_GROUPS, UNIVERSITIES
 from setup_postgre_tables import DB_HOST, DB_NAME, DB_PASSWORD, DB_PORT, DB_USER
 
@@ -102,78 +105,96 @@ def insert_and_generate_students(cur):
 
     for group_id, group_name in groups:
         for i in range(20):
-            name = f"stud{random.randint(10000, 99999)}"
-            email = f"{name}@university.example"
-
-            current_year = datetime.now().year
-
-            enrollment_year = random.randint(current_year - 4, current_year)
-            age_at_enrollment = random.randint(17, 22)
-            birth_year = enrollment_year - age_at_enrollment
-            month = random.randint(1, 12)
-            day = random.randint(1, 28)
-            date_of_birth = datetime(birth_year, month, day).date()
-
-            group_letter = group_name[0:1].upper()
-            book_number = (
-                f"{str(enrollment_year)[-2:]}"
-                f"{group_letter}"
-                f"{random.randint(1000, 9999):04d}"
-            )
             cur.execute("""
                     INSERT INTO Students (group_id, name, enrollment_year, date_of_birth, email, book_number)
                     VALUES (%s, %s, %s, %s, %s, %s)
-                """, (group_id, name, enrollment_year, date_of_birth, email, book_number)
+                """, make_student(group_id, group_name)
             )
 
 
-def insert_and_generate_lecture_sessions(cur):
-    print('generate_lecture_sessions')
-    lecture_topics = [
-        "Введение в курс", "Основные понятия", "Теоретические основы",
-        "Методология", "История развития", "Современные подходы",
-        "Ключевые концепции", "Продвинутые техники"
-    ]
+def make_student(group_id, group_name, rng=random, current_year=None):
+    """Генерация одного студента для группы"""
+    name = f"stud{rng.randint(10000, 99999)}"
+    email = f"{name}@university.example"
+
+    current_year = current_year or datetime.now().year
+
+    enrollment_year = rng.randint(current_year - 4, current_year)
+    age_at_enrollment = rng.randint(17, 22)
+    birth_year = enrollment_year - age_at_enrollment
+    month = rng.randint(1, 12)
+    day = rng.randint(1, 28)
+    date_of_birth = datetime(birth_year, month, day).date()
+
+    group_letter = group_name[0:1].upper()
+    book_number = (
+        f"{str(enrollment_year)[-2:]}"
+        f"{group_letter}"
+        f"{rng.randint(1000, 9999):04d}"
+    )
+    return (group_id, name, enrollment_year, date_of_birth, email, book_number)
+
+
+LECTURE_TOPICS = [
+    "Введение в курс", "Основные понятия", "Теоретические основы",
+    "Методология", "История развития", "Современные подходы",
+    "Ключевые концепции", "Продвинутые техники"
+]
+
+PRACTICE_TOPICS = [
+    "Решение задач", "Разбор кейсов", "Практическое применение",
+    "Лабораторная работа", "Групповое упражнение", "Тренировочные задания",
+    "Анализ примеров", "Реализация проектов"
+]
+
+
+SPECIAL_DISCIPLINE_SHARE = 0.3
+
+
+def make_lecture_session(course_id, session_type_id, number, rng=random):
+    """Генерация занятия курса: type_id = 1 лекция, иначе семинар"""
+    if session_type_id == 1:
+        topic = f"Лекция {number}: {rng.choice(LECTURE_TOPICS)}"
+        description = f"Теоретическое занятие по теме '{topic.split(': ')[1]}'"
+    else:
+        topic = f"Семинар {number}: {rng.choice(PRACTICE_TOPICS)}"
+        description = f"Практическое занятие по теме '{topic.split(': ')[1]}'"
+    duration = 90
+    tags = {'week': number}
+    if session_type_id == 1:
+        # Лекции специальной дисциплины кафедры учитываются в отчете lab3
+        tags['special_discipline'] = rng.random() < SPECIAL_DISCIPLINE_SHARE
+    return (course_id, session_type_id, topic, duration, description, tags)
 
-    practice_topics = [
-        "Решение задач", "Разбор кейсов", "Практическое применение",
-        "Лабораторная работа", "Групповое упражнение", "Тренировочные задания",
-        "Анализ примеров", "Реализация проектов"
-    ]
 
+def insert_and_generate_lecture_sessions(cur):
+    print('generate_lecture_sessions')
     cur.execute("SELECT course_id FROM Courses;")
     courses = cur.fetchall()
 
     for course in courses:
         course_id = course[0]
 
-        # Лекция (type_id = 1)
-        for i in range(8):
-            topic = f"Лекция {i+1}: {random.choice(lecture_topics)}"
-            duration = 90
-            description = f"Теоретическое занятие по теме '{topic.split(': ')[1]}'"
-            tags = {'week': i+1}
+        # Лекция (type_id = 1), затем семинар (type_id = 2)
+        for session_type_id in (1, 2):
+            for i in range(8):
+                session = make_lecture_session(course_id, session_type_id, i + 1)
+                cur.execute("""
+                    INSERT INTO Lecture_Sessions
+                    (course_id, session_type_id, topic,
+                     duration_minutes, description, tags)
+                    VALUES (%s, %s, %s, %s, %s, %s)
+                """, session[:5] + (Json(session[5]),))
 
-            cur.execute("""
-                INSERT INTO Lecture_Sessions
-                (course_id, session_type_id, topic,
-                 duration_minutes, description, tags)
-                VALUES (%s, %s, %s, %s, %s, %s)
-            """, (course_id, 1, topic, duration, description, Json(tags)))
-
-        # Семинар (type_id = 2)
-        for i in range(8):
-            topic = f"Семинар {i+1}: {random.choice(practice_topics)}"
-            duration = 90
-            description = f"Практическое занятие по теме '{topic.split(': ')[1]}'"
-            tags = {'week': i+1}
 
-            cur.execute("""
-                INSERT INTO Lecture_Sessions
-                (course_id, session_type_id,
-                 topic, duration_minutes, description, tags)
-                VALUES (%s, %s, %s, %s, %s, %s)
-            """, (course_id, 2, topic, duration, description, Json(tags)))
+MATERIAL_TYPES = ['pdf', 'ppt', 'doc', 'video', 'audio', 'zip', 'code']
+
+
+def make_lecture_material(session_id, rng=random, now=None):
+    """Генерация материала к занятию"""
+    file_type = rng.choice(MATERIAL_TYPES)
+    uploaded_at = (now or datetime.now()) - timedelta(days=rng.randint(0, 30))
+    return (session_id, f"/materials/{session_id}", file_type, uploaded_at)
 
 
 def insert_lecture_materials(cur):
@@ -181,22 +202,12 @@ def insert_lecture_materials(cur):
     cur.execute("SELECT course_id FROM Lecture_Sessions;")
     session_ids = cur.fetchall()
 
-    material_types = ['pdf', 'ppt', 'doc', 'video', 'audio', 'zip', 'code']
-
     for session_id in session_ids:
-        file_type = random.choice(material_types)
-        uploaded_at = datetime.now() - timedelta(days=random.randint(0, 30))
-
         cur.execute("""
                     INSERT INTO Lecture_Materials 
                     (session_id, file_path, type, uploaded_at)
                     VALUES ( %s, %s, %s, %s)
-                """, (
-                    session_id,
-                    f"/materials/{session_id}",
-                    file_type,
-                    uploaded_at
-                    ))
+                """, make_lecture_material(session_id))
 
 
 def insert_schedule(cur):
@@ -219,7 +230,242 @@ def insert_attendance(cur):
         )
 
 
-def seed_database():
+ROOMS = ["А-101", "А-102", "Б-203", "Б-204", "Б-205", "Лаб-5", "Лаб-6", "С-101"]
+START_TIMES = ["09:00", "10:30", "12:00", "13:30", "15:00", "16:30"]
+ABSENCE_REASONS = [
+    "Болезнь", "Семейные обстоятельства", "Транспортные проблемы",
+    "Участие в конференции", "Визит к врачу", "Спортивные сборы"
+]
+
+# Таблицы в порядке загрузки и их колонки для COPY
+TABLE_COLUMNS = {
+    'Universities': ('name', 'address', 'founded_date'),
+    'Institutes': ('name', 'university_id'),
+    'Departments': ('name', 'institute_id'),
+    'Specialties': ('code', 'name', 'description'),
+    'Student_Groups': ('name', 'department_id', 'specialty_id', 'course_year'),
+    'Courses': ('name', 'description', 'duration_weeks', 'department_id'),
+    'Session_Types': ('name',),
+    'Students': ('group_id', 'name', 'enrollment_year', 'date_of_birth', 'email', 'book_number'),
+    'Group_Courses': ('group_id', 'course_id'),
+    'Lecture_Sessions': ('course_id', 'session_type_id', 'topic', 'duration_minutes', 'description', 'tags'),
+    'Lecture_Materials': ('session_id', 'file_path', 'type', 'uploaded_at'),
+    'Schedule': ('group_id', 'session_id', 'room', 'scheduled_date', 'start_time'),
+    'Attendance': ('schedule_id', 'student_id', 'attended', 'absence_reason'),
+}
+
+# Количество строк по умолчанию для генерируемых таблиц в режиме --bulk.
+# None для Schedule/Attendance означает загрузку тестовых данных из consts.py
+DEFAULT_ROW_COUNTS = {
+    'students': 240,
+    'lecture_sessions': 160,
+    'lecture_materials': 160,
+    'schedule': None,
+    'attendance': None,
+}
+
+
+def _copy_value(value):
+    if value is None:
+        return '\\N'
+    if isinstance(value, bool):
+        return 't' if value else 'f'
+    if isinstance(value, dict):
+        value = json.dumps(value, ensure_ascii=False)
+    return (str(value)
+            .replace('\\', '\\\\')
+            .replace('\t', '\\t')
+            .replace('\n', '\\n')
+            .replace('\r', '\\r'))
+
+
+class CopyStream:
+    """Файлоподобный объект, отдающий строки генератора в текстовом формате COPY.
+
+    Строки читаются из генератора по мере того, как psycopg2 запрашивает
+    очередной блок, поэтому в памяти находится не больше одного блока.
+    """
+
+    def __init__(self, rows):
+        self._rows = iter(rows)
+        self._buffer = ''
+        self.count = 0
+
+    def read(self, size=-1):
+        parts = [self._buffer]
+        length = len(self._buffer)
+        while size < 0 or length < size:
+            row = next(self._rows, None)
+            if row is None:
+                break
+            line = '\t'.join(_copy_value(v) for v in row) + '\n'
+            parts.append(line)
+            length += len(line)
+            self.count += 1
+        data = ''.join(parts)
+        if size < 0:
+            self._buffer = ''
+            return data
+        self._buffer = data[size:]
+        return data[:size]
+
+
+def copy_rows(cur, table, columns, rows, block_size=1 << 16):
+    """Потоковая загрузка строк через COPY FROM STDIN"""
+    stream = CopyStream(rows)
+    cur.copy_expert(
+        f"COPY {table} ({', '.join(columns)}) FROM STDIN",
+        stream,
+        size=block_size
+    )
+    return stream.count
+
+
+def insert_rows_batched(cur, table, columns, rows, page_size=5000):
+    """Загрузка строк пачками через execute_values"""
+    rows = iter(rows)
+    count = 0
+    sql = f"INSERT INTO {table} ({', '.join(columns)}) VALUES %s"
+    while True:
+        batch = list(itertools.islice(rows, page_size))
+        if not batch:
+            return count
+        batch = [
+            tuple(Json(v) if isinstance(v, dict) else v for v in row)
+            for row in batch
+        ]
+        execute_values(cur, sql, batch, page_size=page_size)
+        count += len(batch)
+
+
+def _fetch_column(cur, query):
+    cur.execute(query)
+    return [row[0] for row in cur.fetchall()]
+
+
+def generate_students(groups, total):
+    """Студенты распределяются по группам по кругу"""
+    for i in range(total):
+        group_id, group_name = groups[i % len(groups)]
+        yield make_student(group_id, group_name)
+
+
+def generate_lecture_sessions(course_ids, total):
+    """Занятия делятся между курсами поровну: первая половина лекции, вторая семинары"""
+    base, extra = divmod(total, len(course_ids))
+    for idx, course_id in enumerate(course_ids):
+        count = base + (1 if idx < extra else 0)
+        lectures = (count + 1) // 2
+        for i in range(count):
+            if i < lectures:
+                yield make_lecture_session(course_id, 1, i + 1)
+            else:
+                yield make_lecture_session(course_id, 2, i - lectures + 1)
+
+
+def generate_lecture_materials(session_ids, total):
+    for i in range(total):
+        yield make_lecture_material(session_ids[i % len(session_ids)])
+
+
+def generate_schedule(group_courses, sessions_by_course, total,
+                      semester_start=datetime(2023, 9, 1).date(), semester_days=120):
+    """Занятия курса ставятся в расписание только тем группам, которые его изучают"""
+    candidates = [
+        (group_id, session_id)
+        for group_id, course_id in group_courses
+        for session_id in sessions_by_course.get(course_id, ())
+    ]
+    if not candidates:
+        return
+    for _ in range(total):
+        group_id, session_id = random.choice(candidates)
+        scheduled_date = semester_start + timedelta(days=random.randint(0, semester_days))
+        yield (group_id, session_id, random.choice(ROOMS),
+               scheduled_date, random.choice(START_TIMES))
+
+
+def generate_attendance(schedule_groups, students_by_group, total, attend_probability=0.8):
+    """Отметки для всех студентов группы по каждому занятию, не больше total строк"""
+    count = 0
+    for schedule_id, group_id in schedule_groups:
+        for student_id in students_by_group.get(group_id, ()):
+            if count >= total:
+                return
+            attended = random.random() < attend_probability
+            reason = None if attended else random.choice(ABSENCE_REASONS)
+            yield (schedule_id, student_id, attended, reason)
+            count += 1
+
+
+def bulk_seed(cur, method='copy', row_counts=None):
+    """Заполнение БД потоковой загрузкой, возвращает {таблица: (строк, секунд)}"""
+    counts = dict(DEFAULT_ROW_COUNTS)
+    counts.update(row_counts or {})
+    load = copy_rows if method == 'copy' else insert_rows_batched
+    timings = {}
+
+    def run(table, rows):
+        print(f"Загрузка {table}...")
+        started = time.perf_counter()
+        loaded = load(cur, table, TABLE_COLUMNS[table], rows)
+        timings[table] = (loaded, time.perf_counter() - started)
+
+    run('Universities', UNIVERSITIES)
+    run('Institutes', INSTITUTES)
+    run('Departments', DEPARTMENTS)
+    run('Specialties', SPECIALTIES)
+    run('Student_Groups', STUDENT_GROUPS)
+    run('Courses', COURSES)
+    run('Session_Types', SESSION_TYPES)
+
+    cur.execute("SELECT group_id, name FROM Student_Groups ORDER BY group_id")
+    groups = cur.fetchall()
+    run('Students', generate_students(groups, counts['students']))
+    run('Group_Courses', GROUP_COURSES)
+
+    course_ids = _fetch_column(cur, "SELECT course_id FROM Courses ORDER BY course_id")
+    run('Lecture_Sessions', generate_lecture_sessions(course_ids, counts['lecture_sessions']))
+
+    session_ids = _fetch_column(cur, "SELECT session_id FROM Lecture_Sessions ORDER BY session_id")
+    run('Lecture_Materials', generate_lecture_materials(session_ids, counts['lecture_materials']))
+
+    if counts['schedule'] is None:
+        run('Schedule', SCHEDULE)
+    else:
+        cur.execute("SELECT session_id, course_id FROM Lecture_Sessions")
+        sessions_by_course = {}
+        for session_id, course_id in cur.fetchall():
+            sessions_by_course.setdefault(course_id, []).append(session_id)
+        run('Schedule', generate_schedule(GROUP_COURSES, sessions_by_course, counts['schedule']))
+
+    if counts['attendance'] is None:
+        run('Attendance', ATTENDANCE)
+    else:
+        cur.execute("SELECT student_id, group_id FROM Students")
+        students_by_group = {}
+        for student_id, group_id in cur.fetchall():
+            students_by_group.setdefault(group_id, []).append(student_id)
+        cur.execute("SELECT schedule_id, group_id FROM Schedule ORDER BY schedule_id")
+        schedule_groups = cur.fetchall()
+        run('Attendance', generate_attendance(schedule_groups, students_by_group, counts['attendance']))
+
+    return timings
+
+
+def print_timing_summary(timings):
+    print(f"\n{'Таблица':<20}{'строк':>12}{'сек':>10}{'строк/с':>12}")
+    print("-" * 54)
+    for table, (rows, seconds) in timings.items():
+        rate = rows / seconds if seconds else 0
+        print(f"{table:<20}{rows:>12}{seconds:>10.2f}{rate:>12.0f}")
+    total_rows = sum(rows for rows, _ in timings.values())
+    total_seconds = sum(seconds for _, seconds in timings.values())
+    print("-" * 54)
+    print(f"{'Итого':<20}{total_rows:>12}{total_seconds:>10.2f}")
+
+
+def seed_database(bulk=False, method='copy', row_counts=None):
     """Основная функция для заполнения БД"""
     conn = psycopg2.connect(
         dbname=DB_NAME,
@@ -231,23 +477,28 @@ def seed_database():
     cur = conn.cursor()
 
     try:
-        # Вызываем функции по порядку с учетом зависимостей
-        insert_universities(cur)
-        insert_institutes(cur)
-        insert_departments(cur)
-        insert_specialties(cur)
-        insert_student_groups(cur)
-        insert_courses(cur)
-        insert_session_types(cur)
-        insert_and_generate_students(cur)
-        insert_group_courses(cur)
-        insert_and_generate_lecture_sessions(cur)
-        insert_lecture_materials(cur)
-        insert_schedule(cur)
-        insert_attendance(cur)
+        if bulk:
+            timings = bulk_seed(cur, method=method, row_counts=row_counts)
+        else:
+            # Вызываем функции по порядку с учетом зависимостей
+            insert_universities(cur)
+            insert_institutes(cur)
+            insert_departments(cur)
+            insert_specialties(cur)
+            insert_student_groups(cur)
+            insert_courses(cur)
+            insert_session_types(cur)
+            insert_and_generate_students(cur)
+            insert_group_courses(cur)
+            insert_and_generate_lecture_sessions(cur)
+            insert_lecture_materials(cur)
+            insert_schedule(cur)
+            insert_attendance(cur)
 
         conn.commit()
         print("Данные успешно добавлены в БД Postgres")
+        if bulk:
+            print_timing_summary(timings)
 
     except Exception as e:
         conn.rollback()
@@ -257,6 +508,27 @@ def seed_database():
         conn.close()
 
 
+def _parse_row_count(value):
+    table, sep, count = value.partition('=')
+    if not sep or table not in DEFAULT_ROW_COUNTS:
+        raise argparse.ArgumentTypeError(
+            f"ожидается таблица=число, таблицы: {', '.join(DEFAULT_ROW_COUNTS)}")
+    return table, int(float(count))
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Заполнение БД тестовыми данными")
+    parser.add_argument('--bulk', action='store_true',
+                        help="потоковая загрузка через COPY/execute_values")
+    parser.add_argument('--method', choices=['copy', 'values'], default='copy',
+                        help="способ загрузки в режиме --bulk")
+    parser.add_argument('--rows', nargs='*', type=_parse_row_count, default=[],
+                        metavar='TABLE=N',
+                        help="количество строк для генерируемых таблиц, например attendance=500000")
+    return parser.parse_args()
+
+
 # Запуск заполнения БД
 if __name__ == "__main__":
-    seed_database()
+    args = parse_args()
+    seed_database(bulk=args.bulk, method=args.method, row_counts=dict(args.rows))
@@ -0,0 +1,110 @@
+import datetime
+import hashlib
+import hmac
+import time
+import uuid
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+import jwt
+
+
+def create_access_token(identity: str, secret: str, expires: int) -> str:
+    """Токен с теми же claims, что выдавал flask_jwt_extended"""
+    now = datetime.datetime.now(datetime.timezone.utc)
+    payload = {
+        'sub': identity,
+        'iat': now,
+        'nbf': now,
+        'exp': now + datetime.timedelta(seconds=expires),
+        'jti': str(uuid.uuid4()),
+        'type': 'access',
+        'fresh': False,
+    }
+    return jwt.encode(payload, secret, algorithm='HS256')
+
+
+def credentials_match(data: Dict, expected: Dict) -> bool:
+    """Сравнение за постоянное время; оба поля проверяются всегда"""
+    username = str(data.get('username', '')).encode('utf-8')
+    password = str(data.get('password', '')).encode('utf-8')
+    username_ok = hmac.compare_digest(username, expected['username'].encode('utf-8'))
+    password_ok = hmac.compare_digest(password, expected['password'].encode('utf-8'))
+    return username_ok and password_ok
+
+
+class TokenVerifier:
+    """Проверка JWT с LRU-кэшем уже проверенных токенов.
+
+    Ключ — SHA-256 токена, а не сам токен. Запись живет не дольше exp
+    токена, поэтому кэш не продлевает срок его действия. Токены, не
+    прошедшие проверку, не кэшируются.
+    """
+
+    def __init__(self, secret: str, max_entries: int = 10000):
+        self.secret = secret
+        self.max_entries = max_entries
+        self._cache: 'OrderedDict[bytes, Dict]' = OrderedDict()
+        self.counters = {'cached': 0, 'verified': 0, 'rejected': 0, 'expired': 0}
+
+    def verify(self, token: str) -> Dict:
+        """Claims токена; jwt.InvalidTokenError при ошибке проверки"""
+        key = hashlib.sha256(token.encode('utf-8')).digest()
+        claims = self._cache.get(key)
+        if claims is not None:
+            if claims['exp'] > time.time():
+                self._cache.move_to_end(key)
+                self.counters['cached'] += 1
+                return claims
+            del self._cache[key]
+
+        try:
+            claims = jwt.decode(token, self.secret, algorithms=['HS256'],
+                                options={'require': ['exp', 'sub']})
+        except jwt.ExpiredSignatureError:
+            self.counters['expired'] += 1
+            raise
+        except jwt.InvalidTokenError:
+            self.counters['rejected'] += 1
+            raise
+        self.counters['verified'] += 1
+
+        self._cache[key] = claims
+        if len(self._cache) > self.max_entries:
+            self._cache.popitem(last=False)
+        return claims
+
+    def stats(self) -> Dict:
+        return dict(self.counters, entries=len(self._cache))
+
+
+class RateLimiter:
+    """Token bucket на каждого пользователя: rate запросов в секунду, запас burst"""
+
+    def __init__(self, rate: float, burst: int, max_identities: int = 10000):
+        self.rate = rate
+        self.burst = burst
+        self.max_identities = max_identities
+        self._buckets: 'OrderedDict[str, Tuple[float, float]]' = OrderedDict()
+        self.counters = {'allowed': 0, 'limited': 0}
+
+    def acquire(self, identity: str) -> Optional[float]:
+        """None, если запрос разрешен, иначе через сколько секунд повторить"""
+        now = time.monotonic()
+        tokens, updated = self._buckets.pop(identity, (float(self.burst), now))
+        tokens = min(float(self.burst), tokens + (now - updated) * self.rate)
+        if tokens >= 1:
+            retry_after = None
+            tokens -= 1
+            self.counters['allowed'] += 1
+        else:
+            retry_after = (1 - tokens) / self.rate
+            self.counters['limited'] += 1
+        self._buckets[identity] = (tokens, now)
+        if len(self._buckets) > self.max_identities:
+            # Давно не обращавшиеся пользователи все равно получили бы полный запас
+            self._buckets.popitem(last=False)
+        return retry_after
+
+    def stats(self) -> Dict:
+        return dict(self.counters, identities=len(self._buckets))
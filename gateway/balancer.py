@@ -0,0 +1,131 @@
+import itertools
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+class Upstream:
+    """Экземпляр сервиса с пассивной проверкой здоровья и предохранителем.
+
+    После failure_threshold ошибок подряд экземпляр исключается из выбора
+    на reset_timeout секунд, затем пропускает один пробный запрос: успех
+    возвращает его в работу, ошибка снова размыкает цепь.
+    """
+
+    def __init__(self, url: str, failure_threshold: int = 3, reset_timeout: float = 30.0):
+        self.url = url.rstrip('/')
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = CLOSED
+        self.active = 0
+        self.failures = 0
+        self.opened_at = 0.0
+        self.requests = 0
+        self.errors = 0
+
+    def available(self, now: float) -> bool:
+        if self.state == CLOSED:
+            return True
+        if self.state == OPEN and now - self.opened_at >= self.reset_timeout:
+            self.state = HALF_OPEN
+        # В полуоткрытом состоянии пропускаем только один запрос
+        return self.state == HALF_OPEN and self.active == 0
+
+    def on_success(self):
+        self.failures = 0
+        self.state = CLOSED
+
+    def on_failure(self):
+        self.errors += 1
+        self.failures += 1
+        if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+            self.state = OPEN
+            self.opened_at = time.monotonic()
+
+    def stats(self) -> Dict:
+        return {
+            'url': self.url,
+            'state': self.state,
+            'active': self.active,
+            'requests': self.requests,
+            'errors': self.errors,
+        }
+
+
+class UpstreamPool:
+    """Экземпляры одного сервиса и стратегия выбора между ними.
+
+    Работает в одном цикле событий, поэтому счетчики не требуют блокировок.
+    """
+
+    STRATEGIES = ('round_robin', 'least_connections')
+
+    def __init__(self, name: str, urls: List[str], strategy: str = 'round_robin',
+                 failure_threshold: int = 3, reset_timeout: float = 30.0):
+        if strategy not in self.STRATEGIES:
+            raise ValueError(f"Неизвестная стратегия балансировки: {strategy}")
+        if not urls:
+            raise ValueError(f"Для маршрута {name} не задан ни один экземпляр")
+        self.name = name
+        self.strategy = strategy
+        self.upstreams = [Upstream(url, failure_threshold, reset_timeout) for url in urls]
+        self._cycle = itertools.cycle(range(len(self.upstreams)))
+
+    def choose(self, exclude=()) -> Optional[Upstream]:
+        now = time.monotonic()
+        candidates = [u for u in self.upstreams if u not in exclude and u.available(now)]
+        if not candidates:
+            return None
+        if self.strategy == 'least_connections':
+            return min(candidates, key=lambda u: u.active)
+        for _ in range(len(self.upstreams)):
+            upstream = self.upstreams[next(self._cycle)]
+            if upstream in candidates:
+                return upstream
+        return candidates[0]
+
+    @contextmanager
+    def track(self, upstream: Upstream) -> Iterator[Upstream]:
+        upstream.active += 1
+        upstream.requests += 1
+        try:
+            yield upstream
+        finally:
+            upstream.active -= 1
+
+    def stats(self) -> Dict:
+        return {
+            'strategy': self.strategy,
+            'upstreams': [u.stats() for u in self.upstreams],
+        }
+
+
+class RouteTable:
+    """Префикс пути -> пул экземпляров.
+
+    prefixes отсортированы от длинного к короткому: create_app регистрирует
+    маршруты в этом порядке, и роутер aiohttp выбирает самый длинный префикс.
+    """
+
+    def __init__(self, routes: Dict[str, Dict]):
+        self.pools: Dict[str, UpstreamPool] = {}
+        for prefix, config in routes.items():
+            self.pools[prefix] = UpstreamPool(
+                prefix,
+                config['upstreams'],
+                strategy=config.get('strategy', 'round_robin'),
+                failure_threshold=config.get('failure_threshold', 3),
+                reset_timeout=config.get('reset_timeout', 30.0)
+            )
+        self._prefixes = sorted(self.pools, key=len, reverse=True)
+
+    @property
+    def prefixes(self) -> List[str]:
+        return list(self._prefixes)
+
+    def stats(self) -> Dict[str, Dict]:
+        return {prefix: pool.stats() for prefix, pool in self.pools.items()}
@@ -1 +1,41 @@
+import json
+import os
+
 HARDCODED_USER = {'username': 'user', 'password': 'user'}
+# curl auth command: curl -X POST http://localhost:1337/auth/login -H "Content-Type: application/json" -d @auth.json
+
+JWT_SECRET_KEY = os.getenv('JWT_SECRET_KEY', 'super-secret-key')
+JWT_ACCESS_TOKEN_EXPIRES = int(os.getenv('JWT_ACCESS_TOKEN_EXPIRES', 900))
+UPSTREAM_CONNECT_TIMEOUT = float(os.getenv('UPSTREAM_CONNECT_TIMEOUT', 3))
+UPSTREAM_TIMEOUT = float(os.getenv('UPSTREAM_TIMEOUT', 60))
+UPSTREAM_MAX_CONNECTIONS = int(os.getenv('UPSTREAM_MAX_CONNECTIONS', 100))
+UPSTREAM_KEEPALIVE = float(os.getenv('UPSTREAM_KEEPALIVE', 30))
+GATEWAY_MAX_CONCURRENCY = int(os.getenv('GATEWAY_MAX_CONCURRENCY', 200))
+GATEWAY_QUEUE_TIMEOUT = float(os.getenv('GATEWAY_QUEUE_TIMEOUT', 5))
+STREAM_CHUNK_SIZE = int(os.getenv('STREAM_CHUNK_SIZE', 64 * 1024))
+UPSTREAM_FAILURE_THRESHOLD = int(os.getenv('UPSTREAM_FAILURE_THRESHOLD', 3))
+UPSTREAM_RESET_TIMEOUT = float(os.getenv('UPSTREAM_RESET_TIMEOUT', 30))
+BALANCING_STRATEGY = os.getenv('BALANCING_STRATEGY', 'round_robin')
+
+
+def _route(urls: str) -> dict:
+    # Несколько экземпляров задаются через запятую: LAB1_URL=http://a:5001,http://b:5001
+    return {
+        'upstreams': [url.strip() for url in urls.split(',') if url.strip()],
+        'strategy': BALANCING_STRATEGY,
+        'failure_threshold': UPSTREAM_FAILURE_THRESHOLD,
+        'reset_timeout': UPSTREAM_RESET_TIMEOUT,
+    }
+
+
+# Таблицу маршрутов можно задать целиком в GATEWAY_ROUTES (JSON в том же формате)
+ROUTES = json.loads(os.getenv('GATEWAY_ROUTES', 'null')) or {
+    prefix: _route(urls)
+    for prefix, urls in (('/api/lab1/', os.getenv('LAB1_URL', 'http://lab1:5001')),
+                         ('/api/lab2/', os.getenv('LAB2_URL')),
+                         ('/api/lab3/', os.getenv('LAB3_URL')))
+    if urls
+}
+JWT_CACHE_SIZE = int(os.getenv('JWT_CACHE_SIZE', 10000))
+RATE_LIMIT_PER_SECOND = float(os.getenv('RATE_LIMIT_PER_SECOND', 5))
+RATE_LIMIT_BURST = int(os.getenv('RATE_LIMIT_BURST', 20))
@@ -1,35 +1,228 @@
-# curl auth command: curl -X POST http://localhost:1337/auth/login -H "Content-Type: application/json" -d @auth.json
-from flask import Flask, request, jsonify
-import os
-from flask_jwt_extended import JWTManager, create_access_token, jwt_required
-import requests
-from const import HARDCODED_USER
-
-app = Flask(__name__)
-app.config['JWT_SECRET_KEY'] = os.getenv('JWT_SECRET_KEY', 'super-secret-key')
-jwt = JWTManager(app)
-
-
-@app.route('/auth/login', methods=['POST'])
-def login():
-    data = request.get_json(force=True)
-    if data.get('username') != HARDCODED_USER['username'] or data.get('password') != HARDCODED_USER['password']:
-        return jsonify({'msg': 'Неверные учетные данные'}), 401
-    token = create_access_token(identity=data['username'])
-    return jsonify(access_token=token), 200
-
-
-@app.route('/api/lab1/report', methods=['POST'])
-@jwt_required()
-def proxy_lab1():
-    base_url = os.getenv(f'LAB1_URL')
-    resp = requests.post(
-        f"{base_url}/api/lab1/report",
-        json=request.get_json(force=True),
-        headers={'Content-Type': 'application/json'}
+import asyncio
+import logging
+import math
+import time
+
+import aiohttp
+import jwt
+from aiohttp import web
+
+from auth import RateLimiter, TokenVerifier, create_access_token, credentials_match
+from balancer import RouteTable, Upstream, UpstreamPool
+from const import (GATEWAY_MAX_CONCURRENCY, GATEWAY_QUEUE_TIMEOUT, HARDCODED_USER,
+                   JWT_ACCESS_TOKEN_EXPIRES, JWT_CACHE_SIZE, JWT_SECRET_KEY,
+                   RATE_LIMIT_BURST, RATE_LIMIT_PER_SECOND, ROUTES, STREAM_CHUNK_SIZE,
+                   UPSTREAM_CONNECT_TIMEOUT, UPSTREAM_KEEPALIVE, UPSTREAM_MAX_CONNECTIONS,
+                   UPSTREAM_TIMEOUT)
+from metrics import (RESPONSE_BYTES, UPSTREAM_LATENCY, metrics_handler,
+                     metrics_middleware)
+
+logger = logging.getLogger(__name__)
+
+# Заголовки, которые передаются между клиентом и сервисами без изменений
+FORWARDED_REQUEST_HEADERS = ('Content-Type', 'Accept')
+FORWARDED_RESPONSE_HEADERS = ('Content-Type', 'Content-Length', 'Cache-Control')
+
+
+def jwt_required(handler):
+    async def wrapper(request: web.Request):
+        header = request.headers.get('Authorization', '')
+        if not header:
+            return web.json_response({'msg': 'Missing Authorization Header'}, status=401)
+        scheme, _, token = header.partition(' ')
+        if scheme != 'Bearer' or not token:
+            return web.json_response(
+                {'msg': "Bad Authorization header. Expected 'Authorization: Bearer <JWT>'"},
+                status=422)
+        verifier: TokenVerifier = request.app['token_verifier']
+        try:
+            claims = verifier.verify(token)
+        except jwt.ExpiredSignatureError:
+            return web.json_response({'msg': 'Token has expired'}, status=401)
+        except jwt.InvalidTokenError as e:
+            return web.json_response({'msg': str(e)}, status=422)
+        if claims.get('type') != 'access':
+            return web.json_response({'msg': 'Only non-refresh tokens are allowed'}, status=422)
+        request['identity'] = claims['sub']
+        return await handler(request)
+
+    return wrapper
+
+
+def rate_limited(handler):
+    """Ограничение частоты запросов пользователя; применяется после jwt_required"""
+    async def wrapper(request: web.Request):
+        limiter: RateLimiter = request.app['rate_limiter']
+        retry_after = limiter.acquire(request['identity'])
+        if retry_after is not None:
+            return web.json_response(
+                {'msg': 'Слишком много запросов'}, status=429,
+                headers={'Retry-After': str(max(1, math.ceil(retry_after)))})
+        return await handler(request)
+
+    return wrapper
+
+
+async def login(request: web.Request):
+    try:
+        data = await request.json()
+    except ValueError:
+        return web.json_response({'msg': 'Некорректный JSON'}, status=400)
+    if not isinstance(data, dict) or not credentials_match(data, HARDCODED_USER):
+        return web.json_response({'msg': 'Неверные учетные данные'}, status=401)
+    token = create_access_token(data['username'], JWT_SECRET_KEY, JWT_ACCESS_TOKEN_EXPIRES)
+    return web.json_response({'access_token': token}, status=200)
+
+
+# Ответы, после которых экземпляр считается неисправным
+UPSTREAM_FAILURE_STATUSES = {502, 503, 504}
+
+
+async def _stream_response(request: web.Request, resp: aiohttp.ClientResponse,
+                           upstream: Upstream, started: float) -> web.StreamResponse:
+    response = web.StreamResponse(status=resp.status)
+    for name in FORWARDED_RESPONSE_HEADERS:
+        if name in resp.headers:
+            response.headers[name] = resp.headers[name]
+    await response.prepare(request)
+    size = 0
+    try:
+        async for chunk in resp.content.iter_chunked(STREAM_CHUNK_SIZE):
+            size += len(chunk)
+            await response.write(chunk)
+    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+        # Заголовки уже отправлены клиенту, поэтому вместо нового ответа
+        # обрываем соединение: клиент увидит незавершенное тело
+        upstream.on_failure()
+        UPSTREAM_LATENCY.labels(upstream.url, 'stream_error').observe(
+            time.perf_counter() - started)
+        logger.warning(f"Upstream {upstream.url} failed after {size} bytes: {e!r}")
+        if request.transport is not None:
+            request.transport.close()
+        return response
+    await response.write_eof()
+    RESPONSE_BYTES.labels(upstream.url).observe(size)
+    return response
+
+
+async def proxy(request: web.Request, pool: UpstreamPool) -> web.StreamResponse:
+    """Проксирование без разбора JSON: ответ передается потоком байтов.
+
+    Тело запроса (небольшой JSON) читается целиком, чтобы при отказе в
+    соединении повторить его на другом экземпляре. После того как запрос
+    ушел в сервис, повторов нет.
+    """
+    limiter: asyncio.Semaphore = request.app['upstream_limiter']
+    try:
+        await asyncio.wait_for(limiter.acquire(), timeout=GATEWAY_QUEUE_TIMEOUT)
+    except asyncio.TimeoutError:
+        return web.json_response({'msg': 'Сервис перегружен, повторите запрос позже'}, status=503)
+
+    try:
+        session: aiohttp.ClientSession = request.app['upstream_session']
+        headers = {name: request.headers[name]
+                   for name in FORWARDED_REQUEST_HEADERS if name in request.headers}
+        headers.setdefault('Content-Type', 'application/json')
+        body = await request.read() if request.body_exists else None
+
+        tried = set()
+        while True:
+            upstream = pool.choose(exclude=tried)
+            if upstream is None:
+                return web.json_response(
+                    {'msg': 'Нет доступных экземпляров сервиса'}, status=503)
+            tried.add(upstream)
+            started = time.perf_counter()
+            with pool.track(upstream):
+                try:
+                    async with session.request(
+                        request.method,
+                        f"{upstream.url}{request.path}",
+                        params=request.query,
+                        data=body,
+                        headers=headers
+                    ) as resp:
+                        UPSTREAM_LATENCY.labels(upstream.url, str(resp.status)).observe(
+                            time.perf_counter() - started)
+                        if resp.status in UPSTREAM_FAILURE_STATUSES:
+                            upstream.on_failure()
+                        else:
+                            upstream.on_success()
+                        return await _stream_response(request, resp, upstream, started)
+                except aiohttp.ClientConnectorError:
+                    upstream.on_failure()
+                    UPSTREAM_LATENCY.labels(upstream.url, 'connect_error').observe(
+                        time.perf_counter() - started)
+                    continue
+                except asyncio.TimeoutError:
+                    upstream.on_failure()
+                    UPSTREAM_LATENCY.labels(upstream.url, 'timeout').observe(
+                        time.perf_counter() - started)
+                    return web.json_response(
+                        {'msg': 'Превышено время ожидания сервиса'}, status=504)
+                except aiohttp.ClientError as e:
+                    upstream.on_failure()
+                    UPSTREAM_LATENCY.labels(upstream.url, 'error').observe(
+                        time.perf_counter() - started)
+                    return web.json_response({'msg': f'Сервис недоступен: {e}'}, status=502)
+    finally:
+        limiter.release()
+
+
+def route_handler(pool: UpstreamPool):
+    @jwt_required
+    @rate_limited
+    async def handler(request: web.Request):
+        return await proxy(request, pool)
+
+    return handler
+
+
+async def gateway_status(request: web.Request):
+    return web.json_response(request.app['routes'].stats())
+
+
+async def auth_status(request: web.Request):
+    return web.json_response({
+        'tokens': request.app['token_verifier'].stats(),
+        'rate_limit': request.app['rate_limiter'].stats(),
+    })
+
+
+async def upstream_session(app: web.Application):
+    connector = aiohttp.TCPConnector(
+        limit=UPSTREAM_MAX_CONNECTIONS,
+        keepalive_timeout=UPSTREAM_KEEPALIVE
     )
-    return jsonify(resp.json()), resp.status_code
+    timeout = aiohttp.ClientTimeout(
+        total=UPSTREAM_TIMEOUT,
+        sock_connect=UPSTREAM_CONNECT_TIMEOUT
+    )
+    app['upstream_session'] = aiohttp.ClientSession(
+        connector=connector,
+        timeout=timeout,
+        auto_decompress=False
+    )
+    app['upstream_limiter'] = asyncio.Semaphore(GATEWAY_MAX_CONCURRENCY)
+    yield
+    await app['upstream_session'].close()
+
+
+def create_app() -> web.Application:
+    routes = RouteTable(ROUTES)
+    app = web.Application(middlewares=[metrics_middleware])
+    app['routes'] = routes
+    app['token_verifier'] = TokenVerifier(JWT_SECRET_KEY, max_entries=JWT_CACHE_SIZE)
+    app['rate_limiter'] = RateLimiter(RATE_LIMIT_PER_SECOND, RATE_LIMIT_BURST)
+    app.cleanup_ctx.append(upstream_session)
+    app.router.add_post('/auth/login', login)
+    app.router.add_get('/gateway/upstreams', gateway_status)
+    app.router.add_get('/gateway/auth', auth_status)
+    app.router.add_get('/metrics', metrics_handler)
+    for prefix in routes.prefixes:
+        app.router.add_route('*', prefix + '{tail:.*}', route_handler(routes.pools[prefix]))
+    return app
 
 
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=1337)
+    web.run_app(create_app(), host='0.0.0.0', port=1337)
@@ -0,0 +1,45 @@
+import time
+
+from aiohttp import web
+from prometheus_client import CONTENT_TYPE_LATEST, Histogram, generate_latest
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+BYTES_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+
+REQUEST_LATENCY = Histogram(
+    'gateway_http_request_duration_seconds', 'Время обработки запроса шлюзом',
+    ['route', 'method', 'status'], buckets=LATENCY_BUCKETS)
+UPSTREAM_LATENCY = Histogram(
+    'gateway_upstream_latency_seconds', 'Время до заголовков ответа сервиса',
+    ['upstream', 'outcome'], buckets=LATENCY_BUCKETS)
+RESPONSE_BYTES = Histogram(
+    'gateway_response_bytes', 'Размер тела ответа, переданного потоком',
+    ['upstream'], buckets=BYTES_BUCKETS)
+
+
+def _route(request: web.Request) -> str:
+    route = request.match_info.route
+    resource = route.resource if route is not None else None
+    return resource.canonical if resource is not None else 'unmatched'
+
+
+@web.middleware
+async def metrics_middleware(request: web.Request, handler):
+    started = time.perf_counter()
+    status = 500
+    try:
+        response = await handler(request)
+        status = response.status
+        return response
+    except web.HTTPException as e:
+        status = e.status
+        raise
+    finally:
+        REQUEST_LATENCY.labels(_route(request), request.method, str(status)).observe(
+            time.perf_counter() - started)
+
+
+async def metrics_handler(request: web.Request):
+    response = web.Response(body=generate_latest())
+    response.headers['Content-Type'] = CONTENT_TYPE_LATEST
+    return response
@@ -1,12 +1,69 @@
-from flask import Flask, request, jsonify
-from const import NEO4J_PASSWORD, NEO4J_URI, NEO4J_USER
+import atexit
+import json
+import time
+from datetime import date
 
+from flask import Flask, Response, request, jsonify, stream_with_context
+
+from connections import ConnectionRegistry
+from const import (LECTURE_SEARCH_MODE, PG_POOL_MAXCONN, PG_POOL_MINCONN,
+                   REPORT_ASYNC_PIPELINE, REPORT_ASYNC_TIMEOUT,
+                   REPORT_CACHE_ENABLED, REPORT_CACHE_MAX_ENTRIES, REPORT_CACHE_TTL,
+                   REPORT_PARTITION_WORKERS, REPORT_USE_ROLLUP, SESSION_TYPE_CACHE_TTL,
+                   TRACE_FILE)
+from report_cache import ReportCache
 from session_type_search import SessionTypeSearch
 from lab import AttendanceFinder
 from lecture_session import LectureMaterialSearcher
+from metrics import configure_tracing, instrument_app
 
 
 app = Flask(__name__)
+instrument_app(app, service='lab1')
+trace_sink = configure_tracing(TRACE_FILE)
+if trace_sink is not None:
+    atexit.register(trace_sink.close)
+
+# Соединения со всеми хранилищами создаются один раз на процесс. С асинхронным
+# конвейером отчеты идут через asyncpg, а синхронному пулу остаются сводки:
+# PG_POOL_MAXCONN делится между пулами, чтобы не удваивать соединения
+pg_maxconn = PG_POOL_MAXCONN
+async_pg_maxconn = 0
+if REPORT_ASYNC_PIPELINE:
+    async_pg_maxconn = max(1, PG_POOL_MAXCONN // 2)
+    pg_maxconn = max(1, PG_POOL_MAXCONN - async_pg_maxconn)
+registry = ConnectionRegistry(
+    pg_minconn=min(PG_POOL_MINCONN, pg_maxconn), pg_maxconn=pg_maxconn)
+atexit.register(registry.close)
+
+session_searcher = SessionTypeSearch(client=registry.redis, cache_ttl=SESSION_TYPE_CACHE_TTL)
+atexit.register(session_searcher.close)
+es_searcher = LectureMaterialSearcher(es=registry.elastic, mode=LECTURE_SEARCH_MODE)
+finder = AttendanceFinder(
+    driver=registry.neo4j,
+    pg_pool=registry.postgres,
+    partition_workers=REPORT_PARTITION_WORKERS,
+    use_rollup=REPORT_USE_ROLLUP
+)
+# Асинхронный конвейер отчета; при REPORT_ASYNC_PIPELINE=0 — последовательный путь
+report_pipeline = None
+if REPORT_ASYNC_PIPELINE:
+    from async_report import AsyncReportPipeline
+    report_pipeline = AsyncReportPipeline(
+        session_searcher,
+        use_rollup=REPORT_USE_ROLLUP,
+        timeout=REPORT_ASYNC_TIMEOUT,
+        search_mode=LECTURE_SEARCH_MODE,
+        pg_minconn=min(PG_POOL_MINCONN, async_pg_maxconn),
+        pg_maxconn=async_pg_maxconn
+    )
+    # health, stats и close реестра охватывают и клиентов конвейера
+    registry.register('report_pipeline', report_pipeline)
+report_cache = ReportCache(
+    registry.redis,
+    ttl=REPORT_CACHE_TTL,
+    max_entries=REPORT_CACHE_MAX_ENTRIES
+)
 
 
 def has_all_required_fields(data, required_fields):
@@ -15,6 +72,50 @@ def has_all_required_fields(data, required_fields):
     return True
 
 
+def invalid_period(data):
+    """Описание ошибки в start_date/end_date или None"""
+    try:
+        start = date.fromisoformat(data['start_date'])
+        end = date.fromisoformat(data['end_date'])
+    except (TypeError, ValueError):
+        return 'start_date and end_date must be dates in YYYY-MM-DD format'
+    if start > end:
+        return 'start_date must not be later than end_date'
+    return None
+
+
+def find_lecture_ids(name):
+    # Filter lectures with type 'Лекция'
+    sessions_id = session_searcher.get_by_name('Лекция')
+    return es_searcher.search_by_course_and_session_type(name, sessions_id[0]['id'])
+
+
+def elapsed_ms(started):
+    return round((time.perf_counter() - started) * 1000, 3)
+
+
+def encode_cursor(key):
+    return f"{key[0]}:{key[1]}" if key else None
+
+
+def decode_cursor(cursor):
+    if not isinstance(cursor, str):
+        raise ValueError('cursor must be a string')
+    student_id, group_id = cursor.split(':')
+    return int(student_id), int(group_id)
+
+
+def ndjson_lines(rows):
+    """Строки NDJSON; ошибка посреди потока (статус 200 уже отправлен)
+    передается последней строкой {"error": ...}"""
+    try:
+        for row in rows:
+            yield json.dumps(row, ensure_ascii=False, default=str) + '\n'
+    except Exception as e:
+        app.logger.error(f"Error: {e}")
+        yield json.dumps({'error': 'Data processing failed'}) + '\n'
+
+
 @app.route('/api/lab1/report', methods=['POST'])
 def generate_attendance_report():
     if not request.is_json:
@@ -24,55 +125,154 @@ def generate_attendance_report():
 
     required_fields = ['name', 'start_date', 'end_date']
     if not has_all_required_fields(data, required_fields):
-        jsonify({
+        return jsonify({
             'error': f"Missing required fields: {required_fields}",
             'received': list(data.keys())
         }), 400
 
-    # Find All Lectures
+    period_error = invalid_period(data)
+    if period_error:
+        return jsonify({'error': period_error}), 400
 
-    # Filter lectures with type 'Лекция'
-    session_searcher = SessionTypeSearch()
-    sessions_id = session_searcher.get_by_name('Лекция')
+    timings = {}
 
-    es_searcher = LectureMaterialSearcher()
-    lecture_sessions_ids = es_searcher.search_by_course_and_session_type(
-        data['name'], sessions_id[0]['id'])
+    def build_report():
+        if report_pipeline is not None:
+            report, stage_timings = report_pipeline.build_report(
+                data['name'], data['start_date'], data['end_date'], top_n=10)
+            timings.update(stage_timings)
+            return report
 
-    if not lecture_sessions_ids:
-        return jsonify({'error': 'No lectures found for the name'}), 404
+        started = time.perf_counter()
+        # Find All Lectures
+        lecture_sessions_ids = find_lecture_ids(data['name'])
+        timings['lecture_search'] = elapsed_ms(started)
 
-    finder = AttendanceFinder(
-        uri=NEO4J_URI,
-        user=NEO4J_USER,
-        password=NEO4J_PASSWORD
-    )
+        if not lecture_sessions_ids:
+            return None
 
-    try:
+        stage_started = time.perf_counter()
         worst = finder.find_worst_attendees(
             lecture_sessions_ids,
             top_n=10,
             start_date=data['start_date'],
             end_date=data['end_date']
         )
+        timings['attendance'] = elapsed_ms(stage_started)
+        timings['total'] = elapsed_ms(started)
 
-        print(worst)
-
-        report = {
+        return {
             'search_term': data['name'],
             'period': f"{data['start_date']} - {data['end_date']}",
             'found_lectures': len(lecture_sessions_ids),
             'worst_attendees': [r for r in worst]
         }
-        return jsonify(report=report, meta={'status': 'success', 'results': len(worst)}), 200
+
+    try:
+        if REPORT_CACHE_ENABLED:
+            report, cached = report_cache.get_or_compute(
+                data['name'], data['start_date'], data['end_date'], build_report)
+        else:
+            report, cached = build_report(), False
+
+        if report is None:
+            return jsonify({'error': 'No lectures found for the name'}), 404
+
+        meta = {
+            'status': 'success',
+            'results': len(report['worst_attendees']),
+            'cache': 'hit' if cached else 'miss'
+        }
+        if timings:
+            # Время этапов в мс; при попадании в кэш отчет не считался
+            meta['timings_ms'] = timings
+        return jsonify(report=report, meta=meta), 200
 
     except Exception as e:
         app.logger.error(f"Error: {e}")
         return jsonify({'error': 'Data processing failed'}), 500
 
-    finally:
-        finder.close()
+
+@app.route('/api/lab1/summary', methods=['POST'])
+def attendance_summary():
+    """Сводка посещаемости по всем студентам.
+
+    По умолчанию — страницы по page_size строк, следующая страница
+    запрашивается с cursor из meta. С ?format=ndjson вся сводка отдается
+    потоком, по строке JSON на студента; при сбое посреди потока последней
+    идет строка {"error": ...}.
+    """
+    if not request.is_json:
+        return jsonify({'error': 'Request must be JSON'}), 400
+
+    data = request.get_json()
+
+    required_fields = ['name', 'start_date', 'end_date']
+    if not has_all_required_fields(data, required_fields):
+        return jsonify({
+            'error': f"Missing required fields: {required_fields}",
+            'received': list(data.keys())
+        }), 400
+
+    period_error = invalid_period(data)
+    if period_error:
+        return jsonify({'error': period_error}), 400
+
+    try:
+        page_size = max(1, min(int(data.get('page_size', 100)), 1000))
+        after = decode_cursor(data['cursor']) if data.get('cursor') else None
+    except (TypeError, ValueError):
+        return jsonify({'error': 'Invalid page_size or cursor'}), 400
+
+    try:
+        lecture_sessions_ids = find_lecture_ids(data['name'])
+        if not lecture_sessions_ids:
+            return jsonify({'error': 'No lectures found for the name'}), 404
+
+        if request.args.get('format') == 'ndjson':
+            rows = finder.iter_attendance_summary(
+                lecture_sessions_ids,
+                start_date=data['start_date'],
+                end_date=data['end_date']
+            )
+            return Response(stream_with_context(ndjson_lines(rows)),
+                            mimetype='application/x-ndjson')
+
+        rows, next_key = finder.get_attendance_page(
+            lecture_sessions_ids,
+            start_date=data['start_date'],
+            end_date=data['end_date'],
+            after=after,
+            page_size=page_size
+        )
+        meta = {
+            'status': 'success',
+            'results': len(rows),
+            'found_lectures': len(lecture_sessions_ids),
+            'next_cursor': encode_cursor(next_key)
+        }
+        return jsonify(summary=rows, meta=meta), 200
+
+    except Exception as e:
+        app.logger.error(f"Error: {e}")
+        return jsonify({'error': 'Data processing failed'}), 500
+
+
+@app.route('/api/lab1/health', methods=['GET'])
+def health():
+    checks = registry.health()
+    status = 200 if all(check['ok'] for check in checks.values()) else 503
+    return jsonify(checks), status
+
+
+@app.route('/api/lab1/stats', methods=['GET'])
+def stats():
+    return jsonify(
+        pools=registry.stats(),
+        report_cache=report_cache.stats(),
+        session_type_cache=session_searcher.stats()
+    ), 200
 
 
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=5001)
+    app.run(host='0.0.0.0', port=5001, threaded=True)
@@ -0,0 +1,310 @@
+import asyncio
+import concurrent.futures
+import contextvars
+import functools
+import itertools
+import re
+import threading
+import time
+from datetime import date
+from typing import AsyncIterator, Callable, Dict, List, Optional, Tuple
+
+import asyncpg
+from elasticsearch import AsyncElasticsearch
+from neo4j import AsyncGraphDatabase
+
+from const import (ES_HOST, ES_MAX_CONNECTIONS, ES_PASS, ES_PORT, ES_USER,
+                   NEO4J_MAX_POOL_SIZE, NEO4J_PASSWORD, NEO4J_URI, NEO4J_USER,
+                   PG_CONFIG, PG_POOL_MAXCONN, PG_POOL_MINCONN)
+from lab import (ENRICH_QUERY, attendance_query, enrich_params, enrich_rows,
+                 month_partitions, worst_from_partitions)
+from lecture_session import (LECTURE_INDEX, PIT_KEEP_ALIVE, hit_session_id, page_params,
+                             response_size, search_query)
+from metrics import attach, current_span, observe
+from session_type_search import SessionTypeSearch
+
+
+def _asyncpg_query(query: str) -> str:
+    """Плейсхолдеры psycopg2 (%s) -> позиционные параметры asyncpg ($1, $2, ...)"""
+    counter = itertools.count(1)
+    return re.sub(r'%s', lambda _: f"${next(counter)}", query)
+
+
+async def _timed(timings: Dict[str, float], stage: str, coro):
+    """Ждет coro и добавляет его время к timings[stage] (мс)"""
+    started = time.perf_counter()
+    try:
+        return await coro
+    finally:
+        elapsed = (time.perf_counter() - started) * 1000
+        timings[stage] = round(timings.get(stage, 0.0) + elapsed, 3)
+
+
+class AsyncReportPipeline:
+    """Отчет lab1 на asyncio-клиентах всех хранилищ.
+
+    Flask-обработчики синхронные, поэтому цикл событий работает в отдельном
+    потоке, а build_report() ждет результат корутины. Отличия от
+    последовательного пути:
+
+    - поиск в Elasticsearch стартует одновременно с поиском типа занятия
+      (общий SessionTypeSearch с кэшем в памяти), с id, найденным в прошлый
+      раз; если id изменился, поиск повторяется с новым;
+    - месячные агрегаты PostgreSQL считаются параллельно на пуле asyncpg;
+    - строки агрегата читаются курсором порциями по chunk_size, и данные
+      студентов из Neo4j запрашиваются для каждой порции, пока читается
+      следующая.
+
+    Клиенты конвейера регистрируются в ConnectionRegistry (checks, stats,
+    close); pg_minconn/pg_maxconn задают размер пула asyncpg.
+    """
+
+    def __init__(self, session_types: SessionTypeSearch, lecture_type_name: str = 'Лекция',
+                 use_rollup: bool = False, chunk_size: int = 500, timeout: float = 60.0,
+                 search_mode: str = 'ids', page_size: int = 1000,
+                 pg_minconn: int = PG_POOL_MINCONN, pg_maxconn: int = PG_POOL_MAXCONN):
+        self.session_types = session_types
+        self.pg_minconn = pg_minconn
+        self.pg_maxconn = pg_maxconn
+        self.lecture_type_name = lecture_type_name
+        self.search_mode = search_mode
+        self.page_size = page_size
+        self.use_rollup = use_rollup
+        self.chunk_size = chunk_size
+        self.timeout = timeout
+        self._lecture_type_id: Optional[str] = None
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(
+            target=self._loop.run_forever, name='report-pipeline', daemon=True)
+        self._thread.start()
+        self._call(self._connect())
+
+    def _call(self, coro):
+        future = asyncio.run_coroutine_threadsafe(coro, self._loop)
+        try:
+            return future.result(self.timeout)
+        except concurrent.futures.TimeoutError:
+            future.cancel()
+            raise
+
+    async def _connect(self):
+        self.es = AsyncElasticsearch(
+            hosts=[f"http://{ES_HOST}:{ES_PORT}"],
+            basic_auth=(ES_USER, ES_PASS),
+            verify_certs=False,
+            connections_per_node=ES_MAX_CONNECTIONS
+        )
+        self.neo4j = AsyncGraphDatabase.driver(
+            NEO4J_URI,
+            auth=(NEO4J_USER, NEO4J_PASSWORD),
+            max_connection_pool_size=NEO4J_MAX_POOL_SIZE
+        )
+        self.pg = await asyncpg.create_pool(
+            database=PG_CONFIG['dbname'],
+            user=PG_CONFIG['user'],
+            password=PG_CONFIG['password'],
+            host=PG_CONFIG['host'],
+            port=int(PG_CONFIG['port']),
+            min_size=self.pg_minconn,
+            max_size=self.pg_maxconn
+        )
+
+    async def _disconnect(self):
+        await self.pg.close()
+        await self.neo4j.close()
+        await self.es.close()
+
+    async def _ping_postgres(self) -> bool:
+        return await self.pg.fetchval("SELECT 1") == 1
+
+    def checks(self) -> Dict[str, Callable]:
+        """Проверки доступности для ConnectionRegistry.health()"""
+        return {
+            'postgres': lambda: self._call(self._ping_postgres()),
+            'neo4j': lambda: self._call(self.neo4j.verify_connectivity()),
+            'elasticsearch': lambda: self._call(self.es.ping()),
+        }
+
+    def stats(self) -> Dict[str, Dict]:
+        """Загрузка пулов для ConnectionRegistry.stats()"""
+        size, idle = self.pg.get_size(), self.pg.get_idle_size()
+        return {
+            'postgres': {
+                'min_size': self.pg.get_min_size(),
+                'max_size': self.pg.get_max_size(),
+                'size': size,
+                'in_use': size - idle,
+                'utilisation': round((size - idle) / self.pg.get_max_size(), 3),
+            },
+            'neo4j': {'max_connection_pool_size': NEO4J_MAX_POOL_SIZE},
+            'elasticsearch': {'connections_per_node': ES_MAX_CONNECTIONS},
+        }
+
+    def close(self):
+        try:
+            self._call(self._disconnect())
+        finally:
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join(timeout=2.0)
+
+    def build_report(
+        self,
+        name: str,
+        start_date: str,
+        end_date: str,
+        top_n: int = 10
+    ) -> Tuple[Optional[Dict], Dict[str, float]]:
+        """Отчет (None, если лекции не найдены) и время этапов в мс"""
+        # Спаны цикла событий присоединяются к трассе запроса Flask
+        return self._call(self._build_report(name, start_date, end_date, top_n, current_span()))
+
+    async def _build_report(self, name, start_date, end_date, top_n, parent=None):
+        with attach(parent):
+            return await self._build_report_traced(name, start_date, end_date, top_n)
+
+    async def _build_report_traced(self, name, start_date, end_date, top_n):
+        timings: Dict[str, float] = {}
+        started = time.perf_counter()
+
+        lecture_ids = await self._find_lecture_ids(name, timings)
+        report = None
+        if lecture_ids:
+            worst = await self._find_worst_attendees(
+                lecture_ids, start_date, end_date, top_n, timings)
+            report = {
+                'search_term': name,
+                'period': f"{start_date} - {end_date}",
+                'found_lectures': len(lecture_ids),
+                'worst_attendees': worst
+            }
+
+        timings['total'] = round((time.perf_counter() - started) * 1000, 3)
+        return report, timings
+
+    async def _session_type_ids(self, name: str) -> List[str]:
+        # Синхронный клиент в пуле потоков; копия контекста сохраняет
+        # текущий спан для observe() внутри get_by_name
+        lookup = functools.partial(
+            contextvars.copy_context().run, self.session_types.get_by_name, name)
+        session_types = await asyncio.get_running_loop().run_in_executor(None, lookup)
+        return [item['id'] for item in session_types]
+
+    async def _search(self, name: str, session_type_id: str) -> List[int]:
+        """Все найденные лекции в режиме search_mode, как в LectureMaterialSearcher:
+        нечеткий поиск — только если нет точных совпадений"""
+        exact = await self._search_ids(
+            search_query(name, session_type_id, self.search_mode, exact=True))
+        if exact:
+            return exact
+        return await self._search_ids(search_query(name, session_type_id, self.search_mode))
+
+    async def _search_ids(self, query: Dict) -> List[int]:
+        ids_only = self.search_mode != 'source'
+        if ids_only:
+            with observe('elasticsearch', 'lecture_search_cached') as call:
+                response = await self.es.search(
+                    index=LECTURE_INDEX, request_cache=True,
+                    **page_params(query, self.page_size, ids_only))
+                hits = response['hits']['hits']
+                call.set(rows=len(hits), bytes=response_size(response))
+            if len(hits) < self.page_size:
+                return [hit_session_id(hit) for hit in hits]
+
+        opened = await self.es.open_point_in_time(index=LECTURE_INDEX, keep_alive=PIT_KEEP_ALIVE)
+        pit_id, search_after, session_ids = opened['id'], None, []
+        try:
+            while True:
+                with observe('elasticsearch', 'lecture_search_page') as call:
+                    response = await self.es.search(**page_params(
+                        query, self.page_size, ids_only, pit_id, search_after))
+                    hits = response['hits']['hits']
+                    call.set(rows=len(hits), bytes=response_size(response))
+                pit_id = response.get('pit_id', pit_id)
+                session_ids.extend(hit_session_id(hit) for hit in hits)
+                if len(hits) < self.page_size:
+                    return session_ids
+                search_after = hits[-1]['sort']
+        finally:
+            await self.es.close_point_in_time(id=pit_id)
+
+    async def _find_lecture_ids(self, name: str, timings: Dict[str, float]) -> List[int]:
+        speculative = self._lecture_type_id
+        search = None
+        if speculative is not None:
+            search = asyncio.ensure_future(
+                _timed(timings, 'lecture_search', self._search(name, speculative)))
+
+        try:
+            type_ids = await _timed(
+                timings, 'session_types', self._session_type_ids(self.lecture_type_name))
+        except BaseException:
+            # Незавершенный поиск держал бы запрос и PIT в Elasticsearch
+            if search is not None:
+                search.cancel()
+            raise
+        if not type_ids:
+            if search is not None:
+                search.cancel()
+            return []
+
+        self._lecture_type_id = type_ids[0]
+        if search is not None:
+            if type_ids[0] == speculative:
+                return await search
+            search.cancel()
+        return await _timed(timings, 'lecture_search', self._search(name, type_ids[0]))
+
+    async def _fetch_chunks(self, query: str, params: list) -> AsyncIterator[List]:
+        async with self.pg.acquire() as conn, conn.transaction():
+            cursor = await conn.cursor(_asyncpg_query(query), *params)
+            while True:
+                with observe('postgres', 'attendance_worst_fetch') as call:
+                    rows = await cursor.fetch(self.chunk_size)
+                    call.set(rows=len(rows))
+                if not rows:
+                    break
+                yield rows
+
+    async def _partition_counts(self, lecture_ids: List[int], start: date, end: date) -> List:
+        query, params = attendance_query(
+            lecture_ids, start, end, worst=None, use_rollup=self.use_rollup)
+        with observe('postgres', 'attendance_partition', partition=start.isoformat()) as call:
+            async with self.pg.acquire() as conn:
+                rows = await conn.fetch(_asyncpg_query(query), *params)
+            call.set(rows=len(rows))
+        return rows
+
+    async def _worst_chunks(self, lecture_ids, start_date, end_date, top_n) -> AsyncIterator[List]:
+        partitions = month_partitions(start_date, end_date)
+        if len(partitions) < 2:
+            query, params = attendance_query(
+                lecture_ids, date.fromisoformat(start_date), date.fromisoformat(end_date),
+                worst=True, limit=top_n, use_rollup=self.use_rollup)
+            async for rows in self._fetch_chunks(query, params):
+                yield rows
+            return
+
+        results = await asyncio.gather(*(
+            self._partition_counts(lecture_ids, start, end) for start, end in partitions))
+        yield worst_from_partitions(results, top_n)
+
+    async def _enrich(self, rows: List) -> List[Dict]:
+        with observe('neo4j', 'enrich_students') as call:
+            async with self.neo4j.session() as session:
+                result = await session.run(ENRICH_QUERY, **enrich_params(rows))
+                neo4j_data = {r['student_id']: r for r in await result.data()}
+            call.set(rows=len(neo4j_data))
+        return enrich_rows(rows, neo4j_data)
+
+    async def _find_worst_attendees(self, lecture_ids, start_date, end_date, top_n, timings):
+        # Обогащение порции идет параллельно с чтением следующей
+        tasks = []
+        started = time.perf_counter()
+        async for rows in self._worst_chunks(lecture_ids, start_date, end_date, top_n):
+            if rows:
+                tasks.append(asyncio.ensure_future(
+                    _timed(timings, 'neo4j_enrich', self._enrich(rows))))
+        timings['postgres'] = round((time.perf_counter() - started) * 1000, 3)
+
+        enriched = await asyncio.gather(*tasks)
+        return [row for chunk in enriched for row in chunk]
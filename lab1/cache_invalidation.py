@@ -0,0 +1,69 @@
+import json
+import logging
+
+import redis
+from kafka import KafkaConsumer
+
+from const import (CDC_TOPIC_PREFIX, KAFKA_BOOTSTRAP_SERVERS, REDIS_HOST,
+                   REDIS_PORT, REPORT_CACHE_MAX_ENTRIES, REPORT_CACHE_TTL)
+from report_cache import ReportCache
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+# Таблицы, от которых зависит отчет о посещаемости
+REPORT_TABLES = ['attendance', 'schedule']
+
+
+def _decode(value: bytes):
+    if value is None:
+        # tombstone-сообщение Debezium после удаления
+        return None
+    return json.loads(value.decode('utf-8'))
+
+
+def run_invalidation_listener(
+    cache: ReportCache,
+    bootstrap_servers: str = KAFKA_BOOTSTRAP_SERVERS,
+    topic_prefix: str = CDC_TOPIC_PREFIX,
+    group_id: str = 'lab1-report-cache',
+    poll_timeout_ms: int = 1000
+) -> None:
+    """Слушает CDC-топики Debezium и сбрасывает кэш отчетов при изменениях.
+
+    Все сообщения, полученные за один poll, приводят к одной инвалидации.
+    Смещения фиксируются только после сброса кэша.
+    """
+    topics = [f"{topic_prefix}.{table}" for table in REPORT_TABLES]
+    consumer = KafkaConsumer(
+        *topics,
+        bootstrap_servers=bootstrap_servers,
+        group_id=group_id,
+        enable_auto_commit=False,
+        value_deserializer=_decode
+    )
+    logger.info(f"Слушаем топики {', '.join(topics)}")
+
+    try:
+        while True:
+            batch = consumer.poll(timeout_ms=poll_timeout_ms)
+            changes = sum(len(records) for records in batch.values())
+            if not changes:
+                continue
+
+            removed = cache.invalidate()
+            consumer.commit()
+            logger.info(
+                f"Получено {changes} изменений, удалено {removed} отчетов из кэша")
+    finally:
+        consumer.close()
+
+
+if __name__ == '__main__':
+    client = redis.Redis(host=REDIS_HOST, port=REDIS_PORT, decode_responses=True)
+    run_invalidation_listener(
+        ReportCache(client, ttl=REPORT_CACHE_TTL, max_entries=REPORT_CACHE_MAX_ENTRIES)
+    )
@@ -0,0 +1,206 @@
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, List
+
+import redis
+from elasticsearch import Elasticsearch
+from neo4j import GraphDatabase
+from psycopg2 import pool as pg_pool
+
+from const import (ES_HOST, ES_MAX_CONNECTIONS, ES_PASS, ES_PORT, ES_USER,
+                   NEO4J_MAX_POOL_SIZE, NEO4J_PASSWORD, NEO4J_URI, NEO4J_USER,
+                   PG_CONFIG, PG_POOL_MAXCONN, PG_POOL_MINCONN,
+                   REDIS_HOST, REDIS_MAX_CONNECTIONS, REDIS_PORT)
+
+
+class PostgresPool:
+    """Потокобезопасный пул соединений PostgreSQL со счетчиками использования"""
+
+    def __init__(self, minconn: int, maxconn: int, acquire_timeout: float = 10.0, **conn_kwargs):
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.acquire_timeout = acquire_timeout
+        self._pool = pg_pool.ThreadedConnectionPool(minconn, maxconn, **conn_kwargs)
+        # ThreadedConnectionPool бросает PoolError при исчерпании, поэтому
+        # ожидание свободного соединения ограничиваем семафором
+        self._slots = threading.BoundedSemaphore(maxconn)
+        self._lock = threading.Lock()
+        self._in_use = 0
+        self._acquired_total = 0
+        self._wait_seconds_total = 0.0
+        self._timeouts = 0
+        self._discarded = 0
+
+    def getconn(self):
+        started = time.monotonic()
+        if not self._slots.acquire(timeout=self.acquire_timeout):
+            with self._lock:
+                self._timeouts += 1
+            raise pg_pool.PoolError("Timed out waiting for a PostgreSQL connection")
+        try:
+            conn = self._pool.getconn()
+            if conn.closed:
+                # Соединение было разорвано сервером: выбрасываем и берем новое
+                self._pool.putconn(conn, close=True)
+                with self._lock:
+                    self._discarded += 1
+                conn = self._pool.getconn()
+        except Exception:
+            self._slots.release()
+            raise
+        with self._lock:
+            self._in_use += 1
+            self._acquired_total += 1
+            self._wait_seconds_total += time.monotonic() - started
+        return conn
+
+    def putconn(self, conn, close: bool = False):
+        try:
+            if not conn.closed:
+                conn.rollback()
+        except Exception:
+            close = True
+        close = close or bool(conn.closed)
+        if close:
+            with self._lock:
+                self._discarded += 1
+        try:
+            self._pool.putconn(conn, close=close)
+        finally:
+            with self._lock:
+                self._in_use -= 1
+            self._slots.release()
+
+    @contextmanager
+    def connection(self):
+        conn = self.getconn()
+        broken = False
+        try:
+            yield conn
+        except Exception:
+            broken = bool(conn.closed)
+            raise
+        finally:
+            self.putconn(conn, close=broken)
+
+    def ping(self) -> bool:
+        with self.connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1")
+                return cur.fetchone()[0] == 1
+
+    def stats(self) -> Dict:
+        with self._lock:
+            acquired = self._acquired_total
+            return {
+                'minconn': self.minconn,
+                'maxconn': self.maxconn,
+                'in_use': self._in_use,
+                'utilisation': round(self._in_use / self.maxconn, 3),
+                'acquired_total': acquired,
+                'avg_wait_ms': round(self._wait_seconds_total / acquired * 1000, 3) if acquired else 0.0,
+                'timeouts': self._timeouts,
+                'discarded': self._discarded,
+            }
+
+    def close(self):
+        self._pool.closeall()
+
+
+class ConnectionRegistry:
+    """Долгоживущие клиенты ко всем хранилищам, создаются один раз при старте сервиса"""
+
+    def __init__(
+        self,
+        pg_minconn: int = PG_POOL_MINCONN,
+        pg_maxconn: int = PG_POOL_MAXCONN,
+        neo4j_pool_size: int = NEO4J_MAX_POOL_SIZE,
+        es_connections: int = ES_MAX_CONNECTIONS,
+        redis_connections: int = REDIS_MAX_CONNECTIONS
+    ):
+        self.postgres = PostgresPool(pg_minconn, pg_maxconn, **PG_CONFIG)
+        self.neo4j = GraphDatabase.driver(
+            NEO4J_URI,
+            auth=(NEO4J_USER, NEO4J_PASSWORD),
+            max_connection_pool_size=neo4j_pool_size
+        )
+        self.neo4j_pool_size = neo4j_pool_size
+        self.elastic = Elasticsearch(
+            hosts=[f"http://{ES_HOST}:{ES_PORT}"],
+            basic_auth=(ES_USER, ES_PASS),
+            verify_certs=False,
+            connections_per_node=es_connections
+        )
+        self.es_connections = es_connections
+        self.redis_pool = redis.ConnectionPool(
+            host=REDIS_HOST,
+            port=REDIS_PORT,
+            decode_responses=True,
+            max_connections=redis_connections
+        )
+        self.redis = redis.Redis(connection_pool=self.redis_pool)
+        self._components: List[tuple] = []
+
+    def register(self, name: str, component) -> None:
+        """Дополнительный набор клиентов (например, пулы асинхронного конвейера
+        отчета): его checks(), stats() и close() входят в health(), stats()
+        и close() реестра с префиксом name"""
+        self._components.append((name, component))
+
+    def health(self) -> Dict[str, Dict]:
+        """Проверка доступности каждого хранилища"""
+        checks = {
+            'postgres': self.postgres.ping,
+            'neo4j': self.neo4j.verify_connectivity,
+            'elasticsearch': self.elastic.ping,
+            'redis': self.redis.ping,
+        }
+        for prefix, component in self._components:
+            checks.update({f"{prefix}.{name}": check
+                           for name, check in component.checks().items()})
+        result = {}
+        for name, check in checks.items():
+            started = time.monotonic()
+            try:
+                ok = check()
+                ok = True if ok is None else bool(ok)
+                error = None
+            except Exception as e:
+                ok = False
+                error = str(e)
+            result[name] = {
+                'ok': ok,
+                'latency_ms': round((time.monotonic() - started) * 1000, 3),
+            }
+            if error:
+                result[name]['error'] = error
+        return result
+
+    def stats(self) -> Dict[str, Dict]:
+        """Загрузка пулов соединений"""
+        # redis-py не предоставляет публичного API для размеров пула
+        in_use = len(getattr(self.redis_pool, '_in_use_connections', ()))
+        available = len(getattr(self.redis_pool, '_available_connections', ()))
+        result = {
+            'postgres': self.postgres.stats(),
+            'redis': {
+                'max_connections': self.redis_pool.max_connections,
+                'in_use': in_use,
+                'available': available,
+                'utilisation': round(in_use / self.redis_pool.max_connections, 3),
+            },
+            'neo4j': {'max_connection_pool_size': self.neo4j_pool_size},
+            'elasticsearch': {'connections_per_node': self.es_connections},
+        }
+        for prefix, component in self._components:
+            result[prefix] = component.stats()
+        return result
+
+    def close(self):
+        for _, component in reversed(self._components):
+            component.close()
+        self.postgres.close()
+        self.neo4j.close()
+        self.elastic.close()
+        self.redis_pool.disconnect()
@@ -17,3 +17,21 @@ PG_CONFIG = {
     'host': os.getenv("POSTGRES_HOST", "postgres"),
     'port': os.getenv("POSTGRES_PORT", 5430),
 }
+PG_POOL_MINCONN = int(os.getenv("PG_POOL_MINCONN", 1))
+PG_POOL_MAXCONN = int(os.getenv("PG_POOL_MAXCONN", 10))
+NEO4J_MAX_POOL_SIZE = int(os.getenv("NEO4J_MAX_POOL_SIZE", 50))
+ES_MAX_CONNECTIONS = int(os.getenv("ES_MAX_CONNECTIONS", 10))
+REDIS_MAX_CONNECTIONS = int(os.getenv("REDIS_MAX_CONNECTIONS", 20))
+REPORT_CACHE_ENABLED = os.getenv("REPORT_CACHE_ENABLED", "1") == "1"
+REPORT_CACHE_TTL = int(os.getenv("REPORT_CACHE_TTL", 300))
+REPORT_CACHE_MAX_ENTRIES = int(os.getenv("REPORT_CACHE_MAX_ENTRIES", 1000))
+KAFKA_BOOTSTRAP_SERVERS = os.getenv("KAFKA_BOOTSTRAP_SERVERS", "broker:29092")
+CDC_TOPIC_PREFIX = os.getenv("CDC_TOPIC_PREFIX", "postgres_server.public")
+REPORT_PARTITION_WORKERS = int(os.getenv("REPORT_PARTITION_WORKERS", 4))
+REPORT_USE_ROLLUP = os.getenv("REPORT_USE_ROLLUP", "0") == "1"
+SESSION_TYPE_CACHE_TTL = float(os.getenv("SESSION_TYPE_CACHE_TTL", 300))
+REPORT_ASYNC_PIPELINE = os.getenv("REPORT_ASYNC_PIPELINE", "1") == "1"
+REPORT_ASYNC_TIMEOUT = float(os.getenv("REPORT_ASYNC_TIMEOUT", 60))
+# Файл для деревьев спанов запросов (JSON Lines); пусто — трассы не пишутся
+TRACE_FILE = os.getenv("TRACE_FILE", "")
+LECTURE_SEARCH_MODE = os.getenv("LECTURE_SEARCH_MODE", "ids")
@@ -1,10 +1,16 @@
 
+import contextvars
+import heapq
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import date, timedelta
 from neo4j import GraphDatabase
 from typing import List, Dict
 import psycopg2
-from typing import List, Dict, Optional
+from typing import List, Dict, Iterable, Iterator, Optional, Tuple
 
 from lecture_session import LectureMaterialSearcher
+from metrics import observe
 
 DB_NAME = "postgres_db"
 DB_USER = "postgres_user"
@@ -13,42 +19,231 @@ DB_HOST = "localhost"
 DB_PORT = "5430"
 
 
+def month_partitions(start_date: str, end_date: str) -> List[Tuple[date, date]]:
+    """Делит период [start_date, end_date] на календарные месяцы"""
+    start, end = date.fromisoformat(start_date), date.fromisoformat(end_date)
+    partitions = []
+    while start <= end:
+        next_month = (start.replace(day=1) + timedelta(days=32)).replace(day=1)
+        partitions.append((start, min(end, next_month - timedelta(days=1))))
+        start = next_month
+    return partitions
+
+
+SCHEDULE_QUERY = """
+    SELECT 
+        sch.schedule_id,
+        sch.group_id,
+        sch.room,
+        sch.scheduled_date,
+        sch.start_time,
+        ls.topic,
+        ls.duration_minutes
+    FROM Schedule sch
+    JOIN Lecture_Sessions ls ON sch.session_id = ls.session_id
+    WHERE 
+        sch.session_id = ANY(%s)
+        AND sch.scheduled_date BETWEEN %s AND %s
+    ORDER BY sch.scheduled_date, sch.start_time
+"""
+
+
+def attendance_query(
+    lecture_ids: List[int],
+    start_date: Optional[str],
+    end_date: Optional[str],
+    worst: Optional[bool],
+    limit: Optional[int] = None,
+    after: Optional[Tuple[int, int]] = None,
+    use_rollup: bool = False
+) -> Tuple[str, list]:
+    """SQL агрегата посещаемости; worst=None — без сортировки"""
+    # Расписание, окно дат и агрегация по студентам считаются одним
+    # запросом: id лекций передаются массивом и раскрываются через unnest,
+    # поэтому число обращений к PostgreSQL не зависит от числа лекций.
+    date_column = "r.scheduled_date" if use_rollup else "sch.scheduled_date"
+    date_filter = ""
+    params = [list(lecture_ids)]
+    if start_date:
+        date_filter += f" AND {date_column} >= %s"
+        params.append(start_date)
+    if end_date:
+        date_filter += f" AND {date_column} <= %s"
+        params.append(end_date)
+
+    if use_rollup:
+        # Счетчики уже сгруппированы по (студент, группа, занятие, дата)
+        keyset_filter = ""
+        if after is not None:
+            keyset_filter = " AND (r.student_id, r.group_id) > (%s, %s)"
+            params.extend(after)
+
+        query = f"""
+        WITH lectures AS (
+            SELECT DISTINCT unnest(%s::int[]) AS session_id
+        )
+        SELECT r.student_id, r.group_id,
+               SUM(r.total_count) AS total_count,
+               SUM(r.attended_count) AS attended_count,
+               ROUND((SUM(r.attended_count)::FLOAT /
+                      NULLIF(SUM(r.total_count), 0)) * 100) AS attendance_percent
+        FROM Attendance_Rollup r
+        JOIN lectures l ON l.session_id = r.session_id
+        WHERE TRUE{date_filter}{keyset_filter}
+        GROUP BY r.student_id, r.group_id
+        """
+    else:
+        keyset_filter = ""
+        if after is not None:
+            keyset_filter = "WHERE (a.student_id, lsch.group_id) > (%s, %s)"
+            params.extend(after)
+
+        query = f"""
+        WITH lectures AS (
+            SELECT DISTINCT unnest(%s::int[]) AS session_id
+        ),
+        lecture_schedule AS (
+            SELECT sch.schedule_id, sch.group_id
+            FROM Schedule sch
+            JOIN lectures l ON l.session_id = sch.session_id
+            WHERE TRUE{date_filter}
+        )
+        SELECT a.student_id, lsch.group_id,
+               COUNT(*) AS total_count,
+               SUM(CASE WHEN a.attended THEN 1 ELSE 0 END) AS attended_count,
+               ROUND((SUM(CASE WHEN a.attended THEN 1 ELSE 0 END)::FLOAT / 
+                      NULLIF(COUNT(*), 0)) * 100) AS attendance_percent
+        FROM lecture_schedule lsch
+        JOIN Attendance a ON lsch.schedule_id = a.schedule_id
+        {keyset_filter}
+        GROUP BY a.student_id, lsch.group_id
+        """
+    # Сортировка по именам выходных колонок подходит обоим вариантам запроса
+    if worst:
+        # Тот же ключ, что у worst_from_partitions: top-N не зависит от того,
+        # пересекает ли период границу месяца
+        query += " ORDER BY attendance_percent ASC, student_id ASC, group_id ASC"
+    elif worst is not None:
+        query += " ORDER BY student_id ASC, group_id ASC"
+    if limit:
+        query += " LIMIT %s"
+        params.append(limit)
+    return query, params
+
+
+ENRICH_QUERY = """
+    MATCH (s:Student)
+    WHERE s.postgres_id IN $student_ids
+    OPTIONAL MATCH (s)-[:MEMBER_OF]->(g:StudentGroup)
+    WHERE g.postgres_id IN $group_ids
+    RETURN s.postgres_id AS student_id, s.name AS name, 
+           s.enrollment_year AS enrollment_year, s.date_of_birth AS date_of_birth,
+           s.email AS email, s.book_number AS book_number,
+           g.postgres_id AS group_id, g.name AS group_name
+"""
+
+
+def enrich_params(rows: List[tuple]) -> Dict[str, List[int]]:
+    return {
+        'student_ids': [item[0] for item in rows],
+        'group_ids': [item[1] for item in rows]
+    }
+
+
+def enrich_rows(rows: List[tuple], neo4j_data: Dict[int, Dict]) -> List[Dict]:
+    """Строки агрегата (student_id, group_id, total, attended, percent) + данные из Neo4j"""
+    return [{
+        'studentId': row[0],
+        'studentName': neo4j_data.get(row[0], {}).get('name'),
+        'attendedCount': row[3],
+        'totalCount': row[2],
+        'attendancePercent': row[4],
+        'enrollment_year': neo4j_data.get(row[0], {}).get('enrollment_year'),
+        'date_of_birth': neo4j_data.get(row[0], {}).get('date_of_birth'),
+        'email': neo4j_data.get(row[0], {}).get('email'),
+        'book_number': neo4j_data.get(row[0], {}).get('book_number'),
+        'group_id': neo4j_data.get(row[0], {}).get('group_id'),
+        'group_name': neo4j_data.get(row[0], {}).get('group_name')
+    } for row in rows]
+
+
+def worst_from_partitions(partition_rows: Iterable[List[tuple]], top_n: int) -> List[tuple]:
+    """Суммирует частичные агрегаты месяцев по (student_id, group_id) и
+    выбирает top-N с наименьшим процентом посещения."""
+    totals: Dict[Tuple[int, int], List[int]] = {}
+    for rows in partition_rows:
+        for student_id, group_id, total, attended, _ in rows:
+            counts = totals.setdefault((student_id, group_id), [0, 0])
+            counts[0] += total
+            counts[1] += attended
+
+    # Процент округляется так же, как ROUND() в запросе; при равенстве
+    # порядок детерминирован: student_id, затем group_id
+    rows = (
+        (student_id, group_id, total, attended, round(attended / total * 100))
+        for (student_id, group_id), (total, attended) in totals.items()
+        if total
+    )
+    return heapq.nsmallest(top_n, rows, key=lambda row: (row[4], row[0], row[1]))
+
+
 class AttendanceFinder:
     def __init__(
         self,
         uri: str = 'bolt://localhost:7687',
         user: str = 'neo4j',
-        password: str = 'strongpassword'
+        password: str = 'strongpassword',
+        driver=None,
+        pg_pool=None,
+        partition_workers: int = 4,
+        use_rollup: bool = False
     ):
-        self.driver = GraphDatabase.driver(uri, auth=(user, password))
+        # Общие driver и pg_pool передаются из ConnectionRegistry сервиса;
+        # без них класс открывает собственные соединения (запуск как скрипт)
+        self._owns_driver = driver is None
+        self.driver = driver or GraphDatabase.driver(uri, auth=(user, password))
+        self.pg_pool = pg_pool
+        # Отчеты по Attendance_Rollup вместо сырых строк Attendance
+        self.use_rollup = use_rollup
+        self._executor = ThreadPoolExecutor(
+            max_workers=partition_workers, thread_name_prefix='attendance-partition')
 
     def close(self):
-        self.driver.close()
-
-    def get_schedule(self, session_id: int, start_date: str, end_date: str) -> List[tuple]:
-        """Получает расписание для указанной сессии в заданном временном промежутке"""
-        query = """
-            SELECT 
-                sch.schedule_id,
-                sch.group_id,
-                sch.room,
-                sch.scheduled_date,
-                sch.start_time,
-                ls.topic,
-                ls.duration_minutes
-            FROM Schedule sch
-            JOIN Lecture_Sessions ls ON sch.session_id = ls.session_id
-            WHERE 
-                sch.session_id = %s
-                AND sch.scheduled_date BETWEEN %s AND %s
-            ORDER BY sch.scheduled_date, sch.start_time
-        """
-        params = (session_id, start_date, end_date)
+        self._executor.shutdown(wait=False)
+        if self._owns_driver:
+            self.driver.close()
+
+    @contextmanager
+    def _connection(self):
+        if self.pg_pool is not None:
+            with self.pg_pool.connection() as conn:
+                yield conn
+            return
 
+        conn = psycopg2.connect(
+            dbname=DB_NAME,
+            user=DB_USER,
+            password=DB_PASSWORD,
+            host=DB_HOST,
+            port=DB_PORT
+        )
         try:
-            cur = self.conn.cursor()
-            cur.execute(query, params)
-            return cur.fetchall()
+            yield conn
+        finally:
+            conn.close()
+
+    def get_schedule(self, session_ids: List[int], start_date: str, end_date: str) -> List[tuple]:
+        """Получает расписание для указанных сессий в заданном временном промежутке"""
+        query = SCHEDULE_QUERY
+        params = (list(session_ids), start_date, end_date)
+
+        try:
+            with observe('postgres', 'schedule') as call, \
+                    self._connection() as conn, conn.cursor() as cur:
+                cur.execute(query, params)
+                rows = cur.fetchall()
+                call.set(rows=len(rows))
+                return rows
         except Exception as e:
             print(f"Error getting schedule: {e}")
             return []
@@ -60,13 +255,44 @@ class AttendanceFinder:
         start_date: Optional[str] = None,
         end_date: Optional[str] = None
     ) -> List[Dict]:
-        return self._find_attendance(
-            lecture_ids,
-            limit=top_n,
-            worst=True,
-            start_date=start_date,
-            end_date=end_date
-        )
+        # Ошибки хранилищ не подменяются пустым результатом: иначе кэш
+        # отчетов сохранит отчет без строк
+        partitions = month_partitions(start_date, end_date) if start_date and end_date else []
+        if len(partitions) < 2 or not lecture_ids:
+            return self._find_attendance(
+                lecture_ids,
+                limit=top_n,
+                worst=True,
+                start_date=start_date,
+                end_date=end_date
+            )
+        return self._enrich(self._worst_by_partitions(lecture_ids, partitions, top_n))
+
+    def _partition_counts(self, lecture_ids: List[int], start: date, end: date) -> List[tuple]:
+        query, params = self._attendance_query(
+            lecture_ids, start.isoformat(), end.isoformat(), worst=None)
+        with observe('postgres', 'attendance_partition', partition=start.isoformat()) as call, \
+                self._connection() as conn, conn.cursor() as cur:
+            cur.execute(query, params)
+            rows = cur.fetchall()
+            call.set(rows=len(rows))
+            return rows
+
+    def _worst_by_partitions(
+        self,
+        lecture_ids: List[int],
+        partitions: List[Tuple[date, date]],
+        top_n: int
+    ) -> List[tuple]:
+        """Top-N по месяцам: частичные агрегаты считаются параллельно на
+        соединениях из пула и суммируются по (student_id, group_id)."""
+        # Контекст копируется, чтобы спаны месяцев попали в трассу запроса
+        futures = [
+            self._executor.submit(
+                contextvars.copy_context().run, self._partition_counts, lecture_ids, start, end)
+            for start, end in partitions
+        ]
+        return worst_from_partitions((future.result() for future in futures), top_n)
 
     def get_attendance_summary(
         self,
@@ -82,6 +308,87 @@ class AttendanceFinder:
             end_date=end_date
         )
 
+    def get_attendance_page(
+        self,
+        lecture_ids: List[int],
+        start_date: Optional[str] = None,
+        end_date: Optional[str] = None,
+        after: Optional[Tuple[int, int]] = None,
+        page_size: int = 100
+    ) -> Tuple[List[Dict], Optional[Tuple[int, int]]]:
+        """Страница сводки, упорядоченной по (student_id, group_id).
+
+        after — ключ последней строки предыдущей страницы. Возвращает строки
+        и ключ для следующей страницы (None, если страница последняя).
+        """
+        if not lecture_ids:
+            return [], None
+        query, params = self._attendance_query(
+            lecture_ids, start_date, end_date, worst=False,
+            limit=page_size + 1, after=after)
+        with observe('postgres', 'attendance_page') as call, \
+                self._connection() as conn, conn.cursor() as cur:
+            cur.execute(query, params)
+            rows = cur.fetchall()
+            call.set(rows=len(rows))
+
+        next_key = None
+        if len(rows) > page_size:
+            rows = rows[:page_size]
+            next_key = (rows[-1][0], rows[-1][1])
+        return self._enrich(rows), next_key
+
+    def iter_attendance_summary(
+        self,
+        lecture_ids: List[int],
+        start_date: Optional[str] = None,
+        end_date: Optional[str] = None,
+        batch_size: int = 1000
+    ) -> Iterator[Dict]:
+        """Вся сводка через серверный курсор: в памяти не больше batch_size строк.
+
+        Соединение из пула занято, пока генератор не исчерпан или не закрыт.
+        """
+        if not lecture_ids:
+            return
+        query, params = self._attendance_query(
+            lecture_ids, start_date, end_date, worst=False)
+        with self._connection() as conn:
+            with conn.cursor(name='attendance_summary') as cur:
+                cur.itersize = batch_size
+                cur.execute(query, params)
+                while True:
+                    # Спан только вокруг чтения: генератор не держит его между yield
+                    with observe('postgres', 'attendance_summary_fetch') as call:
+                        rows = cur.fetchmany(batch_size)
+                        call.set(rows=len(rows))
+                    if not rows:
+                        break
+                    yield from self._enrich(rows)
+            conn.rollback()
+
+    def _attendance_query(
+        self,
+        lecture_ids: List[int],
+        start_date: Optional[str],
+        end_date: Optional[str],
+        worst: Optional[bool],
+        limit: Optional[int] = None,
+        after: Optional[Tuple[int, int]] = None
+    ) -> Tuple[str, list]:
+        return attendance_query(lecture_ids, start_date, end_date, worst,
+                                limit=limit, after=after, use_rollup=self.use_rollup)
+
+    def _enrich(self, rows: List[tuple]) -> List[Dict]:
+        """Дополняет строки агрегата данными студентов и групп из Neo4j"""
+        if not rows:
+            return []
+        with observe('neo4j', 'enrich_students') as call, self.driver.session() as session:
+            result = session.run(ENRICH_QUERY, **enrich_params(rows))
+            neo4j_data = {r['student_id']: r for r in result.data()}
+            call.set(rows=len(neo4j_data))
+        return enrich_rows(rows, neo4j_data)
+
     def _find_attendance(
         self,
         lecture_ids: List[int],
@@ -93,89 +400,15 @@ class AttendanceFinder:
         if not lecture_ids:
             return []
 
-        session_ids = []
-        for lect_id in lecture_ids:
-            sessions = self.get_schedule(lect_id, start_date, end_date)
-            for session_id in sessions:
-                session_ids.append(session_id)
-
-        # Запрос к PostgreSQL для посещаемости
-        query = """
-        SELECT a.student_id, sch.group_id,
-               COUNT(a.attendance_id) AS total_count,
-               SUM(CASE WHEN a.attended THEN 1 ELSE 0 END) AS attended_count,
-               ROUND((SUM(CASE WHEN a.attended THEN 1 ELSE 0 END)::FLOAT / 
-                      NULLIF(COUNT(a.attendance_id), 0)) * 100) AS attendance_percent
-        FROM Schedule sch
-        LEFT JOIN Attendance a ON sch.schedule_id = a.schedule_id
-        WHERE sch.session_id = ANY(%s)
-        """
-        params = [session_ids]
-        # if start_date and end_date:
-        #     query += " AND sch.scheduled_date BETWEEN %s AND %s"
-        #     params.extend([start_date, end_date])
-        query += """
-        GROUP BY a.student_id, sch.group_id
-        HAVING COUNT(a.attendance_id) > 0
-        """
-        if worst:
-            query += " ORDER BY attendance_percent ASC"
-        else:
-            query += " ORDER BY a.student_id ASC"
-        if limit:
-            query += f" LIMIT {limit}"
+        query, params = self._attendance_query(
+            lecture_ids, start_date, end_date, worst=worst, limit=limit)
 
-        try:
-            conn = psycopg2.connect(
-                dbname=DB_NAME,
-                user=DB_USER,
-                password=DB_PASSWORD,
-                host=DB_HOST,
-                port=DB_PORT
-            )
-            cur = conn.cursor()
+        with observe('postgres', 'attendance_worst' if worst else 'attendance_summary') as call, \
+                self._connection() as conn, conn.cursor() as cur:
             cur.execute(query, params)
             rows = cur.fetchall()
-            print(
-                f"Found {len(rows)} attendance records from PostgreSQL")
-            if not rows:
-                return []
-
-            # Получение данных из Neo4j
-            student_ids = [item[0] for item in rows]
-            group_ids = [item[1] for item in rows]
-
-            with self.driver.session() as session:
-                result = session.run("""
-                    MATCH (s:Student)
-                    WHERE s.postgres_id IN $student_ids
-                    OPTIONAL MATCH (s)-[:MEMBER_OF]->(g:StudentGroup)
-                    WHERE g.postgres_id IN $group_ids
-                    RETURN s.postgres_id AS student_id, s.name AS name, 
-                           s.enrollment_year AS enrollment_year, s.date_of_birth AS date_of_birth,
-                           s.email AS email, s.book_number AS book_number,
-                           g.postgres_id AS group_id, g.name AS group_name
-                """, student_ids=student_ids, group_ids=group_ids)
-
-                neo4j_data = {r['student_id']: r for r in result.data()}
-
-            return [{
-                'studentId': row[0],
-                'studentName': neo4j_data.get(row[0], {}).get('name'),
-                'attendedCount': row[3],
-                'totalCount': row[2],
-                'attendancePercent': row[4],
-                'enrollment_year': neo4j_data.get(row[0], {}).get('enrollment_year'),
-                'date_of_birth': neo4j_data.get(row[0], {}).get('date_of_birth'),
-                'email': neo4j_data.get(row[0], {}).get('email'),
-                'book_number': neo4j_data.get(row[0], {}).get('book_number'),
-                'group_id': neo4j_data.get(row[0], {}).get('group_id'),
-                'group_name': neo4j_data.get(row[0], {}).get('group_name')
-            } for row in rows]
-
-        except Exception as e:
-            print(f"Error finding attendance: {e}")
-            return []
+            call.set(rows=len(rows))
+        return self._enrich(rows)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,145 @@
+# Шаблон, маппинг и документ индекса lecture_sessions. Модуль общий для
+# синхронизации (sync/elastic/create_elastic.py) и поиска (lecture_session.py),
+# чтобы поля запросов совпадали с индексируемыми
+from typing import Dict, List, Optional
+
+# Поиск всегда идет через алиас, физические индексы версионируются
+INDEX_ALIAS = "lecture_sessions"
+INDEX_VERSION_PREFIX = f"{INDEX_ALIAS}_v"
+INDEX_TEMPLATE_NAME = "lecture_sessions"
+
+INDEX_SETTINGS = {
+    "analysis": {
+        "filter": {
+            "lecture_edge_ngram": {"type": "edge_ngram", "min_gram": 2, "max_gram": 15}
+        },
+        "analyzer": {
+            # Префиксы слов при индексации; в запросе слово ищется целиком
+            "lecture_prefix": {
+                "type": "custom",
+                "tokenizer": "standard",
+                "filter": ["lowercase", "lecture_edge_ngram"]
+            },
+            "lecture_prefix_search": {
+                "type": "custom",
+                "tokenizer": "standard",
+                "filter": ["lowercase"]
+            }
+        },
+        "normalizer": {
+            "lecture_exact": {"type": "custom", "filter": ["lowercase", "trim"]}
+        }
+    }
+}
+
+
+def _text_field(prefix: bool = True) -> Dict:
+    """Текст с русским анализатором, подполя keyword (точное совпадение без
+    учета регистра) и prefix (edge-ngram)"""
+    fields = {"keyword": {"type": "keyword", "normalizer": "lecture_exact", "ignore_above": 256}}
+    if prefix:
+        fields["prefix"] = {
+            "type": "text",
+            "analyzer": "lecture_prefix",
+            "search_analyzer": "lecture_prefix_search"
+        }
+    return {"type": "text", "analyzer": "russian", "fields": fields}
+
+
+INDEX_MAPPINGS = {
+    "properties": {
+        "session_id": {"type": "integer"},
+        "topic": _text_field(),
+        "description": {"type": "text", "analyzer": "russian"},
+        "duration_minutes": {"type": "integer"},
+        "course_name": _text_field(),
+        "keywords": _text_field(prefix=False),
+        # keyword: фильтр по точному значению без диапазонных структур
+        "session_type_id": {"type": "keyword"},
+        "tags": {"type": "object"}
+    }
+}
+
+# Поля полнотекстового поиска и их веса
+TEXT_FIELDS = ["topic^3", "course_name^2", "description", "keywords"]
+PREFIX_FIELDS = ["topic.prefix^2", "course_name.prefix"]
+EXACT_FIELDS = ["topic.keyword", "course_name.keyword", "keywords.keyword"]
+
+
+def index_template() -> Dict:
+    """Компонуемый шаблон для всех версий lecture_sessions_v{n}"""
+    return {
+        "index_patterns": [f"{INDEX_VERSION_PREFIX}*"],
+        "template": {"settings": INDEX_SETTINGS, "mappings": INDEX_MAPPINGS},
+        "priority": 100
+    }
+
+
+def tag_keywords(tags: Optional[Dict]) -> List[str]:
+    """Ключевые слова из тегов: строковые значения, элементы списков и имена
+    тегов со значением true"""
+    keywords = []
+    for name, value in (tags or {}).items():
+        if value is True:
+            keywords.append(name)
+        elif isinstance(value, str) and value:
+            keywords.append(value)
+        elif isinstance(value, list):
+            keywords.extend(item for item in value if isinstance(item, str) and item)
+    return keywords
+
+
+def session_document(session_id: int, topic: str, description: str, duration_minutes: int,
+                     tags: Optional[Dict], course_name: str, session_type_id) -> Dict:
+    return {
+        "session_id": session_id,
+        "topic": topic,
+        "description": description,
+        "duration_minutes": duration_minutes,
+        "tags": tags or {},
+        "keywords": tag_keywords(tags),
+        "course_name": course_name,
+        "session_type_id": str(session_type_id)
+    }
+
+
+def session_type_filter(session_type_id) -> Dict:
+    return {"term": {"session_type_id": str(session_type_id)}}
+
+
+def exact_match_query(term: str, session_type_id) -> Dict:
+    """Точное совпадение термина с темой, курсом или ключевым словом"""
+    return {
+        "bool": {
+            "should": [{"term": {field: term}} for field in EXACT_FIELDS],
+            "minimum_should_match": 1,
+            "filter": [session_type_filter(session_type_id)]
+        }
+    }
+
+
+def full_text_query(term: str, session_type_id) -> Dict:
+    """Нечеткий поиск по тексту и поиск по префиксам слов"""
+    return {
+        "bool": {
+            "should": [
+                {
+                    "multi_match": {
+                        "query": term,
+                        "fields": TEXT_FIELDS,
+                        "type": "best_fields",
+                        "fuzziness": "AUTO"
+                    }
+                },
+                {
+                    "multi_match": {
+                        "query": term,
+                        "fields": PREFIX_FIELDS,
+                        "operator": "and"
+                    }
+                }
+            ],
+            "minimum_should_match": 1,
+            "filter": [session_type_filter(session_type_id)]
+        }
+    }
@@ -1,39 +1,148 @@
 from elasticsearch import Elasticsearch
-from typing import List
+from typing import Dict, Iterator, List, Optional
+
+from lecture_index import INDEX_ALIAS, exact_match_query, full_text_query
+from metrics import observe
+
+
+LECTURE_INDEX = INDEX_ALIAS
+
+# Порядок страниц внутри point-in-time: без сортировки по _score
+# Elasticsearch не считает релевантность, отчету нужен только набор id
+PIT_SORT = [{"_shard_doc": "asc"}]
+PIT_KEEP_ALIVE = "1m"
+SEARCH_MODES = ('source', 'ids', 'filter')
+
+
+def lecture_search_query(query: str, session_type_id: str, exact: bool = False) -> Dict:
+    """Запрос поиска занятий по термину с фильтром по типу занятия"""
+    if exact:
+        return exact_match_query(query, session_type_id)
+    return full_text_query(query, session_type_id)
+
+
+def response_size(response):
+    """Размер тела ответа Elasticsearch из Content-Length, если он есть"""
+    length = response.meta.headers.get('content-length')
+    return int(length) if length else None
+
+
+def search_query(query: str, session_type_id: str, mode: str, exact: bool = False) -> Dict:
+    """Запрос для режима mode: 'filter' оборачивает его в constant_score"""
+    if mode not in SEARCH_MODES:
+        raise ValueError(f"Unknown search mode {mode!r}, expected one of {SEARCH_MODES}")
+    bool_query = lecture_search_query(query, session_type_id, exact)
+    if mode == 'filter':
+        # Контекст фильтра: релевантность не считается, результат
+        # кэшируется в node query cache
+        return {"constant_score": {"filter": bool_query}}
+    return bool_query
+
+
+def page_params(query: Dict, page_size: int, ids_only: bool, pit_id: Optional[str] = None,
+                search_after: Optional[list] = None, keep_alive: str = PIT_KEEP_ALIVE) -> Dict:
+    """Параметры запроса одной страницы.
+
+    С pit_id — страница point-in-time + search_after, без него — обычный
+    поиск первой страницы. ids_only отключает _source и берет session_id
+    из doc values.
+    """
+    params = {
+        "query": query,
+        "size": page_size,
+        "track_total_hits": False
+    }
+    if ids_only:
+        params["source"] = False
+        params["docvalue_fields"] = ["session_id"]
+    else:
+        params["source"] = ["session_id"]
+    if pit_id is not None:
+        params["pit"] = {"id": pit_id, "keep_alive": keep_alive}
+        params["sort"] = PIT_SORT
+    else:
+        params["sort"] = [{"_doc": "asc"}]
+    if search_after is not None:
+        params["search_after"] = search_after
+    return params
+
+
+def hit_session_id(hit: Dict) -> int:
+    if 'fields' in hit:
+        return hit['fields']['session_id'][0]
+    return hit['_source']['session_id']
 
 
 class LectureMaterialSearcher:
+    """Поиск id занятий по термину.
+
+    Режимы (SEARCH_MODES):
+    - 'source' — session_id из _source, все страницы через point-in-time;
+    - 'ids' — без _source, session_id из doc values; первая страница
+      запрашивается с request_cache, и повторные термины отдаются из кэша
+      запросов шарда, point-in-time открывается, только если совпадений
+      больше page_size;
+    - 'filter' — как 'ids', но запрос в контексте фильтра (constant_score).
+    """
+
     def __init__(self, es_host: str = "localhost", es_port: int = 9200,
-                 es_user: str = "elastic", es_password: str = "secret"):
-        self.es = Elasticsearch(
+                 es_user: str = "elastic", es_password: str = "secret", es=None,
+                 mode: str = 'ids', index: str = LECTURE_INDEX, page_size: int = 1000):
+        if mode not in SEARCH_MODES:
+            raise ValueError(f"Unknown search mode {mode!r}, expected one of {SEARCH_MODES}")
+        self.es = es or Elasticsearch(
             hosts=[f"http://{es_host}:{es_port}"],
             basic_auth=(es_user, es_password),
             verify_certs=False
         )
+        self.mode = mode
+        self.index = index
+        self.page_size = page_size
 
-    def search_by_course_and_session_type(self, query: str, session_type_id: str) -> List[int]:
-        response = self.es.search(
-            index="lecture_sessions",
-            query={
-                "bool": {
-                    "must": [  # Обязательные условия
-                        {
-                            "multi_match": {
-                                "query": query,
-                                "fields": ["lecture_name^3", "course_name^2", "content", "keywords"],
-                                "type": "best_fields",
-                                "fuzziness": "AUTO"
-                            }
-                        }
-                    ],
-                    "filter": [
-                        {
-                            "term": {
-                                "session_type_id": session_type_id
-                            }
-                        }
-                    ]
-                }
-            }
-        )
-        return [hit['_source']['session_id'] for hit in response['hits']['hits']]
+    def iter_session_ids(self, query: Dict, mode: Optional[str] = None) -> Iterator[int]:
+        """Все session_id, подходящие под query, страницами по page_size.
+
+        Point-in-time фиксирует состояние индекса на время обхода, поэтому
+        переиндексация между страницами не дает пропусков и повторов.
+        """
+        ids_only = (mode or self.mode) != 'source'
+        if ids_only:
+            with observe('elasticsearch', 'lecture_search_cached') as call:
+                response = self.es.search(
+                    index=self.index, request_cache=True,
+                    **page_params(query, self.page_size, ids_only))
+                hits = response['hits']['hits']
+                call.set(rows=len(hits), bytes=response_size(response))
+            if len(hits) < self.page_size:
+                yield from (hit_session_id(hit) for hit in hits)
+                return
+
+        pit_id = self.es.open_point_in_time(index=self.index, keep_alive=PIT_KEEP_ALIVE)['id']
+        search_after = None
+        try:
+            while True:
+                with observe('elasticsearch', 'lecture_search_page') as call:
+                    response = self.es.search(**page_params(
+                        query, self.page_size, ids_only, pit_id, search_after))
+                    hits = response['hits']['hits']
+                    call.set(rows=len(hits), bytes=response_size(response))
+                # Идентификатор PIT может меняться от страницы к странице
+                pit_id = response.get('pit_id', pit_id)
+                for hit in hits:
+                    yield hit_session_id(hit)
+                if len(hits) < self.page_size:
+                    break
+                search_after = hits[-1]['sort']
+        finally:
+            self.es.close_point_in_time(id=pit_id)
+
+    def search_by_course_and_session_type(self, query: str, session_type_id: str,
+                                          mode: Optional[str] = None) -> List[int]:
+        """Сначала точное совпадение с темой, курсом или ключевым словом;
+        нечеткий поиск — только если точных совпадений нет"""
+        mode = mode or self.mode
+        exact = list(self.iter_session_ids(
+            search_query(query, session_type_id, mode, exact=True), mode))
+        if exact:
+            return exact
+        return list(self.iter_session_ids(search_query(query, session_type_id, mode), mode))
@@ -0,0 +1,190 @@
+import contextvars
+import json
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+from flask import Response, g, request
+from prometheus_client import CONTENT_TYPE_LATEST, Histogram, generate_latest
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+ROWS_BUCKETS = (0, 1, 5, 10, 50, 100, 500, 1000, 5000, 10000, 50000)
+BYTES_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+DATASTORE_LATENCY = Histogram(
+    'lab1_datastore_latency_seconds', 'Время обращения к хранилищу',
+    ['store', 'operation'], buckets=LATENCY_BUCKETS)
+DATASTORE_ROWS = Histogram(
+    'lab1_datastore_rows', 'Число строк/документов в ответе хранилища',
+    ['store', 'operation'], buckets=ROWS_BUCKETS)
+DATASTORE_BYTES = Histogram(
+    'lab1_datastore_payload_bytes', 'Размер ответа хранилища',
+    ['store', 'operation'], buckets=BYTES_BUCKETS)
+REQUEST_LATENCY = Histogram(
+    'lab1_http_request_duration_seconds', 'Время обработки HTTP-запроса',
+    ['endpoint', 'method', 'status'], buckets=LATENCY_BUCKETS)
+
+
+class Span:
+    """Узел дерева трассировки запроса"""
+
+    __slots__ = ('name', 'attrs', 'children', 'error', 'start', 'duration', '_started')
+
+    def __init__(self, name: str, attrs: Dict):
+        self.name = name
+        self.attrs = dict(attrs)
+        self.children = []
+        self.error = None
+        self.start = time.time()
+        self.duration: Optional[float] = None
+        self._started = time.perf_counter()
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def finish(self):
+        self.duration = time.perf_counter() - self._started
+
+    def as_dict(self) -> Dict:
+        result = {
+            'name': self.name,
+            'start': self.start,
+            'duration_ms': round(self.duration * 1000, 3) if self.duration is not None else None,
+            'attrs': self.attrs,
+            'children': [child.as_dict() for child in self.children],
+        }
+        if self.error:
+            result['error'] = self.error
+        return result
+
+
+class TraceFileSink:
+    """Дерево спанов каждого запроса — строкой JSON в локальный файл"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._file = None
+
+    def write(self, root: Span):
+        line = json.dumps(root.as_dict(), ensure_ascii=False, default=str)
+        with self._lock:
+            if self._file is None:
+                self._file = open(self.path, 'a', encoding='utf-8', buffering=1)
+            self._file.write(line + '\n')
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+_current_span: contextvars.ContextVar = contextvars.ContextVar('current_span', default=None)
+_sink: Optional[TraceFileSink] = None
+
+
+def configure_tracing(path: Optional[str]) -> Optional[TraceFileSink]:
+    """Включает запись трасс в файл; пустой path — трассы не пишутся"""
+    global _sink
+    _sink = TraceFileSink(path) if path else None
+    return _sink
+
+
+def current_span() -> Optional[Span]:
+    return _current_span.get()
+
+
+@contextmanager
+def attach(parent: Optional[Span]):
+    """Делает parent текущим спаном, например в потоке цикла событий"""
+    token = _current_span.set(parent)
+    try:
+        yield parent
+    finally:
+        _current_span.reset(token)
+
+
+@contextmanager
+def span(name: str, **attrs):
+    parent = _current_span.get()
+    current = Span(name, attrs)
+    if parent is not None:
+        parent.children.append(current)
+    token = _current_span.set(current)
+    try:
+        yield current
+    except Exception as e:
+        current.error = repr(e)
+        raise
+    finally:
+        current.finish()
+        _current_span.reset(token)
+
+
+def payload_size(value) -> int:
+    return len(json.dumps(value, ensure_ascii=False, default=str).encode('utf-8'))
+
+
+@contextmanager
+def observe(store: str, operation: str, **attrs):
+    """Спан обращения к хранилищу и его гистограммы.
+
+    Вызывающий код сообщает объем ответа через span.set(rows=..., bytes=...);
+    гистограммы строк и байтов заполняются, только если значение известно.
+    """
+    started = time.perf_counter()
+    with span(f"{store}.{operation}", store=store, **attrs) as current:
+        try:
+            yield current
+        finally:
+            DATASTORE_LATENCY.labels(store, operation).observe(time.perf_counter() - started)
+            if current.attrs.get('rows') is not None:
+                DATASTORE_ROWS.labels(store, operation).observe(current.attrs['rows'])
+            if current.attrs.get('bytes') is not None:
+                DATASTORE_BYTES.labels(store, operation).observe(current.attrs['bytes'])
+
+
+def instrument_app(app, service: str):
+    """Гистограмма времени запросов, корневой спан трассы и GET /metrics"""
+
+    @app.before_request
+    def _start_request():
+        if request.path == '/metrics':
+            return
+        g.request_started = time.perf_counter()
+        g.trace_root = Span(f"{request.method} {request.path}", {
+            'service': service,
+            'trace_id': uuid.uuid4().hex,
+        })
+        _current_span.set(g.trace_root)
+
+    @app.after_request
+    def _observe_request(response):
+        started = g.get('request_started')
+        if started is not None:
+            endpoint = request.url_rule.rule if request.url_rule else 'unmatched'
+            REQUEST_LATENCY.labels(endpoint, request.method, str(response.status_code)).observe(
+                time.perf_counter() - started)
+            g.trace_root.set(status=response.status_code)
+        return response
+
+    @app.teardown_request
+    def _finish_request(error):
+        root = g.pop('trace_root', None)
+        if root is None:
+            return
+        if error is not None:
+            root.error = repr(error)
+        root.finish()
+        # Потоковый ответ завершается в другом контексте, поэтому без reset()
+        if _current_span.get() is root:
+            _current_span.set(None)
+        if _sink is not None:
+            _sink.write(root)
+
+    @app.route('/metrics', methods=['GET'])
+    def metrics():
+        return Response(generate_latest(), content_type=CONTENT_TYPE_LATEST)
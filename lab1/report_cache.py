@@ -0,0 +1,148 @@
+import hashlib
+import json
+import time
+from typing import Callable, Dict, Optional, Tuple
+
+from redis.exceptions import LockError
+
+
+class ReportCache:
+    """Кэш готовых отчетов в Redis.
+
+    Ключ строится из (термин, начало, конец) и номера поколения. Инвалидация
+    увеличивает поколение, поэтому отчеты, которые считались во время
+    изменения данных, не попадут в новое поколение. Число записей
+    ограничено: самые старые вытесняются через sorted set с временем записи.
+
+    Термин в ключе нормализован, поэтому search_term в кэш не пишется и
+    подставляется из запроса при каждом чтении.
+    """
+
+    def __init__(
+        self,
+        client,
+        namespace: str = 'report:lab1',
+        ttl: int = 300,
+        max_entries: int = 1000,
+        lock_timeout: int = 60,
+        wait_timeout: float = 30.0
+    ):
+        self.r = client
+        self.namespace = namespace
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.lock_timeout = lock_timeout
+        self.wait_timeout = wait_timeout
+        self.generation_key = f"{namespace}:generation"
+        self.index_key = f"{namespace}:index"
+        self.stats_key = f"{namespace}:stats"
+
+    def _key(self, term: str, start_date: str, end_date: str) -> str:
+        generation = self.r.get(self.generation_key) or 0
+        raw = json.dumps([term.strip().lower(), start_date, end_date], ensure_ascii=False)
+        digest = hashlib.sha1(raw.encode('utf-8')).hexdigest()
+        return f"{self.namespace}:v{generation}:{digest}"
+
+    def _load(self, key: str, term: str) -> Optional[Dict]:
+        cached = self.r.get(key)
+        if cached is None:
+            return None
+        report = json.loads(cached)
+        report['search_term'] = term
+        return report
+
+    def _store(self, key: str, report: Dict):
+        body = {k: v for k, v in report.items() if k != 'search_term'}
+        now = time.time()
+        with self.r.pipeline() as pipe:
+            pipe.set(key, json.dumps(body, ensure_ascii=False, default=str), ex=self.ttl)
+            # Ключи старше ttl уже истекли в Redis, убираем их из индекса
+            pipe.zremrangebyscore(self.index_key, '-inf', now - self.ttl)
+            pipe.zadd(self.index_key, {key: now})
+            pipe.zcard(self.index_key)
+            size = pipe.execute()[-1]
+
+        overflow = size - self.max_entries
+        if overflow > 0:
+            evicted = [member for member, _ in self.r.zpopmin(self.index_key, overflow)]
+            if evicted:
+                self.r.delete(*evicted)
+                self.r.hincrby(self.stats_key, 'evictions', len(evicted))
+
+    def get_or_compute(
+        self,
+        term: str,
+        start_date: str,
+        end_date: str,
+        compute: Callable[[], Optional[Dict]]
+    ) -> Tuple[Optional[Dict], bool]:
+        """Возвращает (отчет, попадание в кэш).
+
+        Отчет считается только одним вычислителем на ключ, остальные ждут
+        на блокировке и читают готовый результат. Если compute вернул None,
+        результат не кэшируется.
+        """
+        key = self._key(term, start_date, end_date)
+        report = self._load(key, term)
+        if report is not None:
+            self.r.hincrby(self.stats_key, 'hits', 1)
+            return report, True
+
+        lock = self.r.lock(
+            f"{key}:lock",
+            timeout=self.lock_timeout,
+            blocking_timeout=self.wait_timeout
+        )
+        acquired = lock.acquire()
+        try:
+            if acquired:
+                # Пока ждали блокировку, отчет мог посчитать другой обработчик
+                report = self._load(key, term)
+                if report is not None:
+                    self.r.hincrby(self.stats_key, 'hits', 1)
+                    return report, True
+            else:
+                self.r.hincrby(self.stats_key, 'lock_timeouts', 1)
+
+            self.r.hincrby(self.stats_key, 'misses', 1)
+            report = compute()
+            if report is not None:
+                self._store(key, report)
+            return report, False
+        finally:
+            if acquired:
+                try:
+                    lock.release()
+                except LockError:
+                    # Блокировка истекла по таймауту во время вычисления
+                    pass
+
+    def invalidate(self) -> int:
+        """Сбрасывает все отчеты, возвращает число удаленных ключей"""
+        self.r.incr(self.generation_key)
+        keys = self.r.zrange(self.index_key, 0, -1)
+        with self.r.pipeline() as pipe:
+            if keys:
+                pipe.delete(*keys)
+            pipe.delete(self.index_key)
+            pipe.hincrby(self.stats_key, 'invalidations', 1)
+            pipe.execute()
+        return len(keys)
+
+    def stats(self) -> Dict:
+        counters = {k: int(v) for k, v in self.r.hgetall(self.stats_key).items()}
+        hits = counters.get('hits', 0)
+        misses = counters.get('misses', 0)
+        lookups = hits + misses
+        return {
+            'hits': hits,
+            'misses': misses,
+            'hit_ratio': round(hits / lookups, 3) if lookups else 0.0,
+            'miss_ratio': round(misses / lookups, 3) if lookups else 0.0,
+            'evictions': counters.get('evictions', 0),
+            'invalidations': counters.get('invalidations', 0),
+            'lock_timeouts': counters.get('lock_timeouts', 0),
+            'entries': self.r.zcard(self.index_key),
+            'max_entries': self.max_entries,
+            'ttl': self.ttl,
+        }
@@ -0,0 +1,88 @@
+import atexit
+
+from flask import Flask, request, jsonify
+from psycopg2 import pool as pg_pool
+
+from const import PG_CONFIG, PG_POOL_MAXCONN, PG_POOL_MINCONN, ROOM_DEMAND_REFRESH_INTERVAL
+from room_report import RoomDemandRefresher, get_room_demand
+
+
+app = Flask(__name__)
+
+postgres = pg_pool.ThreadedConnectionPool(PG_POOL_MINCONN, PG_POOL_MAXCONN, **PG_CONFIG)
+atexit.register(postgres.closeall)
+
+refresher = RoomDemandRefresher(postgres, ROOM_DEMAND_REFRESH_INTERVAL)
+refresher.start()
+atexit.register(refresher.stop)
+
+
+def has_all_required_fields(data, required_fields):
+    if not all(field in data for field in required_fields):
+        return False
+    return True
+
+
+@app.route('/api/lab2/report', methods=['POST'])
+def generate_room_report():
+    if not request.is_json:
+        return jsonify({'error': 'Request must be JSON'}), 400
+
+    data = request.get_json()
+
+    required_fields = ['course_year', 'semester']
+    if not has_all_required_fields(data, required_fields):
+        return jsonify({
+            'error': f"Missing required fields: {required_fields}",
+            'received': list(data.keys())
+        }), 400
+
+    try:
+        course_year = int(data['course_year'])
+        semester = int(data['semester'])
+        academic_year = int(data['academic_year']) if data.get('academic_year') else None
+    except (TypeError, ValueError):
+        return jsonify({'error': 'course_year, semester and academic_year must be integers'}), 400
+    if semester not in (1, 2):
+        return jsonify({'error': 'semester must be 1 or 2'}), 400
+
+    conn = postgres.getconn()
+    try:
+        courses = get_room_demand(conn, course_year, semester, academic_year)
+        conn.rollback()
+    except Exception as e:
+        conn.rollback()
+        app.logger.error(f"Error: {e}")
+        return jsonify({'error': 'Data processing failed'}), 500
+    finally:
+        postgres.putconn(conn)
+
+    report = {
+        'course_year': course_year,
+        'semester': semester,
+        'academic_year': academic_year,
+        'courses': courses
+    }
+    meta = {
+        'status': 'success',
+        'results': len(courses),
+        'last_refresh_ok': refresher.last_refresh_ok
+    }
+    return jsonify(report=report, meta=meta), 200
+
+
+@app.route('/api/lab2/refresh', methods=['POST'])
+def refresh_report():
+    """Обновление представления по запросу, например после загрузки данных"""
+    try:
+        refreshed = refresher.refresh()
+    except Exception as e:
+        app.logger.error(f"Error: {e}")
+        return jsonify({'error': 'Refresh failed'}), 500
+    if not refreshed:
+        return jsonify({'status': 'already running'}), 409
+    return jsonify({'status': 'refreshed'}), 200
+
+
+if __name__ == '__main__':
+    app.run(host='0.0.0.0', port=5002, threaded=True)
@@ -0,0 +1,13 @@
+import os
+
+
+PG_CONFIG = {
+    'dbname': os.getenv("POSTGRES_DB", "postgres_db"),
+    'user': os.getenv("POSTGRES_USER", "postgres_user"),
+    'password': os.getenv("POSTGRES_PASSWORD", "postgres_password"),
+    'host': os.getenv("POSTGRES_HOST", "postgres"),
+    'port': os.getenv("POSTGRES_PORT", 5430),
+}
+PG_POOL_MINCONN = int(os.getenv("PG_POOL_MINCONN", 1))
+PG_POOL_MAXCONN = int(os.getenv("PG_POOL_MAXCONN", 10))
+ROOM_DEMAND_REFRESH_INTERVAL = float(os.getenv("ROOM_DEMAND_REFRESH_INTERVAL", 300))
@@ -0,0 +1,126 @@
+import threading
+from typing import Dict, List, Optional
+
+# Технические средства, которых требуют материалы лекции
+TECHNICAL_REQUIREMENTS = {
+    'pdf': 'Проектор',
+    'ppt': 'Проектор',
+    'doc': 'Проектор',
+    'video': 'Проектор и акустическая система',
+    'audio': 'Акустическая система',
+    'code': 'Компьютеры для слушателей',
+    'zip': 'Компьютеры для слушателей',
+}
+
+# Ключ advisory lock, чтобы представление обновлял один экземпляр сервиса
+REFRESH_LOCK_KEY = 720018
+
+
+def technical_requirements(material_types: List[str]) -> List[str]:
+    return sorted({TECHNICAL_REQUIREMENTS[t] for t in material_types if t in TECHNICAL_REQUIREMENTS})
+
+
+def refresh_room_demand(conn) -> bool:
+    """REFRESH MATERIALIZED VIEW CONCURRENTLY: отчеты читаются и во время обновления.
+
+    Возвращает False, если обновление уже выполняет другой процесс.
+    """
+    conn.autocommit = True
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SELECT pg_try_advisory_lock(%s)", (REFRESH_LOCK_KEY,))
+            if not cur.fetchone()[0]:
+                return False
+            try:
+                cur.execute("REFRESH MATERIALIZED VIEW CONCURRENTLY Lecture_Room_Demand")
+            finally:
+                cur.execute("SELECT pg_advisory_unlock(%s)", (REFRESH_LOCK_KEY,))
+        return True
+    finally:
+        conn.autocommit = False
+
+
+def get_room_demand(conn, course_year: int, semester: int,
+                    academic_year: Optional[int] = None) -> List[Dict]:
+    """Курсы с лекциями и числом слушателей; вместимость аудитории курса —
+    максимум слушателей по его лекциям"""
+    query = """
+        SELECT academic_year, course_id, course_name, course_description,
+               duration_weeks, department_id, session_id, topic, duration_minutes,
+               session_description, group_count, listeners, material_types
+        FROM Lecture_Room_Demand
+        WHERE course_year = %s AND semester = %s
+    """
+    params = [course_year, semester]
+    if academic_year is not None:
+        query += " AND academic_year = %s"
+        params.append(academic_year)
+    query += " ORDER BY academic_year, course_id, session_id"
+
+    with conn.cursor() as cur:
+        cur.execute(query, params)
+        rows = cur.fetchall()
+
+    courses: Dict[tuple, Dict] = {}
+    for (year, course_id, name, description, weeks, department_id, session_id, topic,
+         duration, session_description, group_count, listeners, material_types) in rows:
+        course = courses.setdefault((year, course_id), {
+            'academic_year': year,
+            'course_id': course_id,
+            'course_name': name,
+            'course_description': description,
+            'duration_weeks': weeks,
+            'department_id': department_id,
+            'required_capacity': 0,
+            'technical_requirements': set(),
+            'lectures': [],
+        })
+        requirements = technical_requirements(material_types)
+        course['required_capacity'] = max(course['required_capacity'], listeners)
+        course['technical_requirements'].update(requirements)
+        course['lectures'].append({
+            'session_id': session_id,
+            'topic': topic,
+            'duration_minutes': duration,
+            'description': session_description,
+            'group_count': group_count,
+            'listeners': listeners,
+            'technical_requirements': requirements,
+        })
+
+    for course in courses.values():
+        course['technical_requirements'] = sorted(course['technical_requirements'])
+    return list(courses.values())
+
+
+class RoomDemandRefresher:
+    """Периодическое обновление представления в фоновом потоке"""
+
+    def __init__(self, pg_pool, interval: float):
+        self.pg_pool = pg_pool
+        self.interval = interval
+        self.last_refresh_ok: Optional[bool] = None
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='room-demand-refresh', daemon=True)
+
+    def start(self):
+        if self.interval > 0:
+            self._thread.start()
+
+    def refresh(self) -> bool:
+        conn = self.pg_pool.getconn()
+        try:
+            self.last_refresh_ok = refresh_room_demand(conn)
+            return self.last_refresh_ok
+        finally:
+            self.pg_pool.putconn(conn)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.refresh()
+            except Exception as e:
+                print(f"Error refreshing Lecture_Room_Demand: {e}")
+
+    def stop(self):
+        self._stop.set()
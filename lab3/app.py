@@ -0,0 +1,81 @@
+import atexit
+
+from flask import Flask, request, jsonify
+from neo4j import GraphDatabase
+
+from const import NEO4J_MAX_POOL_SIZE, NEO4J_PASSWORD, NEO4J_URI, NEO4J_USER
+
+
+app = Flask(__name__)
+
+driver = GraphDatabase.driver(
+    NEO4J_URI,
+    auth=(NEO4J_USER, NEO4J_PASSWORD),
+    max_connection_pool_size=NEO4J_MAX_POOL_SIZE
+)
+atexit.register(driver.close)
+
+# Часы посчитаны при синхронизации и лежат на связях TAKES_COURSE,
+# поэтому отчет — один проход по курсам группы
+GROUP_HOURS_QUERY = '''
+MATCH (g:StudentGroup {name: $group_name})-[r:TAKES_COURSE]->(c:Course)
+RETURN g.postgres_id AS group_id, c.postgres_id AS course_id, c.name AS course_name,
+       coalesce(r.planned_hours, 0) AS planned_hours,
+       coalesce(r.heard_hours, 0) AS heard_hours
+ORDER BY course_name
+'''
+
+
+def has_all_required_fields(data, required_fields):
+    if not all(field in data for field in required_fields):
+        return False
+    return True
+
+
+def get_group_hours(group_name):
+    with driver.session(default_access_mode='READ') as session:
+        return [record.data() for record in session.run(GROUP_HOURS_QUERY, group_name=group_name)]
+
+
+@app.route('/api/lab3/report', methods=['POST'])
+def generate_hours_report():
+    if not request.is_json:
+        return jsonify({'error': 'Request must be JSON'}), 400
+
+    data = request.get_json()
+
+    required_fields = ['group_name']
+    if not has_all_required_fields(data, required_fields):
+        return jsonify({
+            'error': f"Missing required fields: {required_fields}",
+            'received': list(data.keys())
+        }), 400
+
+    try:
+        rows = get_group_hours(data['group_name'])
+    except Exception as e:
+        app.logger.error(f"Error: {e}")
+        return jsonify({'error': 'Data processing failed'}), 500
+
+    if not rows:
+        return jsonify({'error': 'No courses found for the group'}), 404
+
+    report = {
+        'group_name': data['group_name'],
+        'group_id': rows[0]['group_id'],
+        'courses': [
+            {key: row[key] for key in ('course_id', 'course_name', 'planned_hours', 'heard_hours')}
+            for row in rows
+        ],
+        'total_planned_hours': sum(row['planned_hours'] for row in rows),
+        'total_heard_hours': sum(row['heard_hours'] for row in rows)
+    }
+    meta = {
+        'status': 'success',
+        'results': len(rows)
+    }
+    return jsonify(report=report, meta=meta), 200
+
+
+if __name__ == '__main__':
+    app.run(host='0.0.0.0', port=5003, threaded=True)
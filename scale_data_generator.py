@@ -0,0 +1,336 @@
+import argparse
+import math
+import os
+import random
+import time
+from datetime import date, datetime, timedelta
+from multiprocessing import Pool
+
+import psycopg2
+
+from consts import DEPARTMENTS, INSTITUTES, SESSION_TYPES, SPECIALTIES, UNIVERSITIES
+from data_generator import (ABSENCE_REASONS, ROOMS, START_TIMES, TABLE_COLUMNS,
+                            copy_rows, make_lecture_material, make_lecture_session,
+                            make_student, print_timing_summary)
+from env import DB_HOST, DB_NAME, DB_PASSWORD, DB_PORT, DB_USER
+
+# Занятия курса на неделю: лекция (type_id = 1) и семинар (type_id = 2)
+WEEKLY_SESSION_TYPES = (1, 2)
+
+# Параметры бета-распределения склонности студента посещать занятия:
+# среднее ~0.78 и длинный хвост в сторону прогульщиков
+ATTENDANCE_ALPHA = 5.0
+ATTENDANCE_BETA = 1.4
+
+
+def _connect():
+    return psycopg2.connect(
+        dbname=DB_NAME,
+        user=DB_USER,
+        password=DB_PASSWORD,
+        host=DB_HOST,
+        port=DB_PORT
+    )
+
+
+def _rng(seed, *parts):
+    """Отдельный детерминированный генератор для каждой части данных"""
+    return random.Random(":".join(str(p) for p in (seed,) + parts))
+
+
+class ScalePlan:
+    """Детерминированный план данных: кардинальности и диапазоны id.
+
+    Id групп, курсов, занятий, студентов и расписания вычисляются заранее,
+    поэтому процессы-генераторы не обращаются к БД за ключами и результат
+    не зависит от числа процессов.
+    """
+
+    def __init__(self, students, courses, weeks, group_size=25, courses_per_group=6,
+                 seed=42, start_date=date(2023, 9, 1)):
+        self.students = students
+        self.courses = courses
+        self.weeks = weeks
+        self.group_size = group_size
+        self.courses_per_group = courses_per_group
+        self.seed = seed
+        self.start_date = start_date
+        self.groups = max(1, math.ceil(students / group_size))
+        self.sessions_per_course = weeks * len(WEEKLY_SESSION_TYPES)
+
+        # Курс j относится к кафедре (j - 1) % len(DEPARTMENTS) + 1. Если курсов
+        # меньше, чем кафедр, кафедрам без своих курсов курсы раздаются по кругу,
+        # чтобы у групп каждой кафедры были Group_Courses и расписание
+        self.courses_by_department = {}
+        for course_id in range(1, courses + 1):
+            department_id = (course_id - 1) % len(DEPARTMENTS) + 1
+            self.courses_by_department.setdefault(department_id, []).append(course_id)
+        if courses:
+            for department_id in range(courses + 1, len(DEPARTMENTS) + 1):
+                self.courses_by_department[department_id] = [(department_id - 1) % courses + 1]
+
+        self.group_courses = {}
+        for group_id in range(1, self.groups + 1):
+            available = self.courses_by_department.get(self.group_department(group_id), [])
+            count = min(courses_per_group, len(available))
+            rng = _rng(seed, 'group_courses', group_id)
+            self.group_courses[group_id] = sorted(rng.sample(available, count))
+
+        # Первый schedule_id каждой группы (префиксные суммы)
+        self.schedule_offsets = {}
+        offset = 0
+        for group_id in range(1, self.groups + 1):
+            self.schedule_offsets[group_id] = offset
+            offset += len(self.group_courses[group_id]) * self.sessions_per_course
+        self.schedule_rows = offset
+
+    def group_department(self, group_id):
+        return (group_id - 1) % len(DEPARTMENTS) + 1
+
+    def group_students(self, group_id):
+        """Диапазон student_id группы: студенты делятся между группами поровну"""
+        base, extra = divmod(self.students, self.groups)
+        index = group_id - 1
+        first = index * base + min(index, extra) + 1
+        size = base + (1 if index < extra else 0)
+        return range(first, first + size)
+
+    def session_id(self, course_id, week, session_type_id):
+        index = (week - 1) * len(WEEKLY_SESSION_TYPES) + WEEKLY_SESSION_TYPES.index(session_type_id)
+        return (course_id - 1) * self.sessions_per_course + index + 1
+
+    def partitions(self, workers):
+        """Разбиение групп на непрерывные диапазоны для процессов"""
+        size = max(1, math.ceil(self.groups / (workers * 4)))
+        return [
+            (first, min(first + size - 1, self.groups))
+            for first in range(1, self.groups + 1, size)
+        ]
+
+
+def generate_student_groups(plan):
+    rng = _rng(plan.seed, 'groups')
+    for group_id in range(1, plan.groups + 1):
+        yield (
+            group_id,
+            f"ГР-{group_id:06d}",
+            plan.group_department(group_id),
+            (group_id - 1) % len(SPECIALTIES) + 1,
+            rng.randint(2021, 2024)
+        )
+
+
+def generate_courses(plan):
+    for course_id in range(1, plan.courses + 1):
+        department_id = (course_id - 1) % len(DEPARTMENTS) + 1
+        yield (
+            course_id,
+            f"Курс {course_id}",
+            f"Синтетический курс кафедры {department_id}",
+            plan.weeks,
+            department_id
+        )
+
+
+def generate_group_courses(plan):
+    for group_id, course_ids in plan.group_courses.items():
+        for course_id in course_ids:
+            yield (group_id, course_id)
+
+
+def generate_lecture_sessions(plan):
+    for course_id in range(1, plan.courses + 1):
+        rng = _rng(plan.seed, 'sessions', course_id)
+        for week in range(1, plan.weeks + 1):
+            for session_type_id in WEEKLY_SESSION_TYPES:
+                yield (plan.session_id(course_id, week, session_type_id),) + \
+                    make_lecture_session(course_id, session_type_id, week, rng=rng)
+
+
+def generate_lecture_materials(plan, now):
+    rng = _rng(plan.seed, 'materials')
+    for session_id in range(1, plan.courses * plan.sessions_per_course + 1):
+        yield make_lecture_material(session_id, rng=rng, now=now)
+
+
+def generate_group_students(plan, group_id, group_name, current_year):
+    rng = _rng(plan.seed, 'students', group_id)
+    for student_id in plan.group_students(group_id):
+        yield (student_id,) + make_student(group_id, group_name, rng=rng, current_year=current_year)
+
+
+def generate_group_schedule(plan, group_id):
+    """Расписание группы: каждое занятие каждого изучаемого курса раз в неделю"""
+    schedule_id = plan.schedule_offsets[group_id]
+    rng = _rng(plan.seed, 'schedule', group_id)
+    for course_index, course_id in enumerate(plan.group_courses[group_id]):
+        weekday = course_index % 5
+        slot = (course_index // 5) * len(WEEKLY_SESSION_TYPES)
+        room = rng.choice(ROOMS)
+        for week in range(1, plan.weeks + 1):
+            scheduled_date = plan.start_date + timedelta(weeks=week - 1, days=weekday)
+            for type_index, session_type_id in enumerate(WEEKLY_SESSION_TYPES):
+                schedule_id += 1
+                yield (
+                    schedule_id,
+                    group_id,
+                    plan.session_id(course_id, week, session_type_id),
+                    room,
+                    scheduled_date,
+                    START_TIMES[(slot + type_index) % len(START_TIMES)]
+                )
+
+
+def generate_group_attendance(plan, group_id, schedule_rows):
+    """Посещаемость со скошенным распределением.
+
+    У каждого студента своя склонность посещать занятия (бета-распределение),
+    лекции посещают чуть хуже семинаров, к концу семестра посещаемость падает.
+    """
+    rng = _rng(plan.seed, 'attendance', group_id)
+    propensity = {
+        student_id: rng.betavariate(ATTENDANCE_ALPHA, ATTENDANCE_BETA)
+        for student_id in plan.group_students(group_id)
+    }
+    for schedule_id, _, session_id, _, scheduled_date, _ in schedule_rows:
+        week = (scheduled_date - plan.start_date).days // 7 + 1
+        is_lecture = (session_id - 1) % len(WEEKLY_SESSION_TYPES) == 0
+        modifier = (0.92 if is_lecture else 1.0) * (1 - 0.15 * week / plan.weeks)
+        for student_id, p in propensity.items():
+            attended = rng.random() < p * modifier
+            reason = None if attended else rng.choice(ABSENCE_REASONS)
+            yield (schedule_id, student_id, attended, reason)
+
+
+def _load(cur, timings, table, rows, columns=None):
+    started = time.perf_counter()
+    count = copy_rows(cur, table, columns or TABLE_COLUMNS[table], rows)
+    loaded, seconds = timings.get(table, (0, 0.0))
+    timings[table] = (loaded + count, seconds + time.perf_counter() - started)
+
+
+_worker_plan = None
+
+
+def _init_worker(plan):
+    # План передается процессу один раз, а не с каждой задачей
+    global _worker_plan
+    _worker_plan = plan
+
+
+def load_partition(args):
+    """Загрузка студентов, расписания и посещаемости диапазона групп в отдельном процессе"""
+    first_group, last_group, current_year = args
+    plan = _worker_plan
+    timings = {}
+    conn = _connect()
+    try:
+        with conn.cursor() as cur:
+            for group_id in range(first_group, last_group + 1):
+                group_name = f"ГР-{group_id:06d}"
+                _load(cur, timings, 'Students',
+                      generate_group_students(plan, group_id, group_name, current_year),
+                      ('student_id',) + TABLE_COLUMNS['Students'])
+
+                schedule_rows = list(generate_group_schedule(plan, group_id))
+                _load(cur, timings, 'Schedule', schedule_rows,
+                      ('schedule_id',) + TABLE_COLUMNS['Schedule'])
+                _load(cur, timings, 'Attendance',
+                      generate_group_attendance(plan, group_id, schedule_rows))
+        conn.commit()
+    finally:
+        conn.close()
+    return timings
+
+
+def _reset_sequences(cur):
+    for table, column in (('Student_Groups', 'group_id'), ('Courses', 'course_id'),
+                          ('Lecture_Sessions', 'session_id'), ('Students', 'student_id'),
+                          ('Schedule', 'schedule_id')):
+        cur.execute(f"""
+            SELECT setval(pg_get_serial_sequence('{table.lower()}', '{column}'),
+                          COALESCE((SELECT MAX({column}) FROM {table}), 1))
+        """)
+
+
+def generate(plan, workers=None):
+    """Заполнение пустой схемы данными по плану, возвращает тайминги по таблицам"""
+    workers = workers or os.cpu_count() or 1
+    current_year = datetime.now().year
+    now = datetime.combine(plan.start_date, datetime.min.time())
+    timings = {}
+
+    conn = _connect()
+    try:
+        with conn.cursor() as cur:
+            _load(cur, timings, 'Universities', UNIVERSITIES)
+            _load(cur, timings, 'Institutes', INSTITUTES)
+            _load(cur, timings, 'Departments', DEPARTMENTS)
+            _load(cur, timings, 'Specialties', SPECIALTIES)
+            _load(cur, timings, 'Session_Types', SESSION_TYPES)
+            _load(cur, timings, 'Student_Groups', generate_student_groups(plan),
+                  ('group_id',) + TABLE_COLUMNS['Student_Groups'])
+            _load(cur, timings, 'Courses', generate_courses(plan),
+                  ('course_id',) + TABLE_COLUMNS['Courses'])
+            _load(cur, timings, 'Group_Courses', generate_group_courses(plan))
+            _load(cur, timings, 'Lecture_Sessions', generate_lecture_sessions(plan),
+                  ('session_id',) + TABLE_COLUMNS['Lecture_Sessions'])
+            _load(cur, timings, 'Lecture_Materials', generate_lecture_materials(plan, now))
+        conn.commit()
+
+        tasks = [(first, last, current_year) for first, last in plan.partitions(workers)]
+        with Pool(workers, initializer=_init_worker, initargs=(plan,)) as pool:
+            for partition_timings in pool.imap_unordered(load_partition, tasks):
+                for table, (rows, seconds) in partition_timings.items():
+                    loaded, total = timings.get(table, (0, 0.0))
+                    timings[table] = (loaded + rows, total + seconds)
+
+        with conn.cursor() as cur:
+            _reset_sequences(cur)
+        conn.commit()
+    finally:
+        conn.close()
+    return timings
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Генерация синтетических данных заданного масштаба")
+    parser.add_argument('--students', type=float, default=10000)
+    parser.add_argument('--courses', type=float, default=100)
+    parser.add_argument('--weeks', type=int, default=16)
+    parser.add_argument('--group-size', type=int, default=25)
+    parser.add_argument('--courses-per-group', type=int, default=6)
+    parser.add_argument('--start-date', type=date.fromisoformat, default=date(2023, 9, 1))
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--reset', action='store_true',
+                        help="пересоздать таблицы перед загрузкой")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    if args.reset:
+        from clean_postgres import drop_tables
+        from setup_postgre_tables import setup_tables
+        drop_tables()
+        setup_tables()
+
+    plan = ScalePlan(
+        students=int(args.students),
+        courses=int(args.courses),
+        weeks=args.weeks,
+        group_size=args.group_size,
+        courses_per_group=args.courses_per_group,
+        seed=args.seed,
+        start_date=args.start_date
+    )
+    print(f"Групп: {plan.groups}, студентов: {plan.students}, курсов: {plan.courses}, "
+          f"строк расписания: {plan.schedule_rows}, "
+          f"строк посещаемости: ~{plan.schedule_rows * plan.group_size}")
+
+    started = time.perf_counter()
+    timings = generate(plan, workers=args.workers)
+    print_timing_summary(timings)
+    print(f"Общее время: {time.perf_counter() - started:.2f} c")
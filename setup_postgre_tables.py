@@ -1,8 +1,433 @@
+import argparse
+from datetime import date, timedelta
+
 import psycopg2
 from env import DB_HOST, DB_NAME, DB_PASSWORD, DB_PORT, DB_USER
 
+# Таблицы, изменения которых журналируются для инкрементальной синхронизации,
+# и их ключи. Для Attendance ключ — schedule_id: приемникам (счетчики часов
+# lab3) нужно знать, какие записи расписания затронуты, а не сами отметки
+SYNC_TRACKED_TABLES = {
+    'Courses': ('course_id',),
+    'Student_Groups': ('group_id',),
+    'Group_Courses': ('group_id', 'course_id'),
+    'Students': ('student_id',),
+    'Session_Types': ('session_type_id',),
+    'Lecture_Sessions': ('session_id',),
+    'Lecture_Materials': ('material_id',),
+    'Schedule': ('schedule_id',),
+    'Attendance': ('schedule_id',),
+}
+
+
+# Индексы путей отчета: отбор расписания по лекциям и датам (get_schedule,
+# CTE lecture_schedule) и соединение Attendance с расписанием. INCLUDE
+# делает их покрывающими, поэтому агрегат читается index-only scan.
+REPORT_INDEXES = {
+    'idx_schedule_session_date': """
+        CREATE INDEX IF NOT EXISTS idx_schedule_session_date
+        ON Schedule (session_id, scheduled_date) INCLUDE (schedule_id, group_id)
+    """,
+    'idx_attendance_schedule': """
+        CREATE INDEX IF NOT EXISTS idx_attendance_schedule
+        ON Attendance (schedule_id) INCLUDE (student_id, attended)
+    """,
+    'idx_attendance_student': """
+        CREATE INDEX IF NOT EXISTS idx_attendance_student
+        ON Attendance (student_id)
+    """,
+}
+
+
+def setup_report_indexes(cur):
+    for ddl in REPORT_INDEXES.values():
+        cur.execute(ddl)
+
+
+def drop_report_indexes(cur):
+    for name in REPORT_INDEXES:
+        cur.execute(f"DROP INDEX IF EXISTS {name}")
+
+
+def _month_starts(first, last):
+    month = first.replace(day=1)
+    while month <= last:
+        yield month
+        month = (month.replace(day=28) + timedelta(days=4)).replace(day=1)
+
+
+def create_partitioned_schedule(cur, first_month, last_month):
+    """Schedule, секционированная по месяцам scheduled_date.
+
+    Первичный ключ секционированной таблицы обязан включать ключ
+    секционирования, поэтому он становится (schedule_id, scheduled_date),
+    а внешний ключ Attendance.schedule_id на такую таблицу невозможен —
+    при секционировании он не создается. Attendance секционировать по дате
+    нельзя: даты в ней нет, она берется из Schedule.
+    """
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS Schedule (
+            schedule_id SERIAL,
+            group_id INTEGER REFERENCES Student_Groups(group_id),
+            session_id INTEGER REFERENCES Lecture_Sessions(session_id),
+            room VARCHAR(50),
+            scheduled_date DATE NOT NULL,
+            start_time TIME,
+            PRIMARY KEY (schedule_id, scheduled_date)
+        ) PARTITION BY RANGE (scheduled_date)
+    """)
+    for month in _month_starts(first_month, last_month):
+        next_month = (month.replace(day=28) + timedelta(days=4)).replace(day=1)
+        cur.execute(f"""
+            CREATE TABLE IF NOT EXISTS schedule_{month:%Y_%m}
+            PARTITION OF Schedule
+            FOR VALUES FROM ('{month}') TO ('{next_month}')
+        """)
+    cur.execute("CREATE TABLE IF NOT EXISTS schedule_default PARTITION OF Schedule DEFAULT")
+
+
+def setup_sync_changelog(cur):
+    """Журнал изменений и водяные знаки для инкрементальной синхронизации.
+
+    Statement-level триггеры с transition tables пишут в Sync_Changelog
+    первичные ключи измененных строк одной вставкой на оператор, поэтому
+    массовая загрузка через COPY не замедляется построчными триггерами.
+    Водяной знак — пара (txid, change_id): записи транзакций старше xmin
+    текущего снимка уже не могут появиться задним числом.
+    """
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS Sync_Changelog (
+            change_id BIGSERIAL PRIMARY KEY,
+            table_name VARCHAR(63) NOT NULL,
+            op CHAR(1) NOT NULL,
+            row_key JSONB NOT NULL,
+            txid BIGINT NOT NULL DEFAULT txid_current(),
+            changed_at TIMESTAMPTZ NOT NULL DEFAULT now()
+        )
+    """)
+    cur.execute("""
+        CREATE INDEX IF NOT EXISTS idx_sync_changelog_table_txid
+        ON Sync_Changelog (table_name, txid, change_id)
+    """)
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS Sync_Watermarks (
+            sink VARCHAR(50) NOT NULL,
+            table_name VARCHAR(63) NOT NULL,
+            last_txid BIGINT NOT NULL,
+            last_change_id BIGINT NOT NULL,
+            updated_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+            PRIMARY KEY (sink, table_name)
+        )
+    """)
+    cur.execute("""
+        CREATE OR REPLACE FUNCTION sync_log_changes() RETURNS trigger
+        LANGUAGE plpgsql AS $$
+        DECLARE
+            key_expr TEXT;
+        BEGIN
+            SELECT string_agg(format('%L, r.%I', col, col), ', ')
+            INTO key_expr
+            FROM unnest(TG_ARGV) AS col;
+
+            IF TG_OP = 'DELETE' THEN
+                EXECUTE format(
+                    'INSERT INTO Sync_Changelog (table_name, op, row_key) '
+                    'SELECT DISTINCT %L, %L, jsonb_build_object(%s) FROM old_rows r',
+                    lower(TG_TABLE_NAME), 'D', key_expr);
+            ELSE
+                EXECUTE format(
+                    'INSERT INTO Sync_Changelog (table_name, op, row_key) '
+                    'SELECT DISTINCT %L, %L, jsonb_build_object(%s) FROM new_rows r',
+                    lower(TG_TABLE_NAME), left(TG_OP, 1), key_expr);
+            END IF;
+            RETURN NULL;
+        END
+        $$
+    """)
+
+    for table, key_columns in SYNC_TRACKED_TABLES.items():
+        args = ", ".join(f"'{column}'" for column in key_columns)
+        for event, transition in (('INSERT', 'NEW TABLE AS new_rows'),
+                                  ('UPDATE', 'NEW TABLE AS new_rows'),
+                                  ('DELETE', 'OLD TABLE AS old_rows')):
+            trigger = f"{table.lower()}_sync_{event.lower()}"
+            cur.execute(f"DROP TRIGGER IF EXISTS {trigger} ON {table}")
+            cur.execute(f"""
+                CREATE TRIGGER {trigger}
+                AFTER {event} ON {table}
+                REFERENCING {transition}
+                FOR EACH STATEMENT
+                EXECUTE FUNCTION sync_log_changes({args})
+            """)
+
+
+ATTENDANCE_ROLLUP_KEY = "student_id, group_id, session_id, scheduled_date"
 
-def setup_tables():
+
+def setup_attendance_rollup(cur):
+    """Предагрегированная посещаемость по (студент, группа, занятие, дата).
+
+    Statement-level триггеры на Attendance добавляют к строкам rollup
+    разницу, посчитанную по transition tables: новые строки со знаком +1,
+    старые — со знаком -1. Триггер на Schedule переносит счетчики, если у
+    записи расписания изменились группа, занятие или дата, а при удалении
+    записи вычитает ее посещаемость: в режиме --partition-schedule у
+    Attendance.schedule_id нет внешнего ключа, и строки Attendance могут
+    пережить свою запись расписания. Строки с пустыми ключами (NULL в
+    Schedule или Attendance) в rollup не попадают.
+    """
+    cur.execute(f"""
+        CREATE TABLE IF NOT EXISTS Attendance_Rollup (
+            student_id INTEGER NOT NULL,
+            group_id INTEGER NOT NULL,
+            session_id INTEGER NOT NULL,
+            scheduled_date DATE NOT NULL,
+            total_count INTEGER NOT NULL,
+            attended_count INTEGER NOT NULL,
+            PRIMARY KEY ({ATTENDANCE_ROLLUP_KEY})
+        )
+    """)
+    cur.execute("""
+        CREATE INDEX IF NOT EXISTS idx_attendance_rollup_session_date
+        ON Attendance_Rollup (session_id, scheduled_date)
+    """)
+    # Частичный индекс делает удаление обнулившихся строк дешевым
+    cur.execute("""
+        CREATE INDEX IF NOT EXISTS idx_attendance_rollup_empty
+        ON Attendance_Rollup (student_id) WHERE total_count = 0
+    """)
+
+    apply_delta = f"""
+        INSERT INTO Attendance_Rollup AS r ({ATTENDANCE_ROLLUP_KEY}, total_count, attended_count)
+        SELECT {ATTENDANCE_ROLLUP_KEY}, SUM(total_count), SUM(attended_count)
+        FROM delta
+        WHERE student_id IS NOT NULL AND group_id IS NOT NULL
+          AND session_id IS NOT NULL AND scheduled_date IS NOT NULL
+        GROUP BY {ATTENDANCE_ROLLUP_KEY}
+        HAVING SUM(total_count) <> 0 OR SUM(attended_count) <> 0
+        ON CONFLICT ({ATTENDANCE_ROLLUP_KEY}) DO UPDATE
+        SET total_count = r.total_count + EXCLUDED.total_count,
+            attended_count = r.attended_count + EXCLUDED.attended_count
+    """
+    cur.execute(f"""
+        CREATE OR REPLACE FUNCTION attendance_rollup_apply() RETURNS trigger
+        LANGUAGE plpgsql AS $$
+        DECLARE
+            changes TEXT;
+        BEGIN
+            IF TG_OP = 'INSERT' THEN
+                changes := 'SELECT student_id, schedule_id, attended, 1 AS sign FROM new_rows';
+            ELSIF TG_OP = 'DELETE' THEN
+                changes := 'SELECT student_id, schedule_id, attended, -1 AS sign FROM old_rows';
+            ELSE
+                changes := 'SELECT student_id, schedule_id, attended, 1 AS sign FROM new_rows '
+                           'UNION ALL '
+                           'SELECT student_id, schedule_id, attended, -1 FROM old_rows';
+            END IF;
+
+            EXECUTE format($sql$
+                WITH delta AS (
+                    SELECT c.student_id, sch.group_id, sch.session_id, sch.scheduled_date,
+                           c.sign AS total_count,
+                           CASE WHEN c.attended THEN c.sign ELSE 0 END AS attended_count
+                    FROM (%s) c
+                    JOIN Schedule sch ON sch.schedule_id = c.schedule_id
+                )
+                {apply_delta}
+            $sql$, changes);
+
+            DELETE FROM Attendance_Rollup WHERE total_count = 0;
+            RETURN NULL;
+        END
+        $$
+    """)
+    cur.execute(f"""
+        CREATE OR REPLACE FUNCTION attendance_rollup_move_schedule() RETURNS trigger
+        LANGUAGE plpgsql AS $$
+        BEGIN
+            WITH moved AS (
+                SELECT o.schedule_id,
+                       o.group_id AS old_group_id, o.session_id AS old_session_id,
+                       o.scheduled_date AS old_date,
+                       n.group_id AS new_group_id, n.session_id AS new_session_id,
+                       n.scheduled_date AS new_date
+                FROM old_rows o
+                JOIN new_rows n ON n.schedule_id = o.schedule_id
+                WHERE (o.group_id, o.session_id, o.scheduled_date)
+                      IS DISTINCT FROM (n.group_id, n.session_id, n.scheduled_date)
+            ),
+            delta AS (
+                SELECT a.student_id, m.old_group_id AS group_id,
+                       m.old_session_id AS session_id, m.old_date AS scheduled_date,
+                       -1 AS total_count, CASE WHEN a.attended THEN -1 ELSE 0 END AS attended_count
+                FROM moved m JOIN Attendance a ON a.schedule_id = m.schedule_id
+                UNION ALL
+                SELECT a.student_id, m.new_group_id, m.new_session_id, m.new_date,
+                       1, CASE WHEN a.attended THEN 1 ELSE 0 END
+                FROM moved m JOIN Attendance a ON a.schedule_id = m.schedule_id
+            )
+            {apply_delta};
+
+            DELETE FROM Attendance_Rollup WHERE total_count = 0;
+            RETURN NULL;
+        END
+        $$
+    """)
+    cur.execute(f"""
+        CREATE OR REPLACE FUNCTION attendance_rollup_drop_schedule() RETURNS trigger
+        LANGUAGE plpgsql AS $$
+        BEGIN
+            WITH delta AS (
+                SELECT a.student_id, o.group_id, o.session_id, o.scheduled_date,
+                       -1 AS total_count, CASE WHEN a.attended THEN -1 ELSE 0 END AS attended_count
+                FROM old_rows o JOIN Attendance a ON a.schedule_id = o.schedule_id
+            )
+            {apply_delta};
+
+            DELETE FROM Attendance_Rollup WHERE total_count = 0;
+            RETURN NULL;
+        END
+        $$
+    """)
+    cur.execute("""
+        CREATE OR REPLACE FUNCTION attendance_rollup_truncate() RETURNS trigger
+        LANGUAGE plpgsql AS $$
+        BEGIN
+            TRUNCATE Attendance_Rollup;
+            RETURN NULL;
+        END
+        $$
+    """)
+
+    for event, transition in (('INSERT', 'NEW TABLE AS new_rows'),
+                              ('UPDATE', 'OLD TABLE AS old_rows NEW TABLE AS new_rows'),
+                              ('DELETE', 'OLD TABLE AS old_rows')):
+        trigger = f"attendance_rollup_{event.lower()}"
+        cur.execute(f"DROP TRIGGER IF EXISTS {trigger} ON Attendance")
+        cur.execute(f"""
+            CREATE TRIGGER {trigger}
+            AFTER {event} ON Attendance
+            REFERENCING {transition}
+            FOR EACH STATEMENT
+            EXECUTE FUNCTION attendance_rollup_apply()
+        """)
+    cur.execute("DROP TRIGGER IF EXISTS attendance_rollup_truncate ON Attendance")
+    cur.execute("""
+        CREATE TRIGGER attendance_rollup_truncate
+        AFTER TRUNCATE ON Attendance
+        FOR EACH STATEMENT
+        EXECUTE FUNCTION attendance_rollup_truncate()
+    """)
+    cur.execute("DROP TRIGGER IF EXISTS schedule_rollup_update ON Schedule")
+    cur.execute("""
+        CREATE TRIGGER schedule_rollup_update
+        AFTER UPDATE ON Schedule
+        REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+        FOR EACH STATEMENT
+        EXECUTE FUNCTION attendance_rollup_move_schedule()
+    """)
+    cur.execute("DROP TRIGGER IF EXISTS schedule_rollup_delete ON Schedule")
+    cur.execute("""
+        CREATE TRIGGER schedule_rollup_delete
+        AFTER DELETE ON Schedule
+        REFERENCING OLD TABLE AS old_rows
+        FOR EACH STATEMENT
+        EXECUTE FUNCTION attendance_rollup_drop_schedule()
+    """)
+
+    rebuild_attendance_rollup(cur)
+
+
+def rebuild_attendance_rollup(cur, student_ids=None):
+    """Пересчет rollup из сырых данных: целиком или для указанных студентов"""
+    if student_ids is None:
+        cur.execute("TRUNCATE Attendance_Rollup")
+        student_filter, params = "", None
+    else:
+        cur.execute("DELETE FROM Attendance_Rollup WHERE student_id = ANY(%s)",
+                    (list(student_ids),))
+        student_filter, params = "AND a.student_id = ANY(%s)", (list(student_ids),)
+    cur.execute(f"""
+        INSERT INTO Attendance_Rollup ({ATTENDANCE_ROLLUP_KEY}, total_count, attended_count)
+        SELECT a.student_id, sch.group_id, sch.session_id, sch.scheduled_date,
+               COUNT(*), COUNT(*) FILTER (WHERE a.attended)
+        FROM Attendance a
+        JOIN Schedule sch ON sch.schedule_id = a.schedule_id
+        WHERE a.student_id IS NOT NULL AND sch.group_id IS NOT NULL
+          AND sch.session_id IS NOT NULL AND sch.scheduled_date IS NOT NULL
+          {student_filter}
+        GROUP BY a.student_id, sch.group_id, sch.session_id, sch.scheduled_date
+    """, params)
+
+
+def setup_room_demand_view(cur):
+    """Материализованное представление для отчета lab2 (объем аудитории).
+
+    В схеме нет семестра и технических требований, поэтому они выводятся:
+    семестр и учебный год — из дат Schedule (сентябрь–январь — первый
+    семестр учебного года, начавшегося в сентябре; февраль–август —
+    второй), требования — из типов Lecture_Materials лекции. Год обучения —
+    Student_Groups.course_year. Слушатели лекции — студенты групп, которые
+    изучают курс (Group_Courses) и у которых лекция стоит в расписании.
+
+    Уникальный индекс нужен для REFRESH MATERIALIZED VIEW CONCURRENTLY.
+    """
+    cur.execute("""
+        CREATE MATERIALIZED VIEW IF NOT EXISTS Lecture_Room_Demand AS
+        WITH lecture_groups AS (
+            SELECT DISTINCT
+                ls.session_id, ls.course_id, sch.group_id,
+                CASE WHEN EXTRACT(MONTH FROM sch.scheduled_date) >= 9
+                       OR EXTRACT(MONTH FROM sch.scheduled_date) = 1
+                     THEN 1 ELSE 2 END AS semester,
+                (EXTRACT(YEAR FROM sch.scheduled_date)
+                 - CASE WHEN EXTRACT(MONTH FROM sch.scheduled_date) >= 9
+                        THEN 0 ELSE 1 END)::INTEGER AS academic_year
+            FROM Lecture_Sessions ls
+            JOIN Session_Types st ON st.session_type_id = ls.session_type_id
+            JOIN Schedule sch ON sch.session_id = ls.session_id
+            JOIN Group_Courses gc ON gc.group_id = sch.group_id
+                                 AND gc.course_id = ls.course_id
+            WHERE st.name = 'Лекция' AND sch.scheduled_date IS NOT NULL
+        ),
+        group_sizes AS (
+            SELECT group_id, COUNT(*) AS students
+            FROM Students
+            GROUP BY group_id
+        ),
+        materials AS (
+            SELECT session_id, array_agg(DISTINCT type ORDER BY type) AS material_types
+            FROM Lecture_Materials
+            WHERE type IS NOT NULL
+            GROUP BY session_id
+        )
+        SELECT
+            sg.course_year, lg.semester, lg.academic_year,
+            c.course_id, c.name AS course_name, c.description AS course_description,
+            c.duration_weeks, c.department_id,
+            ls.session_id, ls.topic, ls.duration_minutes,
+            ls.description AS session_description,
+            COUNT(*) AS group_count,
+            COALESCE(SUM(gs.students), 0)::INTEGER AS listeners,
+            COALESCE(m.material_types, '{}') AS material_types
+        FROM lecture_groups lg
+        JOIN Courses c ON c.course_id = lg.course_id
+        JOIN Lecture_Sessions ls ON ls.session_id = lg.session_id
+        JOIN Student_Groups sg ON sg.group_id = lg.group_id
+        LEFT JOIN group_sizes gs ON gs.group_id = lg.group_id
+        LEFT JOIN materials m ON m.session_id = lg.session_id
+        GROUP BY sg.course_year, lg.semester, lg.academic_year,
+                 c.course_id, ls.session_id, m.material_types
+        WITH DATA
+    """)
+    cur.execute("""
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_room_demand_key
+        ON Lecture_Room_Demand (course_year, semester, academic_year, session_id)
+    """)
+
+
+def setup_tables(partition_schedule=False, partition_from=date(2023, 1, 1),
+                 partition_to=date(2025, 12, 1)):
     conn = psycopg2.connect(
         dbname=DB_NAME,
         user=DB_USER,
@@ -104,16 +529,19 @@ def setup_tables():
         """)
 
         # Таблица Schedule
-        cur.execute("""
-            CREATE TABLE IF NOT EXISTS Schedule (
-                schedule_id SERIAL PRIMARY KEY,
-                group_id INTEGER REFERENCES Student_Groups(group_id),
-                session_id INTEGER REFERENCES Lecture_Sessions(session_id),
-                room VARCHAR(50),
-                scheduled_date DATE,
-                start_time TIME
-            )
-        """)
+        if partition_schedule:
+            create_partitioned_schedule(cur, partition_from, partition_to)
+        else:
+            cur.execute("""
+                CREATE TABLE IF NOT EXISTS Schedule (
+                    schedule_id SERIAL PRIMARY KEY,
+                    group_id INTEGER REFERENCES Student_Groups(group_id),
+                    session_id INTEGER REFERENCES Lecture_Sessions(session_id),
+                    room VARCHAR(50),
+                    scheduled_date DATE,
+                    start_time TIME
+                )
+            """)
 
         # Таблица Students
         cur.execute("""
@@ -129,15 +557,19 @@ def setup_tables():
         """)
 
         # Таблица Attendance
-        cur.execute("""
+        schedule_ref = "" if partition_schedule else " REFERENCES Schedule(schedule_id)"
+        cur.execute(f"""
             CREATE TABLE IF NOT EXISTS Attendance (
                 attendance_id SERIAL PRIMARY KEY,
-                schedule_id INTEGER REFERENCES Schedule(schedule_id),
+                schedule_id INTEGER{schedule_ref},
                 student_id INTEGER REFERENCES Students(student_id),
                 attended BOOLEAN NOT NULL,
                 absence_reason TEXT
             )
         """)
+        # CDC ключует Attendance по schedule_id, который не входит в первичный
+        # ключ: без FULL событие удаления содержит только attendance_id
+        cur.execute("ALTER TABLE Attendance REPLICA IDENTITY FULL")
 
         # Таблица Lecture_Materials
         cur.execute("""
@@ -150,6 +582,11 @@ def setup_tables():
             )
         """)
 
+        setup_report_indexes(cur)
+        setup_sync_changelog(cur)
+        setup_attendance_rollup(cur)
+        setup_room_demand_view(cur)
+
         conn.commit()
         print("Таблицы успешно созданы!")
 
@@ -161,5 +598,21 @@ def setup_tables():
         conn.close()
 
 
+def _month(value):
+    return date.fromisoformat(f"{value}-01")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Создание схемы PostgreSQL")
+    parser.add_argument('--partition-schedule', action='store_true',
+                        help="секционировать Schedule по месяцам scheduled_date")
+    parser.add_argument('--partition-from', type=_month, default=date(2023, 1, 1),
+                        help="первый месяц секций, YYYY-MM")
+    parser.add_argument('--partition-to', type=_month, default=date(2025, 12, 1),
+                        help="последний месяц секций, YYYY-MM")
+    return parser.parse_args()
+
+
 if __name__ == "__main__":
-    setup_tables()
+    args = parse_args()
+    setup_tables(args.partition_schedule, args.partition_from, args.partition_to)
@@ -0,0 +1,323 @@
+import argparse
+import json
+import logging
+import select
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Iterable, List, Optional
+
+import psycopg2
+from psycopg2.extras import LogicalReplicationConnection
+
+from sync.changes import TABLE_KEYS, ChangeBatch
+from sync.incremental_sync import IncrementalSync, SinkSync
+from sync.neo4j.create_neo4j import PG_CONFIG
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+KAFKA_BOOTSTRAP_SERVERS = 'localhost:9092'
+TOPIC_PREFIX = 'postgres_server.public'
+REPLICATION_SLOT = 'cdc_consumer'
+
+
+class ChangeEvent:
+    """Изменение одной строки: таблица, операция (I/U/D), ключ и время в источнике"""
+
+    __slots__ = ('table', 'op', 'key', 'source_ts')
+
+    def __init__(self, table: str, op: str, key, source_ts: Optional[float]):
+        self.table = table
+        self.op = op
+        self.key = key
+        self.source_ts = source_ts
+
+
+def _row_key(table: str, row: Optional[Dict]):
+    """Ключ из TABLE_KEYS или None, если в событии нет нужных колонок.
+
+    Для удалений из Attendance ключ (schedule_id) не входит в первичный
+    ключ, поэтому таблице нужна REPLICA IDENTITY FULL (ее выставляет
+    setup_postgre_tables.py). Пропущенное событие пишется в лог.
+    """
+    columns = TABLE_KEYS[table]
+    if not row or any(column not in row for column in columns):
+        logger.warning(
+            f"Событие {table} пропущено: нет колонок ключа {', '.join(columns)} "
+            f"(проверьте REPLICA IDENTITY таблицы)")
+        return None
+    if len(columns) == 1:
+        return row[columns[0]]
+    return tuple(row[column] for column in columns)
+
+
+def parse_debezium(value: Optional[bytes]) -> Optional[ChangeEvent]:
+    """Событие Debezium (с конвертером JSON, со схемой или без) -> ChangeEvent"""
+    if value is None:
+        # tombstone после удаления, ключ уже пришел в событии 'd'
+        return None
+    message = json.loads(value.decode('utf-8'))
+    payload = message.get('payload', message)
+    table = payload['source']['table']
+    if table not in TABLE_KEYS:
+        return None
+    op = {'c': 'I', 'r': 'I', 'u': 'U', 'd': 'D'}.get(payload['op'])
+    if op is None:
+        return None
+    row = payload['before'] if op == 'D' else payload['after']
+    key = _row_key(table, row)
+    if key is None:
+        return None
+    source_ts = payload['source'].get('ts_ms')
+    return ChangeEvent(table, op, key, source_ts / 1000 if source_ts else None)
+
+
+def parse_wal2json(payload: str, source_ts: Optional[float]) -> Optional[ChangeEvent]:
+    """Сообщение wal2json format-version 2 -> ChangeEvent"""
+    message = json.loads(payload)
+    action = message.get('action')
+    if action not in ('I', 'U', 'D'):
+        # B/C/M — границы транзакций и логические сообщения
+        return None
+    table = message['table']
+    if message.get('schema') != 'public' or table not in TABLE_KEYS:
+        return None
+    fields = message.get('identity' if action == 'D' else 'columns', [])
+    row = {field['name']: field['value'] for field in fields}
+    key = _row_key(table, row)
+    if key is None:
+        return None
+    return ChangeEvent(table, action, key, source_ts)
+
+
+class SinkMetrics:
+    def __init__(self):
+        self.events = 0
+        self.batches = 0
+        self.errors = 0
+        self.lag_seconds = 0.0
+        self.last_applied_at: Optional[float] = None
+
+    def as_dict(self) -> Dict:
+        return {
+            'events': self.events,
+            'batches': self.batches,
+            'errors': self.errors,
+            'lag_seconds': round(self.lag_seconds, 3),
+            'last_applied_at': self.last_applied_at,
+        }
+
+
+class CdcApplier:
+    """Применение микро-пакетов событий к приемникам с теми же отображениями,
+    что и у пакетной синхронизации (IncrementalSync)"""
+
+    def __init__(self, sync: IncrementalSync, retry_delay: float = 5.0):
+        self.sync = sync
+        self.retry_delay = retry_delay
+        self.metrics: Dict[str, SinkMetrics] = {
+            sink.name: SinkMetrics() for sink in sync.sinks}
+        self._lock = threading.Lock()
+
+    @property
+    def tables(self) -> List[str]:
+        return sorted({table for sink in self.sync.sinks for table in sink.tables})
+
+    def _apply_sink(self, sink: SinkSync, events: List[ChangeEvent]):
+        by_table: Dict[str, Dict] = {}
+        for event in events:
+            if event.table in sink.tables:
+                by_table.setdefault(event.table, {})[event.key] = event.op
+        # Таблицы применяются в порядке приемника (сначала узлы, потом связи)
+        for table in sink.tables:
+            latest = by_table.get(table)
+            if not latest:
+                continue
+            sink.apply(ChangeBatch(
+                table, None,
+                [key for key, op in latest.items() if op != 'D'],
+                [key for key, op in latest.items() if op == 'D']))
+
+    def apply(self, events: List[ChangeEvent]) -> None:
+        """Блокирует до успешного применения ко всем приемникам.
+
+        Смещения источника фиксируются только после возврата, поэтому при
+        сбое пакет будет прочитан повторно (at-least-once).
+        """
+        if not events:
+            return
+        for sink in self.sync.sinks:
+            relevant = [e for e in events if e.table in sink.tables]
+            if not relevant:
+                continue
+            while True:
+                try:
+                    self._apply_sink(sink, relevant)
+                    break
+                except Exception as e:
+                    self.sync.pg_conn.rollback()
+                    with self._lock:
+                        self.metrics[sink.name].errors += 1
+                    logger.error(f"{sink.name}: ошибка применения, повтор через "
+                                 f"{self.retry_delay} c: {e}", exc_info=True)
+                    time.sleep(self.retry_delay)
+
+            now = time.time()
+            timestamps = [e.source_ts for e in relevant if e.source_ts]
+            with self._lock:
+                metrics = self.metrics[sink.name]
+                metrics.events += len(relevant)
+                metrics.batches += 1
+                metrics.last_applied_at = now
+                if timestamps:
+                    metrics.lag_seconds = now - min(timestamps)
+
+    def stats(self) -> Dict[str, Dict]:
+        with self._lock:
+            return {name: m.as_dict() for name, m in self.metrics.items()}
+
+
+def _micro_batches(poll, max_batch: int, max_wait: float) -> Iterable:
+    """Собирает результаты poll() в пакеты по размеру или времени"""
+    while True:
+        events, deadline = [], time.monotonic() + max_wait
+        while len(events) < max_batch and time.monotonic() < deadline:
+            events.extend(poll(deadline - time.monotonic()))
+        yield events
+
+
+def consume_kafka(applier: CdcApplier, bootstrap_servers: str, topic_prefix: str,
+                  group_id: str, max_batch: int, max_wait: float) -> None:
+    from kafka import KafkaConsumer
+
+    topics = [f"{topic_prefix}.{table}" for table in applier.tables]
+    consumer = KafkaConsumer(
+        *topics,
+        bootstrap_servers=bootstrap_servers,
+        group_id=group_id,
+        enable_auto_commit=False,
+        auto_offset_reset='earliest',
+        max_poll_records=max_batch
+    )
+    logger.info(f"Читаем топики {', '.join(topics)}")
+
+    def poll(timeout):
+        records = consumer.poll(timeout_ms=max(1, int(timeout * 1000)))
+        events = []
+        for batch in records.values():
+            for record in batch:
+                event = parse_debezium(record.value)
+                if event is not None:
+                    events.append(event)
+        return events
+
+    try:
+        for events in _micro_batches(poll, max_batch, max_wait):
+            applier.apply(events)
+            consumer.commit()
+    finally:
+        consumer.close()
+
+
+def consume_replication_slot(applier: CdcApplier, slot_name: str,
+                             max_batch: int, max_wait: float) -> None:
+    """Чтение слота логической репликации (wal2json) без Kafka"""
+    conn = psycopg2.connect(connection_factory=LogicalReplicationConnection, **PG_CONFIG)
+    cur = conn.cursor()
+    try:
+        cur.create_replication_slot(slot_name, output_plugin='wal2json')
+        logger.info(f"Создан слот репликации {slot_name}")
+    except psycopg2.errors.DuplicateObject:
+        pass
+    cur.start_replication(
+        slot_name=slot_name,
+        decode=True,
+        options={
+            # format-version 2 сам добавляет identity в события U/D
+            'format-version': '2',
+            'add-tables': ','.join(f"public.{table}" for table in applier.tables),
+        })
+    last_lsn = [None]
+
+    def poll(timeout):
+        events = []
+        message = cur.read_message()
+        if message is None:
+            select.select([cur], [], [], max(0.0, timeout))
+            return events
+        while message is not None:
+            event = parse_wal2json(message.payload, message.send_time.timestamp())
+            if event is not None:
+                events.append(event)
+            last_lsn[0] = message.data_start
+            if len(events) >= max_batch:
+                break
+            message = cur.read_message()
+        return events
+
+    try:
+        for events in _micro_batches(poll, max_batch, max_wait):
+            applier.apply(events)
+            if last_lsn[0] is not None:
+                # Сервер может освободить WAL только после применения пакета
+                cur.send_feedback(flush_lsn=last_lsn[0])
+            else:
+                cur.send_feedback()
+    finally:
+        conn.close()
+
+
+def serve_metrics(applier: CdcApplier, port: int) -> ThreadingHTTPServer:
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            body = json.dumps(applier.stats()).encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(('0.0.0.0', port), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Stream Postgres changes (Debezium/Kafka or a replication slot) into "
+                    "Mongo, Redis, Neo4j and Elasticsearch")
+    parser.add_argument('--source', choices=['kafka', 'slot'], default='kafka')
+    parser.add_argument('--sinks', nargs='*', default=['mongo', 'redis', 'neo4j', 'elastic'],
+                        choices=['mongo', 'redis', 'neo4j', 'elastic'])
+    parser.add_argument('--bootstrap-servers', default=KAFKA_BOOTSTRAP_SERVERS)
+    parser.add_argument('--topic-prefix', default=TOPIC_PREFIX)
+    parser.add_argument('--group-id', default='cdc-consumer')
+    parser.add_argument('--slot', default=REPLICATION_SLOT)
+    parser.add_argument('--max-batch', type=int, default=500)
+    parser.add_argument('--max-wait', type=float, default=1.0,
+                        help="seconds to wait for a micro-batch to fill")
+    parser.add_argument('--metrics-port', type=int, default=8090)
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    sync = IncrementalSync(args.sinks)
+    applier = CdcApplier(sync)
+    server = serve_metrics(applier, args.metrics_port)
+    try:
+        if args.source == 'kafka':
+            consume_kafka(applier, args.bootstrap_servers, args.topic_prefix,
+                          args.group_id, args.max_batch, args.max_wait)
+        else:
+            consume_replication_slot(applier, args.slot, args.max_batch, args.max_wait)
+    finally:
+        server.shutdown()
+        sync.close()
@@ -0,0 +1,124 @@
+from typing import Dict, List, Optional, Tuple
+
+# Ключи журналируемых таблиц (см. setup_postgre_tables.SYNC_TRACKED_TABLES)
+TABLE_KEYS = {
+    'courses': ('course_id',),
+    'student_groups': ('group_id',),
+    'group_courses': ('group_id', 'course_id'),
+    'students': ('student_id',),
+    'session_types': ('session_type_id',),
+    'lecture_sessions': ('session_id',),
+    'lecture_materials': ('material_id',),
+    'schedule': ('schedule_id',),
+    'attendance': ('schedule_id',),
+}
+
+# Позиция в журнале: (txid, change_id)
+Position = Tuple[int, int]
+
+
+class ChangeBatch:
+    """Свернутые изменения таблицы: последняя операция по каждому ключу"""
+
+    def __init__(self, table: str, position: Position, upserts: List, deletes: List):
+        self.table = table
+        self.position = position
+        self.upserts = upserts
+        self.deletes = deletes
+
+    def __len__(self):
+        return len(self.upserts) + len(self.deletes)
+
+
+class ChangeFeed:
+    """Чтение Sync_Changelog и хранение водяных знаков для одного приемника.
+
+    Журнал читается в порядке (txid, change_id) и только для транзакций
+    старше xmin текущего снимка: все они уже завершены, поэтому за
+    водяным знаком не могут появиться новые записи. Порядка change_id
+    для этого недостаточно — транзакция с меньшим change_id может
+    зафиксироваться позже.
+
+    Ключ строки — значение ключа из TABLE_KEYS для таблиц с одной колонкой
+    и кортеж значений для составных ключей.
+    """
+
+    def __init__(self, pg_conn, sink: str):
+        self.pg_conn = pg_conn
+        self.sink = sink
+
+    def head(self) -> Position:
+        """Позиция, до которой журнал уже не изменится"""
+        with self.pg_conn.cursor() as cur:
+            cur.execute("SELECT txid_snapshot_xmin(txid_current_snapshot())")
+            xmin = cur.fetchone()[0]
+        self.pg_conn.commit()
+        return (xmin, 0)
+
+    def watermark(self, table: str) -> Optional[Position]:
+        with self.pg_conn.cursor() as cur:
+            cur.execute("""
+                SELECT last_txid, last_change_id FROM Sync_Watermarks
+                WHERE sink = %s AND table_name = %s
+            """, (self.sink, table))
+            row = cur.fetchone()
+        self.pg_conn.commit()
+        return tuple(row) if row else None
+
+    def changes(self, table: str, since: Position, limit: int = 10000) -> ChangeBatch:
+        with self.pg_conn.cursor() as cur:
+            cur.execute("""
+                SELECT txid, change_id, op, row_key FROM Sync_Changelog
+                WHERE table_name = %s
+                  AND (txid, change_id) > (%s, %s)
+                  AND txid < txid_snapshot_xmin(txid_current_snapshot())
+                ORDER BY txid, change_id
+                LIMIT %s
+            """, (table, since[0], since[1], limit))
+            rows = cur.fetchall()
+        self.pg_conn.commit()
+
+        key_columns = TABLE_KEYS[table]
+        latest: Dict[object, str] = {}
+        position = since
+        for txid, change_id, op, row_key in rows:
+            if len(key_columns) == 1:
+                key = row_key[key_columns[0]]
+            else:
+                key = tuple(row_key[column] for column in key_columns)
+            latest[key] = op
+            position = (txid, change_id)
+
+        upserts = [key for key, op in latest.items() if op != 'D']
+        deletes = [key for key, op in latest.items() if op == 'D']
+        return ChangeBatch(table, position, upserts, deletes)
+
+    def commit(self, table: str, position: Position) -> None:
+        """Сохраняет водяной знак после успешной записи в приемник"""
+        with self.pg_conn.cursor() as cur:
+            cur.execute("""
+                INSERT INTO Sync_Watermarks (sink, table_name, last_txid, last_change_id)
+                VALUES (%s, %s, %s, %s)
+                ON CONFLICT (sink, table_name) DO UPDATE
+                SET last_txid = EXCLUDED.last_txid,
+                    last_change_id = EXCLUDED.last_change_id,
+                    updated_at = now()
+            """, (self.sink, table, position[0], position[1]))
+        self.pg_conn.commit()
+
+    def compact(self) -> int:
+        """Удаляет из журнала транзакции, уже прочитанные всеми приемниками таблицы"""
+        with self.pg_conn.cursor() as cur:
+            cur.execute("""
+                DELETE FROM Sync_Changelog c
+                USING (
+                    SELECT table_name, MIN(last_txid) AS last_txid
+                    FROM Sync_Watermarks
+                    GROUP BY table_name
+                ) w
+                WHERE c.table_name = w.table_name
+                  AND c.txid < w.last_txid
+            """)
+            deleted = cur.rowcount
+        self.pg_conn.commit()
+        return deleted
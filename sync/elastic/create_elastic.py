@@ -1,9 +1,21 @@
+import argparse
 import os
-from elasticsearch import Elasticsearch
+import sys
+import time
+from elasticsearch import Elasticsearch, helpers
 import psycopg2
-from typing import Dict, List
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence
 import json
 
+# Шаблон индекса лежит в lab1 (его копирует и контейнер lab1); корень
+# репозитория нужен в sys.path и при запуске python sync/elastic/create_elastic.py
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+from lab1.lecture_index import (INDEX_ALIAS, INDEX_TEMPLATE_NAME, INDEX_VERSION_PREFIX,  # noqa: E402
+                                index_template, session_document)
+
 DB_NAME = "postgres_db"
 DB_USER = "postgres_user"
 DB_PASSWORD = "postgres_password"
@@ -11,14 +23,172 @@ DB_HOST = "localhost"
 DB_PORT = "5430"
 
 
-def sync_lecture_sessions(
+def ensure_index_template(es: Elasticsearch) -> None:
+    """Шаблон из lab1/lecture_index.py (маппинг и анализаторы общие с поиском
+    lab1) применяется к каждой новой версии lecture_sessions_v{n}"""
+    es.indices.put_index_template(name=INDEX_TEMPLATE_NAME, **index_template())
+
+
+def _index_versions(es: Elasticsearch) -> List[int]:
+    """Номера существующих физических индексов lecture_sessions_v{n}"""
+    indices = es.indices.get(
+        index=f"{INDEX_VERSION_PREFIX}*", allow_no_indices=True, ignore_unavailable=True)
+    versions = []
+    for name in indices:
+        suffix = name[len(INDEX_VERSION_PREFIX):]
+        if suffix.isdigit():
+            versions.append(int(suffix))
+    return sorted(versions)
+
+
+def _aliased_indices(es: Elasticsearch) -> List[str]:
+    if not es.indices.exists_alias(name=INDEX_ALIAS):
+        return []
+    return list(es.indices.get_alias(name=INDEX_ALIAS).keys())
+
+
+def swap_alias(es: Elasticsearch, new_index: str) -> None:
+    """Атомарно переключает алиас lecture_sessions на new_index"""
+    actions = [{"remove": {"index": index, "alias": INDEX_ALIAS}}
+               for index in _aliased_indices(es) if index != new_index]
+    # Индекс, созданный до перехода на алиасы, занимает имя алиаса:
+    # удаляем его в том же атомарном запросе
+    if es.indices.exists(index=INDEX_ALIAS) and not es.indices.exists_alias(name=INDEX_ALIAS):
+        actions.append({"remove_index": {"index": INDEX_ALIAS}})
+    actions.append({"add": {"index": new_index, "alias": INDEX_ALIAS, "is_write_index": True}})
+    es.indices.update_aliases(actions=actions)
+
+
+def prune_index_versions(es: Elasticsearch, keep: int = 2) -> List[str]:
+    """Удаляет старые версии, оставляя keep последних (текущая и предыдущая для отката)"""
+    aliased = set(_aliased_indices(es))
+    stale = [f"{INDEX_VERSION_PREFIX}{v}" for v in _index_versions(es)[:-keep]]
+    stale = [index for index in stale if index not in aliased]
+    for index in stale:
+        es.indices.delete(index=index)
+    return stale
+
+
+def rollback_lecture_sessions(
     es_host: str = "localhost",
     es_port: int = 9200,
     es_user: str = "elastic",
     es_password: str = "secret"
-) -> None:
+) -> str:
+    """Переключает алиас на предыдущую сохраненную версию индекса"""
+    es = Elasticsearch(
+        hosts=[f"http://{es_host}:{es_port}"],
+        basic_auth=(es_user, es_password),
+        verify_certs=False
+    )
+    try:
+        current = _aliased_indices(es)
+        versions = [f"{INDEX_VERSION_PREFIX}{v}" for v in _index_versions(es)]
+        previous = [index for index in versions if index not in current]
+        if not current or not previous:
+            raise RuntimeError("No previous lecture_sessions version to roll back to")
+        target = previous[-1]
+        swap_alias(es, target)
+        print(f"Alias {INDEX_ALIAS} switched from {', '.join(current)} to {target}")
+        return target
+    finally:
+        es.close()
+
+
+def _session_actions(rows: Iterable[tuple], index: str):
+    """Преобразование строк Lecture_Sessions в bulk-операции"""
+    for session in rows:
+        session_id = session[0]
+
+        # psycopg2 уже разбирает JSON-колонку, строку оставляем на всякий случай
+        tags = session[4] or {}
+        if isinstance(tags, str):
+            try:
+                tags = json.loads(tags)
+            except ValueError:
+                tags = {}
+
+        yield {
+            "_index": index,
+            "_id": session_id,
+            "_source": session_document(
+                session_id, session[1], session[2], session[3], tags, session[5], session[6])
+        }
+
+
+LECTURE_SESSIONS_QUERY = """
+    SELECT
+        ls.session_id,
+        ls.topic,
+        ls.description,
+        ls.duration_minutes,
+        ls.tags,
+        c.name,
+        ls.session_type_id
+    FROM Lecture_Sessions ls
+    JOIN Courses c ON ls.course_id = c.course_id
+"""
+
+
+def apply_lecture_session_changes(
+    pg_conn,
+    es: Elasticsearch,
+    upsert_ids: List[int],
+    delete_ids: List[int],
+    course_ids: List[int] = ()
+) -> Dict[str, int]:
+    """
+    Apply changed Lecture_Sessions rows to the index behind the alias.
+
+    course_ids re-indexes every session of the given courses, since the
+    course name is denormalised into the session documents.
+    """
+    rows = []
+    if upsert_ids or course_ids:
+        with pg_conn.cursor() as pg_cur:
+            pg_cur.execute(
+                LECTURE_SESSIONS_QUERY
+                + " WHERE ls.session_id = ANY(%s) OR ls.course_id = ANY(%s)",
+                (list(upsert_ids), list(course_ids)))
+            rows = pg_cur.fetchall()
+        pg_conn.commit()
+
+    found = {row[0] for row in rows}
+    removed = list(delete_ids) + [i for i in upsert_ids if i not in found]
+    actions = list(_session_actions(rows, INDEX_ALIAS))
+    actions += [{"_op_type": "delete", "_index": INDEX_ALIAS, "_id": session_id}
+                for session_id in removed]
+    if not actions:
+        return {"upserted": 0, "deleted": 0, "failed": 0}
+
+    _, errors = helpers.bulk(es, actions, raise_on_error=False, raise_on_exception=False)
+    # Удаление отсутствующего документа не считается ошибкой
+    failed = [e for e in errors if e.get("delete", {}).get("status") != 404]
+    if failed:
+        raise RuntimeError(f"Failed to apply {len(failed)} lecture session changes: {failed[:3]}")
+    return {"upserted": len(rows), "deleted": len(removed), "failed": 0}
+
+
+def sync_lecture_sessions(
+    es_host: str = "localhost",
+    es_port: int = 9200,
+    es_user: str = "elastic",
+    es_password: str = "secret",
+    chunk_size: int = 1000,
+    thread_count: int = 1,
+    fetch_size: int = 5000,
+    replicas: int = 1,
+    keep_versions: int = 2
+) -> Dict:
     """
     Sync lecture sessions data from PostgreSQL to Elasticsearch
+
+    Every run builds a new physical index lecture_sessions_v{n} without
+    replicas and with refresh disabled, streaming rows from a server-side
+    cursor into the bulk API (parallel_bulk when thread_count > 1). When
+    the load is complete the lecture_sessions alias is swapped atomically;
+    the previous version is kept for rollback_lecture_sessions. If any
+    document fails, the new index is dropped and RuntimeError is raised.
     """
     pg_conn = psycopg2.connect(
         dbname=DB_NAME,
@@ -27,144 +197,193 @@ def sync_lecture_sessions(
         host=DB_HOST,
         port=DB_PORT
     )
-    pg_cur = pg_conn.cursor()
     es = Elasticsearch(
         hosts=[f"http://{es_host}:{es_port}"],
         basic_auth=(es_user, es_password),
         verify_certs=False
     )
+    versions = _index_versions(es)
+    index = f"{INDEX_VERSION_PREFIX}{(versions[-1] if versions else 0) + 1}"
 
     try:
-        # Create Elasticsearch index for lecture sessions
-        if not es.indices.exists(index="lecture_sessions"):
-            es.indices.create(
-                index="lecture_sessions",
-                mappings={
-                    "properties": {
-                        "session_id": {"type": "integer"},
-                        "topic": {
-                            "type": "text",
-                            "analyzer": "russian",
-                            "fields": {"keyword": {"type": "keyword"}}
-                        },
-                        "description": {"type": "text", "analyzer": "russian"},
-                        "duration_minutes": {"type": "integer"},
-                        "course_name": {"type": "text", "analyzer": "russian"},
-                        "session_type_id": {"type": "integer"},
-                        "tags": {"type": "object"}
-                    }
-                }
-            )
-
-        # Get lecture sessions data with session type name
-        pg_cur.execute("""
-            SELECT
-                ls.session_id,
-                ls.topic,
-                ls.description,
-                ls.duration_minutes,
-                ls.tags,
-                c.name,
-                ls.session_type_id
-            FROM Lecture_Sessions ls
-            JOIN Courses c ON ls.course_id = c.course_id
-        """)
-        sessions = pg_cur.fetchall()
-
-        for session in sessions:
-            session_id = session[0]
-
-            # Parse JSON tags
-            try:
-                tags = json.loads(session[4]) if session[4] else {}
-            except:
-                tags = {}
+        # Новая версия строится в фоне с настройками для массовой загрузки,
+        # алиас продолжает указывать на предыдущую до окончания загрузки.
+        # Анализаторы и маппинг приходят из шаблона
+        ensure_index_template(es)
+        es.indices.create(
+            index=index,
+            settings={"number_of_replicas": 0, "refresh_interval": "-1"}
+        )
 
-            doc = {
-                "session_id": session_id,
-                "topic": session[1],
-                "description": session[2],
-                "duration_minutes": session[3],
-                "tags": tags,
-                "course_name": session[5],
-                "session_type_id": session[6]
-            }
+        indexed = failed = 0
+        started = time.perf_counter()
+        try:
+            # Get lecture sessions data with session type name
+            with pg_conn.cursor(name="lecture_sessions_sync") as pg_cur:
+                pg_cur.itersize = fetch_size
+                pg_cur.execute(LECTURE_SESSIONS_QUERY)
+                actions = _session_actions(pg_cur, index)
+                if thread_count > 1:
+                    results = helpers.parallel_bulk(
+                        es, actions, thread_count=thread_count,
+                        chunk_size=chunk_size, raise_on_error=False)
+                else:
+                    results = helpers.streaming_bulk(
+                        es, actions, chunk_size=chunk_size,
+                        raise_on_error=False, max_retries=3)
+
+                for ok, item in results:
+                    if ok:
+                        indexed += 1
+                    else:
+                        failed += 1
+                        if failed <= 10:
+                            print(f"Failed to index document: {item}")
+            if failed:
+                raise RuntimeError(
+                    f"Failed to index {failed} of {indexed + failed} lecture sessions, "
+                    f"alias {INDEX_ALIAS} left unchanged")
+        except Exception:
+            # Недогруженная версия не должна попасть под алиас, а старые
+            # версии остаются для отката
+            es.indices.delete(index=index, ignore_unavailable=True)
+            raise
 
-            es.index(
-                index="lecture_sessions",
-                id=session_id,
-                document=doc
-            )
+        # None сбрасывает refresh_interval к значению по умолчанию
+        es.indices.put_settings(
+            index=index,
+            settings={"index": {"refresh_interval": None, "number_of_replicas": replicas}})
+        es.indices.refresh(index=index)
+        swap_alias(es, index)
+        pruned = prune_index_versions(es, keep=keep_versions)
+        print(f"Alias {INDEX_ALIAS} now points to {index}"
+              + (f", removed {', '.join(pruned)}" if pruned else ""))
 
-        print(f"Synced {len(sessions)} lecture sessions")
-        es.indices.refresh(index="lecture_sessions")
+        elapsed = time.perf_counter() - started
+        rate = indexed / elapsed if elapsed else 0
+        print(f"Synced {indexed} lecture sessions in {elapsed:.2f}s "
+              f"({rate:.0f} docs/s, {failed} failures)")
+        return {"index": index, "indexed": indexed, "failed": failed,
+                "seconds": elapsed, "docs_per_second": rate}
 
     except Exception as e:
         print(f"Error during synchronization: {e}")
         raise
     finally:
-        pg_cur.close()
         pg_conn.close()
         es.close()
 
 
+# Сортировка страниц point-in-time: по релевантности для полнотекстового
+# поиска, по порядку документов в шардах — когда релевантность не нужна
+RELEVANCE_SORT = [{"_score": "desc"}, {"_shard_doc": "asc"}]
+DOC_ORDER_SORT = [{"_shard_doc": "asc"}]
+SEARCH_RESULT_FIELDS = ["session_id", "topic", "description", "duration_minutes",
+                        "session_type_id", "course_name", "tags"]
+
+
+def iter_hits(
+    es: Elasticsearch,
+    query: Dict,
+    source: Optional[Sequence[str]] = None,
+    sort: Optional[List[Dict]] = None,
+    page_size: int = 1000,
+    keep_alive: str = "1m"
+) -> Iterator[Dict]:
+    """
+    Stream every hit of query over a point-in-time with search_after.
+
+    Only one page of page_size hits is held in memory; source limits the
+    returned _source fields.
+    """
+    pit_id = es.open_point_in_time(index=INDEX_ALIAS, keep_alive=keep_alive)["id"]
+    search_after = None
+    try:
+        while True:
+            params = {
+                "pit": {"id": pit_id, "keep_alive": keep_alive},
+                "query": query,
+                "size": page_size,
+                "sort": sort or DOC_ORDER_SORT,
+                "track_total_hits": False
+            }
+            if source is not None:
+                params["source"] = list(source)
+            if search_after is not None:
+                params["search_after"] = search_after
+            response = es.search(**params)
+            pit_id = response.get("pit_id", pit_id)
+            hits = response["hits"]["hits"]
+            yield from hits
+            if len(hits) < page_size:
+                break
+            search_after = hits[-1]["sort"]
+    finally:
+        es.close_point_in_time(id=pit_id)
+
+
 class LectureSessionSearcher:
-    def __init__(self, es_host="localhost", es_port=9200, es_user="elastic", es_password="secret"):
+    def __init__(self, es_host="localhost", es_port=9200, es_user="elastic", es_password="secret",
+                 page_size: int = 1000):
         self.es = Elasticsearch(
             hosts=[f"http://{es_host}:{es_port}"],
             basic_auth=(es_user, es_password),
             verify_certs=False
         )
+        self.page_size = page_size
+
+    def _search_all(self, query: Dict, sort: Optional[List[Dict]] = None) -> List[Dict]:
+        return self._format_results(iter_hits(
+            self.es, query, source=SEARCH_RESULT_FIELDS, sort=sort, page_size=self.page_size))
+
+    @staticmethod
+    def _full_text_query(query: str) -> Dict:
+        return {
+            "multi_match": {
+                "query": query,
+                "fields": ["course_name^3", "topic^3", "description^2", "keywords"],
+                "type": "best_fields"
+            }
+        }
 
     def search(self, query: str) -> List[Dict]:
         """
         Full-text search across topic, description and tags
         """
-        response = self.es.search(
-            index="lecture_sessions",
-            query={
-                "multi_match": {
-                    "query": query,
-                    "fields": ["course_name^3", "topic^3", "description^2", "tags"],
-                    "type": "best_fields"
-                }
-            }
-        )
+        return self._search_all(self._full_text_query(query), sort=RELEVANCE_SORT)
 
-        return self._format_results(response)
+    def search_session_ids(self, query: str) -> Iterator[int]:
+        """
+        Ids of all sessions matching query, fetched with _source = session_id
+        """
+        hits = iter_hits(self.es, self._full_text_query(query),
+                         source=["session_id"], page_size=self.page_size)
+        return (hit["_source"]["session_id"] for hit in hits)
 
     def search_by_type(self, session_type_id: int) -> List[Dict]:
         """
         Search by session type (exact match)
         """
-        response = self.es.search(
-            index="lecture_sessions",
-            query={
-                "term": {
-                    "session_type.keyword": session_type_id
-                }
+        return self._search_all({
+            "term": {
+                "session_type_id": str(session_type_id)
             }
-        )
-        return self._format_results(response)
+        })
 
     def search_by_duration(self, min_duration: int, max_duration: int) -> List[Dict]:
         """
         Search sessions in duration range
         """
-        response = self.es.search(
-            index="lecture_sessions",
-            query={
-                "range": {
-                    "duration_minutes": {
-                        "gte": min_duration,
-                        "lte": max_duration
-                    }
+        return self._search_all({
+            "range": {
+                "duration_minutes": {
+                    "gte": min_duration,
+                    "lte": max_duration
                 }
             }
-        )
-        return self._format_results(response)
+        })
 
-    def _format_results(self, response):
+    def _format_results(self, hits: Iterable[Dict]) -> List[Dict]:
         return [{
             "session_id": hit["_source"]["session_id"],
             "topic": hit["_source"]["topic"],
@@ -173,11 +392,11 @@ class LectureSessionSearcher:
             "session_type_id": hit["_source"]["session_type_id"],
             "course_name": hit["_source"]["course_name"],
             "tags": hit["_source"]["tags"]
-        } for hit in response["hits"]["hits"]]
+        } for hit in hits]
 
 
-def main():
-    sync_lecture_sessions()
+def main(chunk_size: int = 1000, thread_count: int = 1):
+    sync_lecture_sessions(chunk_size=chunk_size, thread_count=thread_count)
 
     searcher = LectureSessionSearcher()
 
@@ -198,4 +417,13 @@ def main():
 
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Sync lecture sessions to Elasticsearch")
+    parser.add_argument("--chunk-size", type=int, default=1000)
+    parser.add_argument("--threads", type=int, default=1)
+    parser.add_argument("--rollback", action="store_true",
+                        help="switch the alias back to the previous index version")
+    args = parser.parse_args()
+    if args.rollback:
+        rollback_lecture_sessions()
+    else:
+        main(chunk_size=args.chunk_size, thread_count=args.threads)
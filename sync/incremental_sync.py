@@ -0,0 +1,213 @@
+import argparse
+import logging
+import time
+from typing import Callable, Dict, List
+
+import psycopg2
+import redis
+from elasticsearch import Elasticsearch
+from pymongo import MongoClient
+
+from sync.changes import ChangeBatch, ChangeFeed
+from sync.elastic import create_elastic
+from sync.mongo import create_mongo
+from sync.neo4j.create_neo4j import NEO4J_PASSWORD, NEO4J_URI, NEO4J_USER, PG_CONFIG, SyncService
+from sync.redis import create_redis
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+MONGO_URI = 'mongodb://localhost:27017/'
+MONGO_DB = 'university_db'
+REDIS_HOST = 'localhost'
+REDIS_PORT = 6379
+ES_HOST = 'localhost'
+ES_PORT = 9200
+ES_USER = 'elastic'
+ES_PASSWORD = 'secret'
+
+
+class SinkSync:
+    """Инкрементальная синхронизация одного приемника по журналу изменений.
+
+    bootstrap обязан бросать исключение при ошибке: водяные знаки
+    фиксируются только после успешной полной синхронизации.
+    """
+
+    def __init__(self, name: str, tables: List[str],
+                 apply: Callable[[ChangeBatch], None], bootstrap: Callable[[], None]):
+        self.name = name
+        self.tables = tables
+        self.apply = apply
+        self.bootstrap = bootstrap
+
+    def run(self, pg_conn, batch_size: int) -> Dict[str, int]:
+        feed = ChangeFeed(pg_conn, self.name)
+        watermarks = {table: feed.watermark(table) for table in self.tables}
+
+        if any(mark is None for mark in watermarks.values()):
+            # Первый запуск: полная синхронизация от снимка журнала. Изменения,
+            # сделанные во время нее, будут применены повторно — это безопасно
+            head = feed.head()
+            logger.info(f"{self.name}: нет водяного знака, полная синхронизация")
+            self.bootstrap()
+            # Сюда доходим только после успешного bootstrap
+            for table in self.tables:
+                feed.commit(table, head)
+            return {table: 0 for table in self.tables}
+
+        applied = {}
+        for table in self.tables:
+            applied[table] = 0
+            mark = watermarks[table]
+            while True:
+                batch = feed.changes(table, mark, limit=batch_size)
+                if batch.position == mark:
+                    break
+                self.apply(batch)
+                feed.commit(table, batch.position)
+                applied[table] += len(batch)
+                mark = batch.position
+        return applied
+
+
+class IncrementalSync:
+    """Долгоживущие соединения со всеми приемниками и цикл синхронизации"""
+
+    def __init__(self, sinks: List[str]):
+        self.pg_conn = psycopg2.connect(**PG_CONFIG)
+        self.mongo_client = MongoClient(MONGO_URI, username='admin', password='secret')
+        self.mongo_db = self.mongo_client[MONGO_DB]
+        self.redis = redis.Redis(host=REDIS_HOST, port=REDIS_PORT, decode_responses=True)
+        self.es = Elasticsearch(
+            hosts=[f"http://{ES_HOST}:{ES_PORT}"],
+            basic_auth=(ES_USER, ES_PASSWORD),
+            verify_certs=False
+        )
+        self.neo4j = SyncService(PG_CONFIG, NEO4J_URI, NEO4J_USER, NEO4J_PASSWORD)
+
+        available = {
+            'mongo': SinkSync(
+                'mongo', ['lecture_materials'], self._apply_mongo,
+                lambda: create_mongo.sync_postgres_to_mongo(MONGO_URI, MONGO_DB)),
+            'redis': SinkSync(
+                'redis', ['session_types'], self._apply_redis,
+                lambda: create_redis.sync_session_types_to_redis(REDIS_HOST, REDIS_PORT)),
+            'neo4j': SinkSync(
+                'neo4j', ['courses', 'student_groups', 'group_courses', 'students',
+                          'lecture_sessions', 'schedule', 'attendance'],
+                self._apply_neo4j, self.neo4j.run_all),
+            'elastic': SinkSync(
+                'elastic', ['lecture_sessions', 'courses'], self._apply_elastic,
+                lambda: create_elastic.sync_lecture_sessions(
+                    ES_HOST, ES_PORT, ES_USER, ES_PASSWORD)),
+        }
+        self.sinks = [available[name] for name in sinks]
+
+    def _apply_mongo(self, batch: ChangeBatch):
+        create_mongo.apply_lecture_material_changes(
+            self.pg_conn, self.mongo_db, batch.upserts, batch.deletes)
+
+    def _apply_redis(self, batch: ChangeBatch):
+        create_redis.apply_session_type_changes(
+            self.pg_conn, self.redis, batch.upserts, batch.deletes)
+
+    def _apply_neo4j(self, batch: ChangeBatch):
+        service = self.neo4j
+        if batch.table == 'courses':
+            service.sync_courses(batch.upserts)
+            service.delete_nodes('Course', batch.deletes)
+        elif batch.table == 'student_groups':
+            service.sync_student_groups(batch.upserts)
+            service.delete_nodes('StudentGroup', batch.deletes)
+        elif batch.table == 'group_courses':
+            service.sync_group_courses(batch.upserts)
+            service.delete_group_courses(batch.deletes)
+            # Новым связям TAKES_COURSE нужны счетчики часов для lab3
+            service.refresh_hour_counters({group_id for group_id, _ in batch.upserts})
+        elif batch.table == 'students':
+            service.sync_students(batch.upserts)
+            service.delete_nodes('Student', batch.deletes)
+        elif batch.table == 'lecture_sessions':
+            service.sync_lecture_sessions(batch.upserts)
+            service.delete_nodes('LectureSession', batch.deletes)
+            service.refresh_hour_counters(service.groups_for_schedule(
+                session_ids=batch.upserts))
+        elif batch.table == 'schedule':
+            service.sync_schedule(batch.upserts)
+            groups = set(service.delete_schedule(batch.deletes))
+            groups.update(service.groups_for_schedule(schedule_ids=batch.upserts))
+            service.refresh_hour_counters(groups)
+        elif batch.table == 'attendance':
+            # Ключ журнала Attendance — schedule_id: меняется только признак held
+            schedule_ids = batch.upserts + batch.deletes
+            service.sync_schedule(schedule_ids)
+            service.refresh_hour_counters(service.groups_for_schedule(
+                schedule_ids=schedule_ids))
+        # Не держим открытую транзакцию между циклами
+        service.pg_conn.rollback()
+
+    def _apply_elastic(self, batch: ChangeBatch):
+        if batch.table == 'courses':
+            # Название курса денормализовано в документы занятий
+            create_elastic.apply_lecture_session_changes(
+                self.pg_conn, self.es, [], [], course_ids=batch.upserts)
+        else:
+            create_elastic.apply_lecture_session_changes(
+                self.pg_conn, self.es, batch.upserts, batch.deletes)
+
+    def run_once(self, batch_size: int = 10000) -> Dict[str, Dict[str, int]]:
+        result = {}
+        for sink in self.sinks:
+            started = time.perf_counter()
+            try:
+                result[sink.name] = sink.run(self.pg_conn, batch_size)
+            except Exception as e:
+                self.pg_conn.rollback()
+                logger.error(f"{sink.name}: ошибка синхронизации: {e}", exc_info=True)
+                continue
+            changed = sum(result[sink.name].values())
+            if changed:
+                logger.info(f"{sink.name}: применено {changed} изменений "
+                            f"за {time.perf_counter() - started:.2f} c")
+        ChangeFeed(self.pg_conn, 'compactor').compact()
+        return result
+
+    def run_forever(self, interval: float, batch_size: int = 10000):
+        while True:
+            self.run_once(batch_size)
+            time.sleep(interval)
+
+    def close(self):
+        self.pg_conn.close()
+        self.mongo_client.close()
+        self.redis.close()
+        self.es.close()
+        self.neo4j.close()
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Incremental PostgreSQL -> Mongo/Redis/Neo4j/Elasticsearch sync")
+    parser.add_argument('--sinks', nargs='*', default=['mongo', 'redis', 'neo4j', 'elastic'],
+                        choices=['mongo', 'redis', 'neo4j', 'elastic'])
+    parser.add_argument('--interval', type=float, default=10.0,
+                        help="seconds between sync cycles")
+    parser.add_argument('--batch-size', type=int, default=10000)
+    parser.add_argument('--once', action='store_true', help="run a single cycle and exit")
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    service = IncrementalSync(args.sinks)
+    try:
+        if args.once:
+            service.run_once(args.batch_size)
+        else:
+            service.run_forever(args.interval, args.batch_size)
+    finally:
+        service.close()
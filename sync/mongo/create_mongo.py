@@ -1,5 +1,7 @@
+from typing import Dict, List
+
 import psycopg2
-from pymongo import MongoClient
+from pymongo import DeleteMany, MongoClient, ReplaceOne
 # from env import DB_HOST, DB_NAME, DB_PASSWORD, DB_PORT, DB_USER
 
 DB_NAME = "postgres_db"
@@ -8,6 +10,46 @@ DB_PASSWORD = "postgres_password"
 DB_HOST = "localhost"
 DB_PORT = "5430"
 
+LECTURE_MATERIALS_QUERY = """
+    SELECT material_id, session_id, file_path, type, uploaded_at
+    FROM Lecture_Materials
+"""
+
+
+def material_doc(row) -> Dict:
+    mat_id, sess_id, file_path, type, uploaded_at = row
+    return {
+        'material_id': mat_id,
+        'session_id': sess_id,
+        'file_path': file_path,
+        'type': type,
+        'uploaded_at': uploaded_at
+    }
+
+
+def apply_lecture_material_changes(pg_conn, mongo_db, upsert_ids: List[int],
+                                   delete_ids: List[int]) -> Dict[str, int]:
+    """Точечное применение изменений Lecture_Materials к коллекции MongoDB"""
+    docs = []
+    if upsert_ids:
+        with pg_conn.cursor() as pg_cur:
+            pg_cur.execute(LECTURE_MATERIALS_QUERY + " WHERE material_id = ANY(%s)",
+                           (list(upsert_ids),))
+            docs = [material_doc(row) for row in pg_cur.fetchall()]
+        pg_conn.commit()
+
+    # Строки, удаленные после записи в журнал, тоже удаляем
+    found = {doc['material_id'] for doc in docs}
+    removed = list(delete_ids) + [i for i in upsert_ids if i not in found]
+
+    operations = [ReplaceOne({'material_id': doc['material_id']}, doc, upsert=True)
+                  for doc in docs]
+    if removed:
+        operations.append(DeleteMany({'material_id': {'$in': removed}}))
+    if operations:
+        mongo_db['lecture_materials'].bulk_write(operations, ordered=False)
+    return {'upserted': len(docs), 'deleted': len(removed)}
+
 
 def sync_postgres_to_mongo(mongo_uri='mongodb://localhost:27017/', db_name='university_db'):
     """
@@ -48,28 +90,22 @@ def sync_postgres_to_mongo(mongo_uri='mongodb://localhost:27017/', db_name='univ
     })
 
     lecture_materials_col = mongo_db['lecture_materials']
+    # Инкрементальная синхронизация ищет документы по material_id
+    lecture_materials_col.create_index('material_id', unique=True)
 
     try:
-        pg_cur.execute(
-            "SELECT material_id, session_id, file_path, type, uploaded_at FROM Lecture_Materials")
+        pg_cur.execute(LECTURE_MATERIALS_QUERY)
         materials = pg_cur.fetchall()
 
-        for mat_id, sess_id, file_path, type, uploaded_at in materials:
-            lectures_doc = {
-                'material_id': mat_id,
-                'session_id': sess_id,
-                'file_path': file_path,
-                'type': type,
-                'uploaded_at': uploaded_at
-            }
-
-            lecture_materials_col.insert_one(lectures_doc)
+        for row in materials:
+            lecture_materials_col.insert_one(material_doc(row))
 
         print(
             f"Успешно синхронизировано {len(materials)} LectureMaterials to MongoDB")
 
     except Exception as e:
         print(f"Error during synchronization: {e}")
+        raise
     finally:
         pg_cur.close()
         pg_conn.close()
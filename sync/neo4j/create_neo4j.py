@@ -1,3 +1,8 @@
+import argparse
+import itertools
+import time
+from concurrent.futures import ThreadPoolExecutor
+
 import psycopg2
 from neo4j import GraphDatabase
 import datetime
@@ -15,67 +20,140 @@ NEO4J_URI = 'bolt://localhost:7687'  # Исправлен порт с 7687 на
 NEO4J_USER = 'neo4j'
 NEO4J_PASSWORD = 'strongpassword'
 
+# Метки, узлы которых ищутся по postgres_id при MERGE/MATCH
+UNIQUE_LABELS = ('Course', 'StudentGroup', 'Student', 'LectureSession')
+
+# Индексы отчета lab3: поиск группы по названию и связи расписания по id
+GRAPH_INDEXES = (
+    "CREATE INDEX studentgroup_name IF NOT EXISTS FOR (g:StudentGroup) ON (g.name)",
+    "CREATE INDEX scheduled_schedule_id IF NOT EXISTS "
+    "FOR ()-[r:SCHEDULED]-() ON (r.schedule_id)",
+)
+
+# Одна лекция = 2 академических часа
+HOURS_PER_LECTURE = 2
+
+_cursor_ids = itertools.count()
+
+
+def _chunks(rows, size):
+    iterator = iter(rows)
+    while True:
+        chunk = list(itertools.islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _run_chunk(tx, cypher, rows):
+    tx.run(cypher, rows=rows).consume()
+
 
 class SyncService:
-    def __init__(self, pg_conf, neo4j_uri, neo4j_user, neo4j_password):
+    def __init__(self, pg_conf, neo4j_uri, neo4j_user, neo4j_password,
+                 batch_size=5000, workers=2):
+        self.pg_conf = pg_conf
         self.pg_conn = psycopg2.connect(**pg_conf)
         self.neo_driver = GraphDatabase.driver(
             neo4j_uri, auth=(neo4j_user, neo4j_password))
+        self.batch_size = batch_size
+        self.workers = workers
+        self._constraints_ready = False
 
     def close(self):
         self.pg_conn.close()
         self.neo_driver.close()
 
-    def fetch_all(self, query, params=None):
-        with self.pg_conn.cursor() as cur:
+    def ensure_constraints(self):
+        """Ограничения уникальности postgres_id (и их индексы) до первого MERGE"""
+        if self._constraints_ready:
+            return
+        with self.neo_driver.session() as session:
+            for label in UNIQUE_LABELS:
+                session.run(
+                    f"CREATE CONSTRAINT {label.lower()}_postgres_id IF NOT EXISTS "
+                    f"FOR (n:{label}) REQUIRE n.postgres_id IS UNIQUE").consume()
+            for ddl in GRAPH_INDEXES:
+                session.run(ddl).consume()
+        self._constraints_ready = True
+
+    def fetch_all(self, query, params=None, conn=None):
+        """Строки запроса через серверный курсор, по batch_size за раз"""
+        conn = conn or self.pg_conn
+        with conn.cursor(name=f"neo4j_sync_{next(_cursor_ids)}") as cur:
+            cur.itersize = self.batch_size
             cur.execute(query, params)
-            cols = [desc[0] for desc in cur.description]
-            for row in cur.fetchall():
+            cols = None
+            for row in cur:
+                if cols is None:
+                    cols = [desc[0] for desc in cur.description]
                 yield dict(zip(cols, row))
 
-    def sync_courses(self):
+    def fetch_rows(self, query, key_column, ids=None, conn=None):
+        """Все строки таблицы или только строки с указанными id"""
+        if ids is None:
+            return self.fetch_all(query, conn=conn)
+        if not ids:
+            return iter(())
+        return self.fetch_all(
+            query + f" WHERE {key_column} = ANY(%s)", (list(ids),), conn=conn)
+
+    def write_batches(self, cypher, rows):
+        """UNWIND порциями: по транзакции на каждые batch_size строк"""
+        self.ensure_constraints()
+        total = 0
+        with self.neo_driver.session() as session:
+            for chunk in _chunks(rows, self.batch_size):
+                # execute_write повторяет транзакцию при дедлоках между сессиями
+                session.execute_write(_run_chunk, cypher, chunk)
+                total += len(chunk)
+        return total
+
+    def sync_courses(self, ids=None, conn=None):
         cypher = '''
         UNWIND $rows AS row
         MERGE (c:Course {postgres_id: row.course_id})
         SET c.name = row.name, c.description = row.description, 
             c.duration_weeks = row.duration_weeks, c.department_id = row.department_id
         '''
-        rows = list(self.fetch_all("""
+        rows = self.fetch_rows("""
             SELECT course_id, name, description, duration_weeks, department_id 
             FROM Courses
-        """))
-        with self.neo_driver.session() as session:
-            session.run(cypher, rows=rows)
+        """, 'course_id', ids, conn)
+        return self.write_batches(cypher, rows)
 
-    def sync_student_groups(self):
+    def sync_student_groups(self, ids=None, conn=None):
         cypher = '''
         UNWIND $rows AS row
         MERGE (g:StudentGroup {postgres_id: row.group_id})
         SET g.name = row.name, g.course_year = row.course_year, 
             g.department_id = row.department_id, g.specialty_id = row.specialty_id
         '''
-        rows = list(self.fetch_all("""
+        rows = self.fetch_rows("""
             SELECT group_id, name, course_year, department_id, specialty_id 
             FROM Student_Groups
-        """))
-        with self.neo_driver.session() as session:
-            session.run(cypher, rows=rows)
+        """, 'group_id', ids, conn)
+        return self.write_batches(cypher, rows)
 
-    def sync_group_courses(self):
+    def sync_group_courses(self, keys=None, conn=None):
+        """keys — пары (group_id, course_id) из журнала изменений"""
         cypher = '''
         UNWIND $rows AS row
         MATCH (g:StudentGroup {postgres_id: row.group_id})
         MATCH (c:Course {postgres_id: row.course_id})
         MERGE (g)-[:TAKES_COURSE]->(c)
         '''
-        rows = list(self.fetch_all("""
-            SELECT group_id, course_id 
-            FROM Group_Courses
-        """))
-        with self.neo_driver.session() as session:
-            session.run(cypher, rows=rows)
+        if keys is None:
+            rows = self.fetch_all("""
+                SELECT group_id, course_id 
+                FROM Group_Courses
+            """, conn=conn)
+        else:
+            rows = [{'group_id': g, 'course_id': c} for g, c in keys]
+        return self.write_batches(cypher, rows)
 
-    def sync_students(self):
+    def sync_students(self, ids=None, conn=None):
+        # Связь с прежней группой удаляется, если студента перевели
         cypher = '''
         UNWIND $rows AS row
         MATCH (g:StudentGroup {postgres_id: row.group_id})
@@ -83,25 +161,192 @@ class SyncService:
         SET s.name = row.name, s.enrollment_year = row.enrollment_year, 
             s.date_of_birth = row.date_of_birth, s.email = row.email, 
             s.book_number = row.book_number
+        WITH s, g
+        OPTIONAL MATCH (s)-[old:MEMBER_OF]->(other:StudentGroup)
+        WHERE other <> g
+        DELETE old
+        WITH DISTINCT s, g
         MERGE (s)-[:MEMBER_OF]->(g)
         '''
-        rows = list(self.fetch_all("""
+        rows = self.fetch_rows("""
             SELECT student_id, name, enrollment_year, date_of_birth, email, book_number, group_id 
             FROM Students
-        """))
+        """, 'student_id', ids, conn)
+        return self.write_batches(cypher, rows)
+
+    def sync_lecture_sessions(self, ids=None, conn=None):
+        cypher = '''
+        UNWIND $rows AS row
+        MERGE (ls:LectureSession {postgres_id: row.session_id})
+        SET ls.topic = row.topic, ls.session_type_id = row.session_type_id,
+            ls.duration_minutes = row.duration_minutes, ls.tags = row.tags,
+            ls.special_discipline = row.special_discipline
+        WITH ls, row
+        MATCH (c:Course {postgres_id: row.course_id})
+        MERGE (c)-[:HAS_SESSION]->(ls)
+        '''
+        # Neo4j не хранит вложенные объекты, поэтому tags сохраняются строкой JSON,
+        # а нужный отчету признак — отдельным свойством
+        rows = self.fetch_rows("""
+            SELECT session_id, course_id, session_type_id, topic, duration_minutes,
+                   tags::text AS tags,
+                   COALESCE((tags->>'special_discipline')::boolean, false) AS special_discipline
+            FROM Lecture_Sessions
+        """, 'session_id', ids, conn)
+        return self.write_batches(cypher, rows)
+
+    def sync_schedule(self, ids=None, conn=None):
+        """Записи расписания — связи (StudentGroup)-[:SCHEDULED]->(LectureSession).
+
+        held — на занятии был хотя бы один студент группы. Связь
+        пересоздается, поэтому перенос занятия в другую группу тоже учитывается.
+        """
+        cypher = '''
+        UNWIND $rows AS row
+        OPTIONAL MATCH ()-[old:SCHEDULED {schedule_id: row.schedule_id}]->()
+        DELETE old
+        WITH DISTINCT row
+        MATCH (g:StudentGroup {postgres_id: row.group_id})
+        MATCH (ls:LectureSession {postgres_id: row.session_id})
+        CREATE (g)-[:SCHEDULED {
+            schedule_id: row.schedule_id, scheduled_date: row.scheduled_date,
+            start_time: row.start_time, room: row.room, held: row.held
+        }]->(ls)
+        '''
+        rows = self.fetch_rows("""
+            SELECT sch.schedule_id, sch.group_id, sch.session_id, sch.room,
+                   sch.scheduled_date, sch.start_time,
+                   EXISTS (
+                       SELECT 1 FROM Attendance a
+                       WHERE a.schedule_id = sch.schedule_id AND a.attended
+                   ) AS held
+            FROM Schedule sch
+        """, 'sch.schedule_id', ids, conn)
+        return self.write_batches(cypher, rows)
+
+    def delete_schedule(self, ids):
+        """Удаляет связи SCHEDULED и возвращает id затронутых групп"""
+        if not ids:
+            return []
         with self.neo_driver.session() as session:
-            session.run(cypher, rows=rows)
+            result = session.run('''
+                UNWIND $ids AS id
+                MATCH (g:StudentGroup)-[r:SCHEDULED {schedule_id: id}]->()
+                DELETE r
+                RETURN DISTINCT g.postgres_id AS group_id
+            ''', ids=list(ids))
+            return [record['group_id'] for record in result]
+
+    def groups_for_schedule(self, schedule_ids=None, session_ids=None):
+        """Группы, у которых в расписании есть указанные записи или занятия"""
+        with self.pg_conn.cursor() as cur:
+            cur.execute("""
+                SELECT DISTINCT group_id FROM Schedule
+                WHERE schedule_id = ANY(%s) OR session_id = ANY(%s)
+            """, (list(schedule_ids or []), list(session_ids or [])))
+            return [row[0] for row in cur.fetchall()]
+
+    def refresh_hour_counters(self, group_ids=None, conn=None):
+        """Запланированные и прослушанные часы лекций специальной дисциплины
+        на связях TAKES_COURSE группы.
+
+        Запланировано — все такие лекции в расписании группы по курсу,
+        прослушано — те из них, что состоялись (SCHEDULED.held).
+        """
+        cypher = '''
+        UNWIND $rows AS row
+        MATCH (g:StudentGroup {postgres_id: row.group_id})-[r:TAKES_COURSE]->
+              (c:Course {postgres_id: row.course_id})
+        SET r.planned_hours = row.planned_hours, r.heard_hours = row.heard_hours
+        '''
+        query = f"""
+            SELECT gc.group_id, gc.course_id,
+                   {HOURS_PER_LECTURE} * COUNT(sch.schedule_id) AS planned_hours,
+                   {HOURS_PER_LECTURE} * COUNT(sch.schedule_id) FILTER (
+                       WHERE EXISTS (
+                           SELECT 1 FROM Attendance a
+                           WHERE a.schedule_id = sch.schedule_id AND a.attended
+                       )
+                   ) AS heard_hours
+            FROM Group_Courses gc
+            LEFT JOIN Lecture_Sessions ls
+                   ON ls.course_id = gc.course_id
+                  AND ls.session_type_id = (
+                      SELECT session_type_id FROM Session_Types WHERE name = 'Лекция')
+                  AND (ls.tags->>'special_discipline')::boolean
+            LEFT JOIN Schedule sch
+                   ON sch.session_id = ls.session_id AND sch.group_id = gc.group_id
+            {{where}}
+            GROUP BY gc.group_id, gc.course_id
+        """
+        if group_ids is None:
+            rows = self.fetch_all(query.format(where=""), conn=conn)
+        elif not group_ids:
+            return 0
+        else:
+            rows = self.fetch_all(query.format(where="WHERE gc.group_id = ANY(%s)"),
+                                  (list(group_ids),), conn=conn)
+        return self.write_batches(cypher, rows)
+
+    def delete_nodes(self, label, ids):
+        """Удаление узлов, строки которых удалены в PostgreSQL"""
+        if not ids:
+            return 0
+        return self.write_batches(
+            f"UNWIND $rows AS id MATCH (n:{label} {{postgres_id: id}}) DETACH DELETE n",
+            list(ids))
+
+    def delete_group_courses(self, keys):
+        if not keys:
+            return 0
+        cypher = '''
+        UNWIND $rows AS row
+        MATCH (g:StudentGroup {postgres_id: row.group_id})-[r:TAKES_COURSE]->
+              (c:Course {postgres_id: row.course_id})
+        DELETE r
+        '''
+        rows = [{'group_id': g, 'course_id': c} for g, c in keys]
+        return self.write_batches(cypher, rows)
+
+    def _run_with_own_connection(self, method):
+        # Серверный курсор живет в транзакции, поэтому у каждого потока свое соединение
+        conn = psycopg2.connect(**self.pg_conf)
+        started = time.perf_counter()
+        try:
+            count = method(conn=conn)
+        finally:
+            conn.close()
+        print(f"{method.__name__}: {count} строк за {time.perf_counter() - started:.2f} c")
+        return count
 
     def run_all(self):
-        self.sync_courses()  # Добавлена синхронизация Courses
-        self.sync_student_groups()
-        self.sync_group_courses()
-        self.sync_students()
+        self.ensure_constraints()
+        # Узлы разных меток независимы; связи требуют, чтобы узлы уже существовали
+        stages = [
+            (self.sync_courses, self.sync_student_groups),  # Добавлена синхронизация Courses
+            (self.sync_group_courses, self.sync_students, self.sync_lecture_sessions),
+            (self.sync_schedule,),
+            (self.refresh_hour_counters,),
+        ]
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            for stage in stages:
+                list(pool.map(self._run_with_own_connection, stage))
         print("Синхронизация завершена.")
 
 
+def parse_args():
+    parser = argparse.ArgumentParser(description="PostgreSQL -> Neo4j sync")
+    parser.add_argument('--batch-size', type=int, default=5000,
+                        help="rows per cursor fetch and per UNWIND transaction")
+    parser.add_argument('--workers', type=int, default=2,
+                        help="concurrent Neo4j write sessions")
+    return parser.parse_args()
+
+
 if __name__ == '__main__':
-    service = SyncService(PG_CONFIG, NEO4J_URI, NEO4J_USER, NEO4J_PASSWORD)
+    args = parse_args()
+    service = SyncService(PG_CONFIG, NEO4J_URI, NEO4J_USER, NEO4J_PASSWORD,
+                          batch_size=args.batch_size, workers=args.workers)
     try:
         service.run_all()
     finally:
@@ -1,6 +1,12 @@
+import logging
+import threading
+import time
+from typing import Dict, List, Optional
+
 import psycopg2
 import redis
-from typing import Dict, List
+
+logger = logging.getLogger(__name__)
 
 DB_NAME = "postgres_db"
 DB_USER = "postgres_user"
@@ -8,6 +14,52 @@ DB_PASSWORD = "postgres_password"
 DB_HOST = "localhost"
 DB_PORT = "5430"
 
+# Канал, в который синхронизация публикует сообщение после записи session_type:*;
+# подписчики (SessionTypeSearch) сбрасывают кэш в памяти процесса
+INVALIDATION_CHANNEL = 'invalidate:session_type'
+
+
+def apply_session_type_changes(pg_conn, r, upsert_ids: List[int],
+                               delete_ids: List[int]) -> Dict[str, int]:
+    """Точечное обновление хешей session_type:* и индексов по имени"""
+    rows = []
+    if upsert_ids:
+        with pg_conn.cursor() as pg_cur:
+            pg_cur.execute("""
+                SELECT session_type_id, name
+                FROM Session_Types
+                WHERE session_type_id = ANY(%s)
+            """, (list(upsert_ids),))
+            rows = pg_cur.fetchall()
+        pg_conn.commit()
+
+    found = {session_type_id for session_type_id, _ in rows}
+    removed = list(delete_ids) + [i for i in upsert_ids if i not in found]
+    affected = list(upsert_ids) + list(delete_ids)
+
+    # Старые имена нужны, чтобы убрать id из прежнего индекса
+    with r.pipeline(transaction=False) as pipe:
+        for session_type_id in affected:
+            pipe.hget(f"session_type:{session_type_id}", 'name')
+        old_names = pipe.execute()
+
+    with r.pipeline() as pipe:
+        for session_type_id, old_name in zip(affected, old_names):
+            if old_name is not None:
+                pipe.srem(f"index:session_type:name:{old_name.lower()}", session_type_id)
+        for session_type_id in removed:
+            pipe.delete(f"session_type:{session_type_id}")
+        for session_type_id, name in rows:
+            pipe.hset(f"session_type:{session_type_id}", mapping={
+                'id': session_type_id,
+                'name': name
+            })
+            pipe.sadd(f"index:session_type:name:{name.lower()}", session_type_id)
+        if affected:
+            pipe.publish(INVALIDATION_CHANNEL, ','.join(map(str, affected)))
+        pipe.execute()
+    return {'upserted': len(rows), 'deleted': len(removed)}
+
 
 def sync_session_types_to_redis(redis_host: str = 'localhost', redis_port: int = 6379) -> None:
     """Синхронизация типов сессий из PostgreSQL в Redis"""
@@ -44,6 +96,7 @@ def sync_session_types_to_redis(redis_host: str = 'localhost', redis_port: int =
             # Создание индексов
             r.sadd(f"index:session_type:name:{name.lower()}", session_type_id)
 
+        r.publish(INVALIDATION_CHANNEL, '*')
         print(
             f"Успешно синхронизировано {len(session_types)} типов сессий в Redis")
 
@@ -57,19 +110,114 @@ def sync_session_types_to_redis(redis_host: str = 'localhost', redis_port: int =
 
 
 class SessionTypeSearch:
-    def __init__(self, redis_host='localhost', redis_port=6379):
-        self.r = redis.Redis(
+    """Поиск типов сессий с кэшем в памяти процесса.
+
+    Типы сессий меняются редко, поэтому ответы Redis кэшируются до
+    сообщения в INVALIDATION_CHANNEL. Пока подписка не активна (старт,
+    обрыв соединения), кэш не используется. cache_ttl ограничивает
+    время жизни записи на случай пропущенного сообщения.
+    """
+
+    def __init__(self, redis_host='localhost', redis_port=6379, client=None,
+                 cache_ttl: float = 300.0, listen: bool = True):
+        self.r = client or redis.Redis(
             host=redis_host, port=redis_port, decode_responses=True)
+        self.cache_ttl = cache_ttl
+        self._by_id: Dict[int, tuple] = {}
+        self._by_name: Dict[str, tuple] = {}
+        self._generation = 0
+        self._subscribed = False
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self._listener = None
+        if listen:
+            self._listener = threading.Thread(
+                target=self._listen, name='session-type-invalidation', daemon=True)
+            self._listener.start()
+
+    def _listen(self):
+        while not self._stopped.is_set():
+            pubsub = self.r.pubsub(ignore_subscribe_messages=False)
+            try:
+                pubsub.subscribe(INVALIDATION_CHANNEL)
+                while not self._stopped.is_set():
+                    message = pubsub.get_message(timeout=1.0)
+                    if message is None:
+                        continue
+                    # Подтверждение подписки тоже сбрасывает кэш: сообщения,
+                    # отправленные до него, могли быть пропущены
+                    self.invalidate(subscribed=True)
+            except redis.RedisError as e:
+                logger.warning(f"Подписка на {INVALIDATION_CHANNEL} прервана: {e}")
+                self.invalidate(subscribed=False)
+                self._stopped.wait(1.0)
+            finally:
+                pubsub.close()
+
+    def invalidate(self, subscribed: Optional[bool] = None):
+        with self._lock:
+            self._by_id.clear()
+            self._by_name.clear()
+            self._generation += 1
+            self.invalidations += 1
+            if subscribed is not None:
+                self._subscribed = subscribed
+
+    def _cached(self, cache: Dict, key):
+        with self._lock:
+            entry = cache.get(key)
+            if entry is not None and entry[0] > time.monotonic():
+                self.hits += 1
+                return entry[1], None
+            self.misses += 1
+            return None, self._generation
+
+    def _store(self, cache: Dict, key, value, generation: int):
+        with self._lock:
+            # Значение, прочитанное до инвалидации, в кэш не попадает
+            if self._subscribed and generation == self._generation:
+                cache[key] = (time.monotonic() + self.cache_ttl, value)
 
     def get_by_id(self, session_type_id: int) -> Dict:
         """Получить тип сессии по ID"""
-        return self.r.hgetall(f"session_type:{session_type_id}")
+        value, generation = self._cached(self._by_id, session_type_id)
+        if generation is None:
+            return dict(value)
+        value = self.r.hgetall(f"session_type:{session_type_id}")
+        self._store(self._by_id, session_type_id, value, generation)
+        return dict(value)
 
     def get_by_name(self, name: str) -> List[Dict]:
         """Поиск по точному названию типа"""
-        session_ids = self.r.smembers(
-            f"index:session_type:name:{name.lower()}")
-        return [self.r.hgetall(f"session_type:{id}") for id in session_ids]
+        key = name.lower()
+        value, generation = self._cached(self._by_name, key)
+        if generation is None:
+            return [dict(item) for item in value]
+        session_ids = self.r.smembers(f"index:session_type:name:{key}")
+        with self.r.pipeline(transaction=False) as pipe:
+            for id in session_ids:
+                pipe.hgetall(f"session_type:{id}")
+            value = [item for item in pipe.execute() if item]
+        self._store(self._by_name, key, value, generation)
+        return [dict(item) for item in value]
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'invalidations': self.invalidations,
+                'subscribed': self._subscribed,
+                'entries': len(self._by_id) + len(self._by_name)
+            }
+
+    def close(self):
+        self._stopped.set()
+        if self._listener is not None:
+            self._listener.join(timeout=2.0)
 
 
 def main():
@@ -79,6 +227,7 @@ def main():
     # Примеры использования:
     print("Все лекции:")
     print(searcher.get_by_name("Лекция"))
+    searcher.close()
 
 
 if __name__ == "__main__":